@@ -0,0 +1,146 @@
+from typing import Dict, Optional, Tuple
+
+import datetime
+
+# Number of days in each month of a non-leap year
+DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+class AgeCalculator:
+    """
+    This class calculates people's ages from their dates of birth.
+
+    An age is the number of whole years between the date of birth and a single
+    moment, fixed when the calculator is created, and is exactly what
+    relativedelta(today, birth_date).years would give. It's worked out with
+    integer arithmetic instead, and each distinct date of birth is only parsed
+    and worked out once.
+
+    Someone born on 29th February turns a year older on 28th February in years
+    that aren't leap years, as they do with relativedelta.
+    """
+
+    def __init__(self, today: datetime.datetime = None):
+        """
+        Create a calculator for ages as of a given moment.
+
+        Args:
+            today: The moment to calculate ages as of; by default, now.
+        """
+
+        # Find the moment we're calculating ages as of
+        if today is None:
+            today = datetime.datetime.today()
+        self.today = (today.year, today.month, today.day)
+
+        # Note whether it's later than the very start of the day, which matters
+        # for dates of birth in the future
+        self.after_midnight = (
+            isinstance(today, datetime.datetime) and today.time() != datetime.time()
+        )
+
+        # The age for each date of birth we've seen
+        self._ages: Dict[str, Optional[int]] = {}
+
+    def age(self, dob: str) -> Optional[int]:
+        """
+        Calculate someone's age.
+
+        Args:
+            dob: The date of birth, formatted as yyyy-mm-dd.
+
+        Returns:
+            int: The age in whole years, or None if the date of birth isn't a
+            valid date.
+        """
+        try:
+            return self._ages[dob]
+        except KeyError:
+            birth_date = parse_date(dob)
+            age = self._ages[dob] = self._years(birth_date) if birth_date else None
+            return age
+
+    def _years(self, birth_date: Tuple[int, int, int]) -> int:
+        """
+        Calculate the number of whole years since a date.
+
+        This follows relativedelta: count the months between the two dates,
+        move the date of birth on by that many months (keeping its day, unless
+        the month is too short), and adjust by one month if that overshoots.
+
+        Args:
+            birth_date: The date of birth, as (year, month, day).
+
+        Returns:
+            int: The number of whole years, which is negative (rounded towards
+            zero) if the date is in the future.
+        """
+
+        # Count the months, and find the day the date of birth moves on to
+        year, month, day = self.today
+        birth_year, birth_month, birth_day = birth_date
+        months = (year - birth_year) * 12 + month - birth_month
+        moved_day = min(birth_day, days_in_month(year, month))
+
+        # Adjust by a month if we've overshot
+        if self.today >= birth_date:
+            if day < moved_day:
+                months -= 1
+        elif day > moved_day or (day == moved_day and self.after_midnight):
+            months += 1
+
+        # Convert to whole years
+        return months // 12 if months >= 0 else -(-months // 12)
+
+
+def parse_date(text: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Parse a date formatted as yyyy-mm-dd.
+
+    Dates that are exactly in that format are parsed directly. Anything else is
+    left to datetime.strptime(), so exactly the same dates are accepted as with
+    strptime(text, "%Y-%m-%d").
+
+    Args:
+        text: The date.
+
+    Returns:
+        (int, int, int): The date as (year, month, day), or None if it isn't a
+        valid date.
+    """
+
+    # Fast path for the usual format
+    if (
+        len(text) == 10
+        and text[4] == text[7] == "-"
+        and text[:4].isdecimal()
+        and text[5:7].isdecimal()
+        and text[8:].isdecimal()
+    ):
+        year, month, day = int(text[:4]), int(text[5:7]), int(text[8:])
+        if 1 <= year and 1 <= month <= 12 and 1 <= day <= days_in_month(year, month):
+            return year, month, day
+        return None
+
+    # Anything else
+    try:
+        parsed = datetime.datetime.strptime(text, "%Y-%m-%d")
+    except ValueError:
+        return None
+    return parsed.year, parsed.month, parsed.day
+
+
+def days_in_month(year: int, month: int) -> int:
+    """
+    Find the number of days in a month.
+
+    Args:
+        year:  The year.
+        month: The month, from 1 to 12.
+
+    Returns:
+        int: The number of days in the month.
+    """
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        return 29
+    return DAYS_IN_MONTH[month - 1]
@@ -0,0 +1,180 @@
+from age import AgeCalculator
+from relativedelta import relativedelta
+from typing import Iterator, List
+
+import argparse
+import datetime
+import sys
+import time
+
+# Dates of birth that aren't valid dates, or aren't in the usual format
+ODD_DATES = [
+    "",
+    "1980",
+    "1980-02-30",
+    "1981-02-29",
+    "1900-02-29",
+    "2000-02-29",
+    "0000-01-01",
+    "1980-00-10",
+    "1980-13-01",
+    "1980-7-31",
+    "1980-07-1",
+    "1980-07- 1",
+    "1980/07/31",
+    "31-07-1980",
+    "1980-07-31x",
+    "yesterday",
+    "١٩٨٠-07-31",
+]
+
+# Days to check every date of birth as of: around the end of February and the
+# end of the year, in leap years, other years, and centuries that are and
+# aren't leap years
+AWKWARD_DAYS = [
+    (year, month, day)
+    for year in (1900, 2000, 2023, 2024, 2100)
+    for month, day in [(1, 1), (2, 28), (2, 29), (3, 1), (12, 31)]
+    if (month, day) != (2, 29) or year in (2000, 2024)
+]
+
+
+def dates(start: datetime.date, end: datetime.date) -> Iterator[datetime.date]:
+    """
+    Generate every date in a range.
+
+    Args:
+        start: The first date.
+        end:   The last date.
+
+    Returns:
+        Iterator[datetime.date]: Every date from start to end inclusive.
+    """
+    for ordinal in range(start.toordinal(), end.toordinal() + 1):
+        yield datetime.date.fromordinal(ordinal)
+
+
+def expected_age(dob: str, today: datetime.datetime) -> object:
+    """
+    Calculate an age the way it used to be done, with relativedelta.
+
+    Args:
+        dob:   The date of birth.
+        today: The moment to calculate the age as of.
+
+    Returns:
+        object: The age in whole years, or None if the date isn't valid.
+    """
+    try:
+        return relativedelta(today, datetime.datetime.strptime(dob, "%Y-%m-%d")).years
+    except ValueError:
+        return None
+
+
+def check(births: List[str], todays: List[datetime.datetime]) -> List[str]:
+    """
+    Check that the age calculator agrees with relativedelta.
+
+    Args:
+        births: The dates of birth to check.
+        todays: The moments to check them as of.
+
+    Returns:
+        [str]: A description of each disagreement.
+    """
+    problems = []
+    for today in todays:
+        ages = AgeCalculator(today)
+        for dob in births:
+            if (age := ages.age(dob)) != (expected := expected_age(dob, today)):
+                problems.append(f"{dob} as of {today}: {age}, expected {expected}")
+    return problems
+
+
+def main(first_year: int, last_year: int) -> List[str]:
+    """
+    Check the age calculator against relativedelta, and compare their speed.
+
+    Every date of birth across the range of years is checked as of the days
+    around the end of February and the end of the year, in leap years and
+    other years, at midnight and later in the day. Then the days around the
+    ends of the months are checked as of every day across several leap cycles,
+    including 2100, which isn't a leap year.
+
+    Args:
+        first_year: The first year of the range of dates of birth.
+        last_year:  The last year of the range of dates of birth.
+
+    Returns:
+        [str]: A description of each disagreement.
+    """
+
+    # Check every date of birth in the range as of the awkward moments
+    first, last = datetime.date(first_year, 1, 1), datetime.date(last_year, 12, 31)
+    births = [day.isoformat() for day in dates(first, last)]
+    todays = [
+        datetime.datetime(year, month, day, hour)
+        for year, month, day in AWKWARD_DAYS
+        for hour in (0, 12)
+    ]
+    start = time.perf_counter()
+    problems = check(births + ODD_DATES, todays)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Checked {len(births)} dates of birth as of {len(todays)} moments "
+        f"({elapsed:.1f}s)"
+    )
+
+    # Check the awkward dates of birth as of every day across the leap cycles
+    births = [
+        day.isoformat()
+        for day in dates(datetime.date(1999, 1, 1), datetime.date(2000, 12, 31))
+        if day.day in (1, 28, 29, 30, 31)
+    ]
+    births += [f"{year}-02-29" for year in (1896, 1904, 2096)]
+    todays = [
+        datetime.datetime.combine(day, datetime.time(hour))
+        for day in dates(datetime.date(2095, 1, 1), datetime.date(2105, 12, 31))
+        for hour in (0, 12)
+    ]
+    start = time.perf_counter()
+    problems += check(births + ODD_DATES, todays)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Checked {len(births)} dates of birth as of {len(todays)} moments "
+        f"({elapsed:.1f}s)"
+    )
+
+    # Compare the speed of printing a typical run of ages
+    today = datetime.datetime.today()
+    sample = births * 20
+    start = time.perf_counter()
+    for dob in sample:
+        expected_age(dob, today)
+    old = time.perf_counter() - start
+    start = time.perf_counter()
+    ages = AgeCalculator(today)
+    for dob in sample:
+        ages.age(dob)
+    new = time.perf_counter() - start
+    print(
+        f"{len(sample)} ages: relativedelta {old * 1000:.1f}ms, "
+        f"calculator {new * 1000:.1f}ms"
+    )
+
+    # Done
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the age calculator against relativedelta."
+    )
+    parser.add_argument("--first-year", type=int, default=1896, help="First year.")
+    parser.add_argument("--last-year", type=int, default=2030, help="Last year.")
+    args = parser.parse_args()
+    problems = main(args.first_year, args.last_year)
+    for problem in problems[:20]:
+        print(problem, file=sys.stderr)
+    print(f"{len(problems)} disagreements")
+    sys.exit(1 if problems else 0)
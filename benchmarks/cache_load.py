@@ -0,0 +1,123 @@
+from benchmarks.generate import generate_contacts
+from typing import Callable, List
+
+import argparse
+import gc
+import loader
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+# Default number of contacts to check with
+DEFAULT_COUNT = 50_000
+
+
+def best_time(run: Callable[[], object], runs: int) -> float:
+    """
+    Time a function several times.
+
+    Args:
+        run:  The function to time.
+        runs: The number of times to run it.
+
+    Returns:
+        float: The quickest time taken, in milliseconds.
+    """
+    times = []
+    for _ in range(runs):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main(count: int, runs: int) -> List[str]:
+    """
+    Check that loading the contacts from the cache is quicker than parsing the
+    contact file.
+
+    Each part of the cached payload is also unpickled on its own, with the
+    garbage collector disabled just as it is when the cache is read, to show
+    where the time goes.
+
+    Args:
+        count: The number of contacts to generate.
+        runs:  The number of times to time each load.
+
+    Returns:
+        [str]: The problems found; empty if there were none.
+    """
+
+    # Generate the contact file, making sure no contact directory is used
+    with tempfile.TemporaryDirectory() as directory:
+        loader.CONTACT_FILE = os.path.join(directory, "contacts.txt")
+        loader.CONTACT_DIRECTORY = os.path.join(directory, "contacts")
+        with open(loader.CONTACT_FILE, "w") as file:
+            generate_contacts(file, count)
+
+        # Time parsing it, and loading it from its cache
+        parse_ms = best_time(lambda: loader.load_contacts(use_cache=False), runs)
+        payload = loader.load_contact_payload(rebuild_cache=True)
+        load_ms = best_time(loader.load_indexed_contacts, runs)
+        source_size = os.path.getsize(loader.CONTACT_FILE)
+        cache_size = os.path.getsize(loader.CONTACT_FILE + ".cache")
+
+        # Show where the time goes
+        print(f"{count} contacts\n")
+        print(f"{'part':<10} {'pickled':>10} {'unpickle':>10}")
+        for name, part in payload.items():
+            data = pickle.dumps(part, protocol=pickle.HIGHEST_PROTOCOL)
+            elapsed = best_time(lambda: _unpickle(data), runs)
+            print(f"{name:<10} {_megabytes(len(data)):>10} {elapsed:>8.1f}ms")
+        print(f"\nParsing took {parse_ms:.1f}ms ({_megabytes(source_size)})")
+        print(f"Loading the cache took {load_ms:.1f}ms ({_megabytes(cache_size)})")
+
+    # Check the cache is worth having
+    if load_ms >= parse_ms:
+        return [f"Loading the cache took {load_ms:.1f}ms, no quicker than parsing"]
+    return []
+
+
+def _megabytes(size: int) -> str:
+    """
+    Format a size in megabytes.
+
+    Args:
+        size: The size, in bytes.
+
+    Returns:
+        str: The formatted size.
+    """
+    return f"{size / 1024 / 1024:.1f}MB"
+
+
+def _unpickle(data: bytes):
+    """
+    Unpickle some data with the garbage collector disabled.
+
+    Args:
+        data: The pickled data.
+    """
+    gc.disable()
+    try:
+        pickle.loads(data)
+    finally:
+        gc.enable()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that loading the cache is quicker than parsing."
+    )
+    parser.add_argument(
+        "--count", type=int, default=DEFAULT_COUNT, help="Number of contacts."
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Number of loads.")
+    args = parser.parse_args()
+    problems = main(args.count, args.runs)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,64 @@
+from typing import TextIO
+
+import argparse
+import datetime
+import random
+
+# Parts we build contacts from
+FIRST_NAMES = ["Roy", "Maurice", "Jen", "Douglas", "Harry", "Hermione", "Ron", "James"]
+LAST_NAMES = ["Trenneman", "Moss", "Barber", "Reynholm", "Potter", "Granger", "Kirk"]
+NICKNAMES = ["Doc", "Boss", "Mossy", "Captain", "Harry P", "Ronnie"]
+ORGS = ["Renham Industries", "Hogwarts", "Starfleet", "Reynholm Industries"]
+ROLES = ["IT Support", "Relationship Manager", "Head Boy", "Captain"]
+NOTES = ["Best friend is Moss", "Prefers email", "Met at the conference"]
+
+# Range of dates of birth, as ordinals
+FIRST_DOB = datetime.date(1940, 1, 1).toordinal()
+LAST_DOB = datetime.date(2005, 12, 31).toordinal()
+
+
+def generate_contacts(file: TextIO, count: int, seed: int = 0):
+    """
+    Write a file of synthetic contacts.
+
+    Every contact has an email address, a phone number and an organisation.
+    Some also have a role, a nickname, a date of birth and up to two notes.
+    The same count and seed always produce the same file.
+
+    Args:
+        file:  The file to write to.
+        count: The number of contacts to write.
+        seed:  The seed for the random number generator.
+    """
+
+    # Initialise
+    rng = random.Random(seed)
+
+    # Write each contact
+    for n in range(count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        file.write(f"{first} {last} {n}\n\n")
+        file.write(f"    Email: {first.lower()}.{n}@example.com\n")
+        file.write(f"    Phone: 0{rng.randrange(100000000, 999999999)}\n")
+        file.write(f"    Org:   {rng.choice(ORGS)}\n")
+        if rng.random() < 0.5:
+            file.write(f"    Role:  {rng.choice(ROLES)}\n")
+        if rng.random() < 0.2:
+            file.write(f"    Nickname: {rng.choice(NICKNAMES)}\n")
+        if rng.random() < 0.4:
+            dob = datetime.date.fromordinal(rng.randint(FIRST_DOB, LAST_DOB))
+            file.write(f"    DOB:   {dob.isoformat()}\n")
+        for note in rng.sample(NOTES, rng.choice([0, 0, 0, 1, 1, 2])):
+            file.write(f"    - {note}\n")
+        file.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic contact file.")
+    parser.add_argument("file", help="The file to write.")
+    parser.add_argument("--count", type=int, default=10_000, help="Number of contacts.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+    with open(args.file, "w") as output:
+        generate_contacts(output, args.count, args.seed)
@@ -0,0 +1,96 @@
+from benchmarks.generate import generate_contacts
+from contact import Contact
+from filter import filter_contacts
+from typing import Callable, Sequence, Tuple
+
+import argparse
+import gc
+import loader
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+def measure(
+    load: Callable[[], Sequence[Contact]]
+) -> Tuple[float, int, int, Sequence[Contact]]:
+    """
+    Measure the cost of loading contacts.
+
+    Timing is done without tracing, since tracing slows allocation down; the
+    load is then repeated with tracing to count the memory it allocates.
+
+    Args:
+        load: Function that loads the contacts.
+
+    Returns:
+        (float, int, int, [Contact]): The time taken in seconds, the peak memory
+        allocated in bytes, the number of memory blocks still allocated once
+        loading finished, and the loaded contacts.
+    """
+
+    # Time the load
+    gc.collect()
+    start = time.perf_counter()
+    contacts = load()
+    elapsed = time.perf_counter() - start
+    del contacts
+
+    # Trace the load
+    gc.collect()
+    tracemalloc.start()
+    contacts = load()
+    _, peak = tracemalloc.get_traced_memory()
+    statistics = tracemalloc.take_snapshot().statistics("filename")
+    blocks = sum(stat.count for stat in statistics)
+    tracemalloc.stop()
+
+    # Done
+    return elapsed, peak, blocks, contacts
+
+
+def main(count: int, pattern: str):
+    """
+    Compare the text loader with the memory-mapped loader.
+
+    Args:
+        count:   The number of contacts to generate.
+        pattern: The pattern to search for.
+    """
+
+    # Generate the contact file, making sure no contact directory is used
+    with tempfile.TemporaryDirectory() as directory:
+        loader.CONTACT_FILE = os.path.join(directory, "contacts.txt")
+        loader.CONTACT_DIRECTORY = os.path.join(directory, "contacts")
+        with open(loader.CONTACT_FILE, "w") as file:
+            generate_contacts(file, count)
+
+        # Measure each loader
+        print(f"{count} contacts, searching for {pattern!r}\n")
+        print(f"{'loader':<8} {'parse':>9} {'peak':>10} {'blocks':>10} {'search':>9}")
+        for name, load in [
+            ("text", lambda: loader.load_contacts(use_cache=False)),
+            ("mmap", loader.load_mapped_contacts),
+        ]:
+            elapsed, peak, blocks, contacts = measure(load)
+            start = time.perf_counter()
+            filter_contacts(contacts, [pattern])
+            search = time.perf_counter() - start
+            print(
+                f"{name:<8} {elapsed * 1000:>7.1f}ms {peak / 1024 / 1024:>8.1f}MB "
+                f"{blocks:>10} {search * 1000:>7.1f}ms"
+            )
+            del contacts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the text loader with the memory-mapped loader."
+    )
+    parser.add_argument(
+        "--count", type=int, default=100_000, help="Number of contacts."
+    )
+    parser.add_argument("--pattern", default="reynholm", help="Pattern to search for.")
+    args = parser.parse_args()
+    main(args.count, args.pattern)
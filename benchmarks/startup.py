@@ -0,0 +1,123 @@
+from typing import Dict, List
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules that mustn't be imported just by starting up, since they're only
+# needed for some queries
+LAZY_MODULES = [
+    "age",
+    "concurrent.futures",
+    "daemon",
+    "database",
+    "dedupe",
+    "difflib",
+    "filter",
+    "fuzzy",
+    "interactive",
+    "loader",
+    "mapped",
+    "multiprocessing",
+    "parallel",
+    "phonetic",
+    "query",
+    "relativedelta",
+    "shards",
+    "socketserver",
+    "sqlite3",
+    "store",
+    "termcolor",
+]
+
+# Default budget for importing the application, in milliseconds
+DEFAULT_BUDGET_MS = 100
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """
+    Import a module in a fresh interpreter and find how long each module it
+    imported took, as reported by -X importtime.
+
+    Args:
+        module: The module to import.
+
+    Returns:
+        {str: int}: The cumulative import time of each module imported, in
+        microseconds.
+    """
+
+    # Import the module in a fresh interpreter, from the top of the repository
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Each line of the report is "import time: self | cumulative | name"
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(runs: int, budget_ms: float) -> List[str]:
+    """
+    Check that the application starts up quickly.
+
+    The application is imported several times and the quickest import is
+    compared with the budget, so a slow run on a busy machine doesn't count.
+
+    Args:
+        runs:      The number of times to import the application.
+        budget_ms: The budget for importing it, in milliseconds.
+
+    Returns:
+        [str]: The problems found; empty if there were none.
+    """
+
+    # Import the application several times
+    reports = [import_times("contacts") for _ in range(runs)]
+    best_ms = min(report["contacts"] for report in reports) / 1000
+
+    # Show where the time went in the quickest run
+    report = min(reports, key=lambda report: report["contacts"])
+    print(f"{'module':<24} {'cumulative':>12}")
+    for name, elapsed in sorted(report.items(), key=lambda item: -item[1])[:10]:
+        print(f"{name:<24} {elapsed / 1000:>10.1f}ms")
+    print(f"\nImporting contacts took {best_ms:.1f}ms (budget {budget_ms:.0f}ms)")
+
+    # Check the budget, and that nothing was imported before it was needed
+    problems = []
+    if best_ms > budget_ms:
+        problems.append(f"Startup took {best_ms:.1f}ms, over budget")
+    for name in LAZY_MODULES:
+        if name in report:
+            problems.append(f"{name} is imported at startup")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the application starts up within a budget."
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Number of imports.")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help="Budget for importing the application, in milliseconds.",
+    )
+    args = parser.parse_args()
+    problems = main(args.runs, args.budget)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,290 @@
+from benchmarks.generate import generate_contacts
+from benchmarks.mapped import measure
+from contact import Contact
+from contextlib import redirect_stdout
+from dedupe import Duplicates
+from filter import filter_contacts, fuzzy_filter, regex_filter
+from interactive import IncrementalSearch
+from query import compile_regexes
+from typing import Callable, Dict, List
+
+import argparse
+import contacts
+import datetime
+import io
+import json
+import loader
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+# Default numbers of contacts to benchmark with
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+# Queries we time: one pattern, several, and many, some found within others
+QUERIES = {
+    "one": ["reynholm"],
+    "several": ["roy", "renham", "support"],
+    "many": ["example.com", "reynholm", "rey", "industries", "roy", "trenneman"],
+}
+
+# Fuzzy query we time, with a typo in each pattern, and the distance allowed
+FUZZY_QUERY = ["reynhlom", "duglas"]
+FUZZY_DISTANCE = 1
+
+# Phonetic query we time, misspelling a name
+PHONETIC_QUERY = ["jen barbr"]
+
+# Regular expressions we time, run over the store's text
+REGEX_QUERY = [r"^roy reynholm \d+$", r"renham"]
+
+# Pattern we time typing a letter at a time
+TYPED_QUERY = "reynholm"
+
+# Number of times each query and render is repeated; the median is reported
+REPEATS = 5
+
+# Number of shards the contacts are split into for the contact directory
+SHARDS = 8
+
+
+def time_it(run: Callable[[], object], repeats: int = REPEATS) -> float:
+    """
+    Time a function.
+
+    Args:
+        run:     The function to time.
+        repeats: The number of times to run it.
+
+    Returns:
+        float: The median time taken, in milliseconds.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def benchmark(count: int, seed: int) -> Dict[str, float]:
+    """
+    Benchmark loading, filtering and printing a synthetic contact file.
+
+    Args:
+        count: The number of contacts in the file.
+        seed:  The seed the file is generated with.
+
+    Returns:
+        {str: float}: Each measurement; times are in milliseconds and memory
+        in megabytes.
+    """
+
+    # Initialise
+    results = {}
+
+    # Generate the contact file, making sure no contact directory is used
+    with tempfile.TemporaryDirectory() as directory:
+        loader.CONTACT_FILE = os.path.join(directory, "contacts.txt")
+        loader.CONTACT_DIRECTORY = os.path.join(directory, "contacts")
+        with open(loader.CONTACT_FILE, "w") as file:
+            generate_contacts(file, count, seed)
+
+        # Parse it, then build and load its cache
+        elapsed, peak, _, contact_list = measure(
+            lambda: loader.load_contacts(use_cache=False)
+        )
+        results["parse_ms"] = elapsed * 1000
+        results["parse_peak_mb"] = peak / 1024 / 1024
+        results["cache_build_ms"] = time_it(
+            lambda: loader.load_indexed_contacts(rebuild_cache=True), repeats=1
+        )
+        results["cache_load_ms"] = time_it(loader.load_indexed_contacts)
+        _, index = loader.load_indexed_contacts()
+        store = loader.load_contact_store()
+
+        # Build and load the SQLite database
+        results["sqlite_build_ms"] = time_it(
+            lambda: loader.load_database(rebuild_cache=True), repeats=1
+        )
+        results["sqlite_load_ms"] = time_it(loader.load_database)
+        database = loader.load_database()
+
+        # Time each query against the list, the index, the store and the
+        # database
+        for name, pattern in QUERIES.items():
+            results[f"query_{name}_scan_ms"] = time_it(
+                lambda: filter_contacts(contact_list, pattern, jobs=1)
+            )
+            results[f"query_{name}_index_ms"] = time_it(
+                lambda: filter_contacts(contact_list, pattern, index=index)
+            )
+            results[f"query_{name}_store_ms"] = time_it(
+                lambda: filter_contacts(store, pattern)
+            )
+            results[f"query_{name}_sqlite_ms"] = time_it(
+                lambda: filter_contacts(database, pattern)
+            )
+
+        # Time a fuzzy query
+        fuzzy = loader.load_fuzzy_index(contact_list)
+        results["query_fuzzy_ms"] = time_it(
+            lambda: fuzzy_filter(
+                contact_list, FUZZY_QUERY, fuzzy, FUZZY_DISTANCE, index=index
+            )
+        )
+
+        # Time a phonetic query
+        phonetic = loader.load_phonetic_index(contact_list)
+        results["query_phonetic_ms"] = time_it(
+            lambda: filter_contacts(
+                contact_list, PHONETIC_QUERY, index=index, phonetic=phonetic
+            )
+        )
+
+        # Time a query with regular expressions
+        regexes = compile_regexes(REGEX_QUERY)
+        results["query_regex_ms"] = time_it(lambda: regex_filter(store, regexes))
+
+        # Time typing a pattern a letter at a time, finding every match after
+        # each letter
+        search = IncrementalSearch(contact_list)
+        results["query_typed_ms"] = time_it(lambda: _type(search, TYPED_QUERY))
+
+        # Time looking for duplicates
+        results["dedupe_ms"] = time_it(lambda: Duplicates(contact_list))
+
+        # Time printing the matches for the broadest query
+        matches = filter_contacts(contact_list, QUERIES["several"][:1])
+        results["render_count"] = len(matches)
+        for colour in (False, True):
+            results[f"render_{'colour' if colour else 'plain'}_ms"] = time_it(
+                lambda: _render(matches, colour)
+            )
+
+        # Split the same number of contacts between the shards of a contact
+        # directory, then build and load their caches
+        os.mkdir(loader.CONTACT_DIRECTORY)
+        for shard in range(SHARDS):
+            name = os.path.join(loader.CONTACT_DIRECTORY, f"{shard}.txt")
+            with open(name, "w") as file:
+                generate_contacts(file, count // SHARDS, seed + shard)
+        results["shards_build_ms"] = time_it(
+            lambda: loader.load_indexed_contacts(rebuild_cache=True), repeats=1
+        )
+        results["shards_load_ms"] = time_it(loader.load_indexed_contacts)
+
+    # Done
+    return results
+
+
+def main(sizes: List[int], seed: int, output: str, compare: str = None):
+    """
+    Run the benchmarks and save the results.
+
+    Args:
+        sizes:   The numbers of contacts to benchmark with.
+        seed:    The seed the contact files are generated with.
+        output:  The JSON file to write the results to.
+        compare: A JSON file of earlier results to compare with, if any.
+    """
+
+    # Run the benchmarks
+    measured: Dict[str, Dict[str, float]] = {}
+    results = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "seed": seed,
+        "sizes": measured,
+    }
+    for count in sizes:
+        print(f"Benchmarking {count} contacts...")
+        measured[str(count)] = benchmark(count, seed)
+
+    # Save them
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}\n")
+
+    # Show them, alongside the earlier results if we have them
+    earlier = {}
+    if compare:
+        with open(compare) as file:
+            earlier = json.load(file)
+        print(f"Compared with {earlier.get('commit')} ({earlier.get('date')})\n")
+    for size, measurements in measured.items():
+        print(f"{size} contacts")
+        before = earlier.get("sizes", {}).get(size, {})
+        for name, value in measurements.items():
+            line = f"  {name:<26} {value:>12.1f}"
+            if before.get(name):
+                line += f" {before[name]:>12.1f} {value / before[name]:>7.2f}x"
+            print(line)
+
+
+def _render(matches: List[Contact], colour: bool):
+    """
+    Print a list of contacts, throwing the output away.
+
+    Args:
+        matches: The contacts to print.
+        colour:  True to colour the output.
+    """
+    with redirect_stdout(io.StringIO()):
+        contacts.print_contacts(matches, colour=colour)
+
+
+def _type(search: IncrementalSearch, pattern: str):
+    """
+    Search for each prefix of a pattern in turn, as if it were being typed.
+
+    Args:
+        search:  The search, which is started again from an empty query.
+        pattern: The pattern typed.
+    """
+    search.search([])
+    for end in range(1, len(pattern) + 1):
+        search.search([pattern[:end]]).fill()
+
+
+def _commit() -> str:
+    """
+    Find the commit the benchmarks are being run on.
+
+    Returns:
+        str: The commit's hash, or None if it can't be found.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark loading, filtering and printing contacts."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="Numbers of contacts to benchmark with (up to 1000000).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument(
+        "--output", default="benchmark.json", help="JSON file to write results to."
+    )
+    parser.add_argument("--compare", help="JSON file of earlier results to compare.")
+    args = parser.parse_args()
+    main(args.sizes, args.seed, args.output, args.compare)
@@ -0,0 +1,197 @@
+from typing import List, Optional, Tuple
+
+import hashlib
+import re
+
+# Pattern matching the line end before a line that starts a contact's block;
+# a block starts with the contact's name, which isn't indented
+_BLOCK_START = re.compile(rb"[\r\n](?=[^\s])")
+
+
+class BlockMap:
+    """
+    This class represents the layout of a contact file's blocks.
+
+    Each contact has a block in the contact file, starting with the contact's
+    name and running up to the next contact's name. The map records where each
+    block starts and a hash of its content, so when the file changes, the blocks
+    that changed can be found and only those need to be parsed again.
+
+    Anything before the first block (which can only be badly formatted details)
+    is treated as a preamble. A change to the preamble can't be handled
+    incrementally.
+    """
+
+    def __init__(self, data: bytes):
+        """
+        Map the blocks of a contact file.
+
+        Args:
+            data: The raw content of the contact file.
+        """
+
+        # Find the blocks
+        self.starts = _block_starts(data, 0)
+        self.hashes = _block_hashes(data, self.starts)
+
+        # Record the preamble and overall size
+        self.preamble = _hash(data[: self.starts[0]] if self.starts else data)
+        self.size = len(data)
+
+        # Record the hash of everything before the last block, so we can tell
+        # when the file has only been added to
+        self.head_hash = _hash(data[: self._tail_start()])
+
+    def __len__(self) -> int:
+        """
+        Get the number of blocks in the file.
+
+        Returns:
+            int: The number of blocks.
+        """
+        return len(self.starts)
+
+    def update(self, data: bytes) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Update the map for the new content of the contact file.
+
+        The blocks that are the same at the start and the end of the file are
+        kept, and the blocks between them are reported as having changed. As a
+        fast path, if everything before the last block is unchanged (which is
+        the case when the file has been added to), only the last block and
+        anything after it are mapped again. Either way, the map is then updated
+        to describe the new content.
+
+        Args:
+            data: The new raw content of the contact file.
+
+        Returns:
+            (int, int, int, int): The range of old blocks that changed, and the
+            range of bytes in the new content that replaces them; or None if
+            the preamble changed, in which case the map is unchanged.
+        """
+
+        # Added to: only the last block and anything after it can change, as
+        # long as the last block still starts in the same place
+        tail_start = self._tail_start()
+        if (
+            self.starts
+            and not data[tail_start : tail_start + 1].isspace()
+            and _hash(data[:tail_start]) == self.head_hash
+        ):
+            start, stop = len(self.starts) - 1, len(self.starts)
+            starts = _block_starts(data, tail_start)
+            self._replace(start, stop, starts, _block_hashes(data, starts))
+            return self._finish(data, start, stop, tail_start, len(data))
+
+        # Map the whole file again, and make sure the preamble is the same
+        starts = _block_starts(data, 0)
+        hashes = _block_hashes(data, starts)
+        if _hash(data[: starts[0]] if starts else data) != self.preamble:
+            return None
+
+        # Find the blocks that are the same at the start and end of the file
+        old, new = self.hashes, hashes
+        limit = min(len(old), len(new))
+        prefix = 0
+        while prefix < limit and old[prefix] == new[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+            suffix += 1
+
+        # Replace the blocks between them
+        start, stop, new_stop = prefix, len(old) - suffix, len(new) - suffix
+        first = starts[start] if start < len(starts) else len(data)
+        last = starts[new_stop] if new_stop < len(starts) else len(data)
+        self.starts, self.hashes = starts, hashes
+        return self._finish(data, start, stop, first, last)
+
+    def _tail_start(self) -> int:
+        """
+        Get the offset of the last block.
+
+        Returns:
+            int: The offset of the last block, or the size of the file if it
+            has no blocks.
+        """
+        return self.starts[-1] if self.starts else self.size
+
+    def _replace(self, start: int, stop: int, starts: List[int], hashes: List[bytes]):
+        """
+        Replace a range of blocks in the map.
+
+        Args:
+            start:  The first block to replace.
+            stop:   The block after the last block to replace.
+            starts: The offsets of the replacement blocks.
+            hashes: The hashes of the replacement blocks.
+        """
+        self.starts[start:stop] = starts
+        self.hashes[start:stop] = hashes
+
+    def _finish(
+        self, data: bytes, start: int, stop: int, first: int, last: int
+    ) -> Tuple[int, int, int, int]:
+        """
+        Finish updating the map, recording the new size and head hash.
+
+        Args:
+            data:  The new raw content of the contact file.
+            start: The first old block that changed.
+            stop:  The block after the last old block that changed.
+            first: The offset of the replacement content.
+            last:  The offset of the end of the replacement content.
+
+        Returns:
+            (int, int, int, int): The arguments, without the data.
+        """
+        self.size = len(data)
+        self.head_hash = _hash(data[: self._tail_start()])
+        return start, stop, first, last
+
+
+def _block_starts(data: bytes, offset: int) -> List[int]:
+    """
+    Find where each block starts.
+
+    Args:
+        data:   The raw content of the contact file.
+        offset: The offset to start looking from, which must be the start of a
+                line.
+
+    Returns:
+        [int]: The offset of each block.
+    """
+    starts = [match.end() for match in _BLOCK_START.finditer(data, offset)]
+    if offset < len(data) and not data[offset : offset + 1].isspace():
+        starts.insert(0, offset)
+    return starts
+
+
+def _block_hashes(data: bytes, starts: List[int]) -> List[bytes]:
+    """
+    Calculate the hash of each block.
+
+    Args:
+        data:   The raw content of the contact file.
+        starts: The offset of each block.
+
+    Returns:
+        [bytes]: The hash of each block.
+    """
+    ends = starts[1:] + [len(data)]
+    return [_hash(data[start:end]) for start, end in zip(starts, ends)]
+
+
+def _hash(data: bytes) -> bytes:
+    """
+    Calculate the hash of some content.
+
+    Args:
+        data: The content.
+
+    Returns:
+        bytes: The hash.
+    """
+    return hashlib.blake2b(data, digest_size=16).digest()
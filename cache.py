@@ -0,0 +1,258 @@
+from typing import Any, Callable, Optional
+
+import gc
+import hashlib
+import os
+import pickle
+import time
+
+# Suffix added to a contact file's name to give the name of its cache file
+CACHE_SUFFIX = ".cache"
+
+# Cache format version -- bump this whenever the shape of the cached payload
+# changes, so that old cache files are rebuilt rather than misread
+CACHE_VERSION = 6
+
+# A source file modified this close to the time its cache was written could
+# be changed again without its size or mtime changing, so it's verified by hash
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def cache_file_for(contact_file: str, suffix: str = CACHE_SUFFIX) -> str:
+    """
+    Get the name of the cache file that sits next to a contact file.
+
+    Args:
+        contact_file: The contact file.
+        suffix:       The suffix that identifies the kind of cache.
+
+    Returns:
+        str: The name of the cache file.
+    """
+    return contact_file + suffix
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Calculate the hash we use to identify the content of a contact file.
+
+    Args:
+        data: The raw content of the contact file.
+
+    Returns:
+        str: The content hash.
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_hash(path: str) -> Optional[str]:
+    """
+    Calculate the content hash of a file.
+
+    Args:
+        path: The file.
+
+    Returns:
+        str: The content hash, or None if the file can't be read.
+    """
+    try:
+        with open(path, "rb") as file:
+            return content_hash(file.read())
+    except OSError:
+        return None
+
+
+def load_cached(
+    contact_file: str,
+    build: Callable[[bytes], Any],
+    rebuild: bool = False,
+    suffix: str = CACHE_SUFFIX,
+    update: Callable[[bytes, Any], Any] = None,
+    previous: Any = None,
+) -> Any:
+    """
+    Load the payload for a contact file, using its cache when it's current.
+
+    The cache is keyed on the contact file's path, size, modification time and
+    content hash. When the path, size and modification time all match, the
+    payload is loaded straight from the cache without reading the contact file
+    at all. Otherwise the contact file is read and hashed; if only the
+    modification time changed the cached payload is still used, and if the
+    content changed the payload is rebuilt. Either way, the cache is rewritten.
+
+    If an update function is given, a payload that's out of date is brought up
+    to date with it rather than being rebuilt from scratch. A caller that keeps
+    the payload in memory can pass it as the previous payload, in which case the
+    cache isn't read at all; the contact file is read and the payload updated.
+
+    A contact file modified within RACY_WINDOW_NS of its cache being written is
+    always verified by hash, since a further edit in that window might not
+    change its size or modification time.
+
+    A contact file can have several caches holding different kinds of payload,
+    each identified by its own suffix.
+
+    Args:
+        contact_file: The contact file.
+        build:        Function that builds the payload from the file's content.
+        rebuild:      True to ignore any existing cache and rebuild it.
+        suffix:       The suffix that identifies the kind of cache.
+        update:       Function that updates an out-of-date payload for the
+                      file's content, if payloads can be updated.
+        previous:     The payload the caller already has, if any.
+
+    Returns:
+        Any: The payload built from the contact file.
+    """
+
+    # Find the contact file's current state
+    path = os.path.abspath(contact_file)
+    stat = os.stat(path)
+
+    # See if the cache is current, unless the caller has its own payload
+    cache_file = cache_file_for(path, suffix)
+    entry = None if rebuild or previous is not None else _read_cache(cache_file)
+    if entry and _is_current(entry, path, stat):
+        return entry["payload"]
+
+    # Read the contact file; a changed timestamp doesn't mean changed content
+    with open(path, "rb") as file:
+        data = file.read()
+    digest = content_hash(data)
+    if entry and entry["path"] == path and entry["hash"] == digest:
+        payload = entry["payload"]
+
+    # Bring an out-of-date payload up to date if we can; otherwise, rebuild it
+    else:
+        stale = previous if previous is not None else entry and entry["payload"]
+        if update and stale is not None and not rebuild:
+            payload = update(data, stale)
+        else:
+            payload = build(data)
+
+    # Save the new cache
+    _write_cache(cache_file, path, stat, digest, payload)
+    return payload
+
+
+def load_current(contact_file: str, suffix: str = CACHE_SUFFIX) -> Any:
+    """
+    Load the payload for a contact file from its cache, but only if the cache
+    is current without the contact file having to be read.
+
+    Args:
+        contact_file: The contact file.
+        suffix:       The suffix that identifies the kind of cache.
+
+    Returns:
+        Any: The cached payload, or None if the cache isn't known to be current.
+    """
+    path = os.path.abspath(contact_file)
+    entry = _read_cache(cache_file_for(path, suffix))
+    if entry and _is_current(entry, path, os.stat(path)):
+        return entry["payload"]
+    return None
+
+
+def _is_current(entry: dict, path: str, stat: os.stat_result) -> bool:
+    """
+    Check whether a cache entry describes the current state of a contact file.
+
+    Args:
+        entry: The cache entry.
+        path:  The absolute path of the contact file.
+        stat:  The contact file's current status.
+
+    Returns:
+        bool: True if the cache entry is current; otherwise, False.
+    """
+
+    # Check the path and status first
+    if (
+        entry["path"] != path
+        or entry["size"] != stat.st_size
+        or entry["mtime_ns"] != stat.st_mtime_ns
+    ):
+        return False
+
+    # If the file was written just before the cache, its status can't be
+    # trusted, so make the caller check its content as well
+    return entry["mtime_ns"] < entry["written_ns"] - RACY_WINDOW_NS
+
+
+def _read_cache(cache_file: str) -> Optional[dict]:
+    """
+    Read the cache entry for a contact file.
+
+    Args:
+        cache_file: The cache file.
+
+    Returns:
+        dict: The cache entry, or None if there is no usable cache.
+    """
+
+    # Load the cache in a single read. Unpickling creates a great many objects,
+    # none of them garbage, so the cyclic garbage collector is kept from
+    # repeatedly scanning them while they're being created.
+    try:
+        with open(cache_file, "rb") as file:
+            data = file.read()
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            entry = pickle.loads(data)
+        finally:
+            if enabled:
+                gc.enable()
+
+    # No cache, or it's unreadable -- it'll be rebuilt
+    except Exception:
+        return None
+
+    # Make sure it's a format we understand
+    if not isinstance(entry, dict) or entry.get("version") != CACHE_VERSION:
+        return None
+    return entry
+
+
+def _write_cache(
+    cache_file: str, path: str, stat: os.stat_result, digest: str, payload: Any
+):
+    """
+    Write the cache entry for a contact file.
+
+    The cache is written to a temporary file which then replaces the old cache,
+    so a concurrent reader never sees a partially written cache. Failure to
+    write the cache is not an error; the next run will simply rebuild it.
+
+    Args:
+        cache_file: The cache file.
+        path:       The absolute path of the contact file.
+        stat:       The contact file's status when it was read.
+        digest:     The contact file's content hash.
+        payload:    The payload built from the contact file.
+    """
+
+    # Build the entry
+    entry = {
+        "version": CACHE_VERSION,
+        "path": path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": digest,
+        "written_ns": time.time_ns(),
+        "payload": payload,
+    }
+
+    # Write it
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, "wb") as file:
+            file.write(pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+        os.replace(temp_file, cache_file)
+    except OSError:
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+
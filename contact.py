@@ -4,13 +4,23 @@ from typing import List
 # Separator used when contact has multiple roles or organisations
 ROLE_ORG_SEP = " and "
 
+# Separator between fields in a contact's search text; patterns can't contain
+# it, so a pattern can never match across two fields
+SEARCH_TEXT_SEP = "\0"
+
 
 @dataclass
 class KeyValue:
     """
     This class represents a key/value pair we've loaded from the contact file.
+
+    Key/value pairs are slotted rather than having a per-instance dictionary,
+    and the loaders intern their keys, so the handful of distinct keys in a
+    contact file are each stored once.
     """
 
+    __slots__ = ("key", "value")
+
     # The key
     key: str
 
@@ -37,8 +47,16 @@ class KeyValue:
 class Contact:
     """
     This class represents a single contact we've loaded from the contact file.
+
+    Contacts are slotted rather than having a per-instance dictionary. Each
+    contact also keeps a lower-case copy of its searchable text, built the
+    first time it's matched against a pattern, so repeated matching doesn't
+    convert every field to lower case each time. A contact shouldn't be changed
+    once it's been matched.
     """
 
+    __slots__ = ("name", "kv_pairs", "notes", "_search_text")
+
     # The contact's name
     name: str
 
@@ -48,6 +66,14 @@ class Contact:
     # The list of notes we've loaded
     notes: List[str]
 
+    def __post_init__(self):
+        """
+        Initialise the parts of a contact that aren't loaded from the file.
+        """
+
+        # The search text is built when it's first needed
+        self._search_text = None
+
     def matches(self, pattern: str) -> bool:
         """
         Check whether this contact matches the specified pattern.
@@ -62,23 +88,72 @@ class Contact:
             bool: True if this contact matches the pattern; otherwise, False.
         """
 
-        # Check the name
-        if pattern in self.name.lower():
-            return True
+        # Build the search text the first time we need it
+        if (search_text := self._search_text) is None:
+            search_text = self._search_text = self.search_text()
 
-        # Check the values
-        for kv in self.kv_pairs:
-            if pattern in kv.value.lower():
-                return True
+        # Check the name, values and notes in one go
+        return pattern in search_text
+
+    def matches_all(self, pattern: List[str]) -> bool:
+        """
+        Check whether this contact matches every one of a list of patterns.
+
+        The search text is looked up once, and each pattern is found within it
+        in turn, stopping at the first one that isn't there. This is quicker
+        than calling matches() for each pattern, especially with many patterns.
+
+        Args:
+            pattern: The patterns to match.
+
+        Returns:
+            bool: True if this contact matches every pattern; otherwise, False.
+        """
+
+        # Build the search text the first time we need it
+        if (search_text := self._search_text) is None:
+            search_text = self._search_text = self.search_text()
+
+        # Check each pattern
+        for p in pattern:
+            if p not in search_text:
+                return False
+        return True
 
-        # Check the notes
-        for note in self.notes:
-            if pattern in note.lower():
-                return True
+    def matches_field(self, key: str, value: str, exact: bool = False) -> bool:
+        """
+        Check whether one of this contact's values for a key matches a pattern.
+
+        Args:
+            key:   The key, in lower case.
+            value: The pattern to match, in lower case.
+            exact: True if the pattern must match the whole value.
 
-        # Not there
+        Returns:
+            bool: True if a value for the key matches; otherwise, False.
+        """
+        for kv in self.kv_pairs:
+            if kv.key.lower() == key:
+                found = kv.value.lower()
+                if found == value if exact else value in found:
+                    return True
         return False
 
+    def search_text(self) -> str:
+        """
+        Get the text that patterns are matched against.
+
+        This is the name, the value of all keyword/value pairs, and the list of
+        notes, in lower case and separated by SEARCH_TEXT_SEP.
+
+        Returns:
+            str: The contact's search text.
+        """
+        fields = [self.name]
+        fields.extend(kv.value for kv in self.kv_pairs)
+        fields.extend(self.notes)
+        return SEARCH_TEXT_SEP.join(fields).lower()
+
     def get(self, key: str) -> List[KeyValue]:
         """
         Get the values for a given key.
@@ -1,12 +1,34 @@
-from loader import load_contacts
-from contact import Contact
-from filter import filter_contacts
-from termcolor import colored
-from relativedelta import relativedelta
-from typing import List
-
-import datetime
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Pattern,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
+
 import click
+import io
+import os
+import profiling
+import sys
+
+# Everything else is imported where it's needed, so that startup stays quick,
+# particularly for things like --version that don't load the contacts at all
+if TYPE_CHECKING:
+    from age import AgeCalculator
+    from contact import Contact
+    from dedupe import DuplicateGroup
+    from fuzzy import FuzzyIndex, ShardedFuzzyIndex
+    from index import ContactIndex
+    from phonetic import PhoneticIndex, ShardedPhoneticIndex
+
+# Version, reported by --version and read by setup.py
+__version__ = "1.0"
 
 # List of keys we ignore in printing results
 IGNORED_KEYS = ["Nickname", "Role", "Org"]
@@ -14,113 +36,821 @@ IGNORED_KEYS = ["Nickname", "Role", "Org"]
 # Company keys that we print separately
 COMPANY_KEYS = ["Role", "Org"]
 
+# Colour and attributes of each style we render with
+STYLES = {
+    "count": ("green", ["bold"]),
+    "name": ("blue", ["bold"]),
+    "org": ("blue", None),
+    "detail": ("white", None),
+    "note": ("yellow", None),
+}
+
+# Number of contacts rendered in each chunk of output
+RENDER_CHUNK_SIZE = 500
+
+# Largest edit distance allowed for fuzzy searches
+MAX_FUZZY_DISTANCE = 3
+
+
+class FuzzyDistance(click.ParamType):
+    """
+    This class represents the edit distance given to --fuzzy.
+
+    The distance is optional, so a pattern given straight after --fuzzy would
+    be taken for the distance; this explains what to do instead.
+    """
+
+    name = "distance"
+
+    def convert(self, value, param, ctx) -> int:
+        """
+        Convert the value given on the command line to a distance.
+
+        Args:
+            value: The value given.
+            param: The parameter being converted.
+            ctx:   The command's context.
+
+        Returns:
+            int: The distance.
+        """
+        if isinstance(value, int) or (isinstance(value, str) and value.isdecimal()):
+            if 1 <= (distance := int(value)) <= MAX_FUZZY_DISTANCE:
+                return distance
+            self.fail(f"{value} is not from 1 to {MAX_FUZZY_DISTANCE}.", param, ctx)
+        self.fail(
+            f"{value!r} is not a distance; use --fuzzy=N, or put --fuzzy after "
+            "the patterns.",
+            param,
+            ctx,
+        )
+
 
 @click.command()
-@click.version_option()
-@click.argument("pattern", nargs=-1, required=True)
-def main(pattern: (str)):
+@click.version_option(__version__)
+@click.option(
+    "--engine",
+    type=click.Choice(["cache", "mmap", "store", "sqlite"]),
+    default="cache",
+    help="How to load the contact file.",
+)
+@click.option("--no-cache", is_flag=True, help="Bypass the contact file cache.")
+@click.option("--rebuild-cache", is_flag=True, help="Rebuild the contact file cache.")
+@click.option(
+    "--limit",
+    type=click.IntRange(min=1),
+    help="Stop reading the contact file after this many matches.",
+)
+@click.option("--first", is_flag=True, help="Stop at the first match.")
+@click.option(
+    "--top",
+    type=click.IntRange(min=1),
+    help="Show only this many matches, in name order.",
+)
+@click.option(
+    "--offset",
+    type=click.IntRange(min=0),
+    default=0,
+    help="Skip this many matches, in name order, before showing any.",
+)
+@click.option(
+    "--fuzzy",
+    type=FuzzyDistance(),
+    is_flag=False,
+    flag_value=1,
+    help=f"Allow up to N typos in each pattern (1 to {MAX_FUZZY_DISTANCE}, default 1).",
+)
+@click.option("--phonetic", is_flag=True, help="Also match names that sound alike.")
+@click.option(
+    "--regex", is_flag=True, help="Treat the patterns as regular expressions."
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="Number of processes to filter with (default: automatic).",
+)
+@click.option(
+    "--interactive", is_flag=True, help="Search as you type, starting from PATTERN."
+)
+@click.option(
+    "--dedupe", is_flag=True, help="Report contacts that look like duplicates."
+)
+@click.option("--pager", is_flag=True, help="Show the results in a pager.")
+@click.option("--profile", is_flag=True, help="Report the time spent in each phase.")
+@click.option(
+    "--profile-dump",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write cProfile statistics to this file.",
+)
+@click.option("--trace-memory", is_flag=True, help="Report the top memory allocators.")
+@click.option("--serve", is_flag=True, help="Run as a daemon serving other queries.")
+@click.argument("pattern", nargs=-1)
+def main(
+    pattern: (str),
+    engine: str,
+    no_cache: bool,
+    rebuild_cache: bool,
+    limit: int,
+    first: bool,
+    top: int,
+    offset: int,
+    fuzzy: int,
+    phonetic: bool,
+    regex: bool,
+    jobs: int,
+    interactive: bool,
+    dedupe: bool,
+    pager: bool,
+    profile: bool,
+    profile_dump: str,
+    trace_memory: bool,
+    serve: bool,
+):
     """
     The main application.
-
+    \f
     Args:
-        pattern: The pattern to search for.
+        pattern:       The pattern to search for.
+        engine:        How to load the contact file.
+        no_cache:      True to bypass the contact file cache.
+        rebuild_cache: True to rebuild the contact file cache.
+        limit:         The maximum number of matches to find, if any.
+        first:         True to stop at the first match.
+        top:           The number of matches to show, if not all of them.
+        offset:        The number of matches to skip before showing any.
+        fuzzy:         The number of typos to allow in each pattern, if any.
+        phonetic:      True to also match names that sound like the patterns.
+        regex:         True to treat the patterns as regular expressions.
+        jobs:          The number of processes to filter with, if not automatic.
+        interactive:   True to search as the user types.
+        dedupe:        True to report contacts that look like duplicates.
+        pager:         True to show the results in a pager.
+        profile:       True to report the time spent in each phase.
+        profile_dump:  The file to write cProfile statistics to, if any.
+        trace_memory:  True to report the top memory allocators.
+        serve:         True to run as a daemon serving other queries.
     """
 
-    # Load the list of contacts
-    contacts = load_contacts()
+    # Find the contact file or directory
+    import loader
+
+    contact_file = loader.contact_path()
+
+    # Run as a daemon, keeping the contacts in memory
+    if serve:
+        import daemon
+
+        daemon.serve(
+            contact_file, loader.load_contact_payload, run_query, loader.contact_files
+        )
+        return
+
+    # Make sure we've got something to search for, unless the user's going to
+    # type it, or we're looking for duplicates
+    if not (pattern or interactive or dedupe):
+        raise click.UsageError("Missing argument 'PATTERN...'.")
+
+    # Looking for duplicates checks every contact
+    searching = limit or first or top or offset or fuzzy or phonetic or regex
+    if dedupe and (pattern or searching or interactive):
+        raise click.UsageError(
+            "--dedupe checks every contact, so it can't be used with patterns or "
+            "search options."
+        )
+
+    # Searching as the user types needs a terminal, and shows every match in
+    # name order as plain patterns
+    if interactive and not (sys.stdin.isatty() and sys.stdout.isatty()):
+        raise click.UsageError("--interactive needs a terminal.")
+    if interactive and searching:
+        raise click.UsageError(
+            "--interactive can't be used with --limit, --first, --top, --offset, "
+            "--fuzzy, --phonetic or --regex."
+        )
+
+    # Stopping at the first match is the same as a limit of one
+    if first:
+        limit = 1
+
+    # Fuzzy matches are ranked, so they can't stop at the first few found
+    if fuzzy and limit:
+        raise click.UsageError("--fuzzy can't be used with --limit or --first.")
+    if fuzzy and phonetic:
+        raise click.UsageError("--fuzzy can't be used with --phonetic.")
+    if regex and (fuzzy or phonetic):
+        raise click.UsageError("--regex can't be used with --fuzzy or --phonetic.")
+
+    # Compile regular expressions before loading anything, so a bad one is
+    # reported straight away
+    regexes = None
+    if regex:
+        import re
+        from query import compile_regexes
+
+        try:
+            regexes = compile_regexes(pattern)
+        except re.error as e:
+            raise click.UsageError(f"Bad regular expression: {e}.")
+
+    # A pager is only any use on a terminal
+    pager = pager and sys.stdout.isatty()
+
+    # If the same query was run recently, and the contacts haven't changed
+    # since, its output is in the result cache, unless the caches are being
+    # bypassed or it's being profiled. The output is coloured here, for our
+    # terminal, and the colouring is part of the query.
+    colour = should_colour()
+    profiled = profile or profile_dump or trace_memory
+    results = key = None
+    uncached = no_cache or rebuild_cache or profiled or interactive or dedupe
+    if engine == "cache" and not uncached:
+        from results import ResultCache, query_key
+
+        results = ResultCache(contact_file, loader.fingerprint(contact_file))
+        key = query_key(
+            pattern,
+            regex=regex,
+            limit=limit,
+            top=top,
+            offset=offset,
+            fuzzy=fuzzy,
+            phonetic=phonetic,
+            colour=colour,
+        )
+        if (output := results.get(key)) is not None:
+            write_output(output, pager)
+            return
+
+    # If the daemon is running, it can answer normal queries, unless they're
+    # fuzzy, phonetic or regular expressions
+    if results and not (fuzzy or phonetic or regex):
+        import daemon
+
+        query = {
+            "pattern": pattern,
+            "limit": limit,
+            "top": top,
+            "offset": offset,
+            "jobs": jobs,
+            "colour": colour,
+        }
+        if (output := daemon.request(contact_file, query)) is not None:
+            results.put(key, output)
+            write_output(output, pager)
+            return
+
+    # Start profiling, if we've been asked to
+    if profiled:
+        profiling.start(profile, dump_file=profile_dump, trace_memory=trace_memory)
+
+    # Load the list of contacts. A mapped file, database or contact store is
+    # its own index, and regular expressions are run over a contact store's text.
+    # Otherwise, with a limit, we stream them from the contact file, so we can
+    # stop reading as soon as we have enough matches, unless the phonetic index
+    # needs to find them by position, or we need to know which keys they have
+    # to tell whether a pattern is scoped to one. A database is closed once
+    # we're done. Any problems with the contact file's format are part of the
+    # output, so they're captured along with it if it's going in the result
+    # cache.
+    from contextlib import nullcontext, redirect_stdout
+    from query import parse_pattern
+
+    captured = io.StringIO() if results else None
+    contacts: Iterable["Contact"]
+    database = None
+    stream = limit and not phonetic and not parse_pattern(pattern)[1]
+    try:
+        with profiling.phase("load"):
+
+            # Note the state of the contact files first, so the index for fuzzy
+            # or phonetic searches can be checked against the contacts
+            since = loader.snapshot() if fuzzy or phonetic else None
+
+            # Load the contacts
+            if engine == "mmap":
+                contacts, index = loader.load_mapped_contacts(), None
+            elif engine == "sqlite":
+                from database import DatabaseUnavailable
+
+                try:
+                    contacts = database = loader.load_database(
+                        use_cache=not no_cache, rebuild_cache=rebuild_cache
+                    )
+                except DatabaseUnavailable as e:
+                    raise click.UsageError(f"--engine sqlite can't be used: {e}.")
+                index = None
+            elif engine == "store" or regex:
+                contacts = loader.load_contact_store(
+                    use_cache=not no_cache, rebuild_cache=rebuild_cache
+                )
+                index = None
+            elif stream:
+                contacts, index = loader.iter_contacts(), None
+            else:
+                with redirect_stdout(captured) if results else nullcontext():
+                    contacts, index = loader.load_indexed_contacts(
+                        use_cache=not no_cache, rebuild_cache=rebuild_cache
+                    )
+
+            # Load the index for fuzzy or phonetic searches, making sure it
+            # was built from the same content as the contacts
+            fuzzy_index = phonetic_index = None
+            if fuzzy:
+                fuzzy_index = loader.load_fuzzy_index(
+                    contacts,
+                    use_cache=not no_cache,
+                    rebuild_cache=rebuild_cache,
+                    since=since,
+                )
+            if phonetic:
+                phonetic_index = loader.load_phonetic_index(
+                    contacts,
+                    use_cache=not no_cache,
+                    rebuild_cache=rebuild_cache,
+                    since=since,
+                )
+
+        # Report the duplicates, if that's what the user wants. Without a
+        # limit, the contacts were loaded rather than streamed.
+        if dedupe:
+            from dedupe import Duplicates
+
+            with profiling.phase("filter"):
+                groups = Duplicates(cast(Sequence["Contact"], contacts)).groups
+            if groups:
+                print_duplicates(groups, colour=colour, pager=pager)
+            else:
+                print("No duplicate contacts found")
+            return
+
+        # Search as the user types, if they want to; again, the contacts were
+        # loaded rather than streamed
+        if interactive:
+            import interactive as search
+            import shlex
+
+            loaded = cast(Sequence["Contact"], contacts)
+            search.run(loaded, shlex.join(pattern), colour=colour)
+            return
+
+        # Search for the contacts that match the user's input, capturing the
+        # output if it's going in the result cache
+        with redirect_stdout(captured) if results else nullcontext():
+            run_query(
+                contacts,
+                index,
+                pattern,
+                limit=limit,
+                top=top,
+                offset=offset,
+                fuzzy=fuzzy,
+                fuzzy_index=fuzzy_index,
+                phonetic_index=phonetic_index,
+                regexes=regexes,
+                jobs=jobs,
+                colour=colour,
+                pager=pager and not results,
+            )
+
+    # Report on the profile, and close the database
+    finally:
+        profiling.stop()
+        if database is not None:
+            database.close()
+
+    # Keep the output in the result cache, then show it
+    if results:
+        results.put(key, captured.getvalue())
+        write_output(captured.getvalue(), pager)
+
+
+def run_query(
+    contacts: Iterable["Contact"],
+    index: "ContactIndex",
+    pattern: (str),
+    limit: int = None,
+    top: int = None,
+    offset: int = 0,
+    fuzzy: int = None,
+    fuzzy_index: Union["FuzzyIndex", "ShardedFuzzyIndex"] = None,
+    phonetic_index: Union["PhoneticIndex", "ShardedPhoneticIndex"] = None,
+    regexes: List[Pattern] = None,
+    jobs: int = None,
+    colour: bool = None,
+    pager: bool = False,
+):
+    """
+    Search for and print the contacts that match the user's input.
 
-    # Search for the contacts that match the user's input
-    filtered = filter_contacts(contacts, pattern)
+    This is used both for queries run directly and for those run by the daemon.
+
+    Args:
+        contacts:       The contacts to search. They're only streamed for a
+                        plain search with a limit; otherwise they're a
+                        sequence.
+        index:          The index of the contacts, if there is one.
+        pattern:        The patterns to search for.
+        limit:          The maximum number of matches to find, if any.
+        top:            The number of matches to show, if not all of them.
+        offset:         The number of matches to skip before showing any.
+        fuzzy:          The number of typos to allow in each pattern, if any.
+        fuzzy_index:    The index for fuzzy searches, if they're allowed.
+        phonetic_index: The index for phonetic searches, if names that sound
+                        like the patterns should match too.
+        regexes:        The patterns compiled as regular expressions, if they're
+                        to be matched as such.
+        jobs:           The number of processes to filter with, if not automatic.
+        colour:         True to colour the output; None to colour it if it's a
+                        TTY.
+        pager:          True to show the output in a pager.
+    """
+
+    # Search for the contacts that match the user's input; fuzzy matches are
+    # ranked, closest first
+    from filter import filter_contacts, fuzzy_filter, regex_filter
+
+    with profiling.phase("filter"):
+        if fuzzy:
+            loaded = cast(Sequence["Contact"], contacts)
+            filtered = fuzzy_filter(loaded, pattern, fuzzy_index, fuzzy, index=index)
+        elif regexes is not None:
+            loaded = cast(Sequence["Contact"], contacts)
+            filtered = regex_filter(loaded, regexes, limit=limit)
+        else:
+            filtered = filter_contacts(
+                contacts,
+                pattern,
+                index=index,
+                limit=limit,
+                jobs=jobs,
+                phonetic=phonetic_index,
+            )
     if filtered:
-        print_contacts(filtered)
+        print_contacts(
+            filtered,
+            colour=colour,
+            pager=pager,
+            top=top,
+            offset=offset,
+            ranked=bool(fuzzy),
+        )
     else:
         print(f"No matching contacts found")
 
 
+def write_output(output: str, pager: bool = False):
+    """
+    Write output that's already been rendered.
+
+    Args:
+        output: The output.
+        pager:  True to show the output in a pager.
+    """
+    if pager:
+        click.echo_via_pager(output)
+    else:
+        sys.stdout.write(output)
+
+
+def should_colour() -> bool:
+    """
+    Decide whether to colour our output.
+
+    Output is coloured when it's going to a terminal, unless one of the
+    conventional environment variables says otherwise.
+
+    Returns:
+        bool: True if our output should be coloured; otherwise, False.
+    """
+
+    # Check the environment
+    if os.environ.get("ANSI_COLORS_DISABLED") or os.environ.get("NO_COLOR"):
+        return False
+    if os.environ.get("FORCE_COLOR"):
+        return True
+    if os.environ.get("TERM") == "dumb":
+        return False
+
+    # Check the output
+    try:
+        return sys.stdout.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
 # -----------------------------------------------------------------------------
 
 
-def print_contacts(contacts: List[Contact]):
+def print_contacts(
+    contacts: Sequence["Contact"],
+    colour: bool = None,
+    pager: bool = False,
+    top: int = None,
+    offset: int = 0,
+    ranked: bool = False,
+):
     """
     Print the list of matching contacts.
-    
+
+    The contacts can be a list or a ContactStore. The output is rendered into
+    a single buffer and written in one go, or streamed into a pager a chunk at
+    a time, so the first screen can be shown before the rest is rendered.
+
     Args:
         contacts: The list of contacts we found.
+        colour:   True to colour the output; None to colour it if it's a TTY.
+        pager:    True to show the output in a pager.
+        top:      The number of contacts to show, if not all of them.
+        offset:   The number of contacts to skip before showing any.
+        ranked:   True if the contacts are already in the order to show them.
+    """
+
+    # Decide whether to colour the output
+    if colour is None:
+        colour = should_colour()
+
+    # Render the output, then page it or write it
+    chunks = render_contacts(contacts, colour, top=top, offset=offset, ranked=ranked)
+    with profiling.phase("write"):
+        if pager:
+            click.echo_via_pager(chunks)
+        else:
+            sys.stdout.write("".join(chunks))
+
+
+def render_contacts(
+    contacts: Sequence["Contact"],
+    colour: bool,
+    top: int = None,
+    offset: int = 0,
+    ranked: bool = False,
+) -> Iterator[str]:
     """
+    Render the list of matching contacts.
 
-    # Print the match count
-    _print_match_count(len(contacts))
+    Unless they've already been ranked, the contacts are rendered in order of
+    name. When only the top few are wanted, they're picked out with a heap
+    bounded by the offset plus the number wanted, rather than by sorting every
+    contact, so the cost of ordering them grows with the number shown rather
+    than the number found, and the rest are never rendered at all. Either way,
+    the contacts shown are exactly those a full sort would put there.
 
-    # Sort the filtered contacts by name
-    contacts.sort(key=lambda x: x.name)
+    Args:
+        contacts: The list of contacts we found.
+        colour:   True to colour the output.
+        top:      The number of contacts to show, if not all of them.
+        offset:   The number of contacts to skip before showing any.
+        ranked:   True if the contacts are already in the order to show them.
+
+    Returns:
+        Iterator[str]: The output, in chunks of RENDER_CHUNK_SIZE contacts.
+    """
+
+    # Find the styles we render with, and fix the moment we calculate ages as of
+    from age import AgeCalculator
+
+    styles = _styles(colour)
+    ages = AgeCalculator()
+    count = len(contacts)
+
+    # Put the contacts we're showing in order of name, unless they're ranked
+    with profiling.phase("sort"):
+        if ranked:
+            contacts = contacts[: None if top is None else offset + top]
+        elif top is not None:
+            import heapq
+
+            contacts = heapq.nsmallest(offset + top, contacts, key=lambda x: x.name)
+        else:
+            contacts = sorted(contacts, key=lambda x: x.name)
+        if offset:
+            contacts = contacts[offset:]
+
+    # Render the match count, and which of the matches we're showing
+    if top is None and not offset:
+        yield _render_match_count(count, styles)
+    else:
+        yield _render_match_count(count, styles, offset, len(contacts))
 
     # Find the longest keyword in all contacts (we use this for formatting)
     longest_key = _find_longest_key(contacts)
 
-    # Print the contacts
-    for contact in contacts:
-        _print_contact(contact, longest_key)
+    # Render the contacts a chunk at a time
+    with profiling.phase("render"):
+        chunk = []
+        for contact in contacts:
+            chunk.append(_render_contact(contact, longest_key, styles, ages))
+            if len(chunk) == RENDER_CHUNK_SIZE:
+                yield "".join(chunk)
+                chunk = []
 
-    # Finish off
-    print("")
+        # Finish off
+        chunk.append("\n")
+        yield "".join(chunk)
 
 
-def _print_match_count(match_count: int):
+def print_duplicates(
+    groups: List["DuplicateGroup"], colour: bool = None, pager: bool = False
+):
     """
-    Print the number of matches we got.
-    
+    Print the groups of contacts that look like duplicates.
+
     Args:
-        match_count: The number of matches we got.
+        groups: The groups of duplicates.
+        colour: True to colour the output; None to colour it if it's a TTY.
+        pager:  True to show the output in a pager.
     """
 
-    match_pluralisation = "contact" if match_count == 1 else "contacts"
-    print("")
-    print(
-        colored(f"Found {match_count} {match_pluralisation}:", "green", attrs=["bold"])
+    # Decide whether to colour the output
+    if colour is None:
+        colour = should_colour()
+
+    # Render the output, then page it or write it
+    chunks = render_duplicates(groups, colour)
+    with profiling.phase("write"):
+        if pager:
+            click.echo_via_pager(chunks)
+        else:
+            sys.stdout.write("".join(chunks))
+
+
+def render_duplicates(groups: List["DuplicateGroup"], colour: bool) -> Iterator[str]:
+    """
+    Render the groups of contacts that look like duplicates.
+
+    Each group is rendered under a heading saying why its contacts look like
+    duplicates, with its contacts rendered just as render_contacts() renders
+    them.
+
+    Args:
+        groups: The groups of duplicates.
+        colour: True to colour the output.
+
+    Returns:
+        Iterator[str]: The output, a group at a time.
+    """
+
+    # Find the styles we render with, and fix the moment we calculate ages as of
+    from age import AgeCalculator
+
+    styles = _styles(colour)
+    ages = AgeCalculator()
+
+    # Render the number of duplicates, and of groups
+    before, after = styles["count"]
+    count = sum(len(group.contacts) for group in groups)
+    group_pluralisation = "group" if len(groups) == 1 else "groups"
+    yield (
+        f"\n{before}Found {count} possible duplicates, in {len(groups)} "
+        f"{group_pluralisation}:{after}\n"
     )
 
+    # Render each group
+    with profiling.phase("render"):
+        for group in groups:
+            reasons = ", ".join(group.reasons[:-1])
+            if reasons:
+                reasons += " and "
+            reasons = (reasons + group.reasons[-1]).capitalize()
+            longest_key = _find_longest_key(group.contacts)
+            yield f"\n{before}{reasons}:{after}\n" + "".join(
+                _render_contact(contact, longest_key, styles, ages)
+                for contact in group.contacts
+            )
+        yield "\n"
+
+
+def _styles(colour: bool) -> Dict[str, Tuple[str, str]]:
+    """
+    Find the escape sequences for each of the styles we render with.
+
+    Each style is rendered once, here, rather than for every line of output.
+    When we're not colouring the output, the styles are all empty, and no
+    escape sequences are generated at all.
+
+    Args:
+        colour: True to colour the output.
 
-def _print_contact(contact: Contact, longest_key: int):
+    Returns:
+        {str: (str, str)}: The text to put before and after text in each style.
     """
-    Print a contact's details.
-    
+
+    # No colour, no escape sequences
+    if not colour:
+        return {style: ("", "") for style in STYLES}
+
+    # Render each style around a marker, then split it either side of the marker
+    from termcolor import colored
+
+    styles = {}
+    for style, (color, attrs) in STYLES.items():
+        marked = colored("\0", color, attrs=attrs, force_color=True)
+        before, _, after = marked.partition("\0")
+        styles[style] = (before, after)
+    return styles
+
+
+def _render_match_count(
+    match_count: int,
+    styles: Dict[str, Tuple[str, str]],
+    offset: int = None,
+    shown: int = None,
+) -> str:
+    """
+    Render the number of matches we got.
+
+    Args:
+        match_count: The number of matches we got.
+        styles:      The styles to render with.
+        offset:      The number of matches skipped, if only some are shown.
+        shown:       The number of matches shown, if only some are.
+
+    Returns:
+        str: The rendered match count.
+    """
+
+    # Count the matches
+    match_pluralisation = "contact" if match_count == 1 else "contacts"
+    found = f"Found {match_count} {match_pluralisation}"
+
+    # Say which of them we're showing
+    if shown is not None:
+        if shown:
+            found += f", showing {offset + 1} to {offset + shown}"
+        else:
+            found += ", showing none"
+
+    # Render it
+    before, after = styles["count"]
+    return f"\n{before}{found}:{after}\n"
+
+
+def _render_contact(
+    contact: "Contact",
+    longest_key: int,
+    styles: Dict[str, Tuple[str, str]],
+    ages: "AgeCalculator",
+) -> str:
+    """
+    Render a contact's details.
+
     Args:
-        contact:     The contact to print.
+        contact:     The contact to render.
         longest_key: The longest keyword in all matching contacts.
+        styles:      The styles to render with.
+        ages:        The calculator to work out ages with.
+
+    Returns:
+        str: The rendered details.
     """
-    _print_name(contact)
-    _print_keywords(contact, longest_key)
-    _print_notes(contact)
+    return (
+        _render_name(contact, styles)
+        + _render_keywords(contact, longest_key, styles, ages)
+        + _render_notes(contact, styles)
+    )
 
 
-def _print_name(contact: Contact):
+def _render_name(contact: "Contact", styles: Dict[str, Tuple[str, str]]) -> str:
     """
-    Print a contact's name.
-    
+    Render a contact's name.
+
     Args:
-        contact: The contact to print details for.
+        contact: The contact to render details for.
+        styles:  The styles to render with.
+
+    Returns:
+        str: The rendered name.
     """
 
     # Find the contact's organisation and role.
     org_and_role = contact.org_and_role()
 
-    # Print the name.
-    print("")
-    print(colored(contact.name, "blue", attrs=["bold"]), end="")
+    # Render the name.
+    before, after = styles["name"]
+    name = f"\n{before}{contact.name}{after}"
     if org_and_role:
-        print(colored(org_and_role, "blue"))
-    else:
-        print("")
-    print("")
+        before, after = styles["org"]
+        name += f"{before}{org_and_role}{after}"
+    return name + "\n\n"
 
 
-def _print_keywords(contact: Contact, longest_key: int):
+def _render_keywords(
+    contact: "Contact",
+    longest_key: int,
+    styles: Dict[str, Tuple[str, str]],
+    ages: "AgeCalculator",
+) -> str:
     """
-    Print a contact's keywords.
-    
+    Render a contact's keywords.
+
     Args:
-        contact:     The contact to print.
+        contact:     The contact to render.
         longest_key: The longest keyword in all matching contacts.
+        styles:      The styles to render with.
+        ages:        The calculator to work out ages with.
+
+    Returns:
+        str: The rendered keywords, one per line.
     """
 
     # Get a copy of the key/value list, then sort it
@@ -128,6 +858,8 @@ def _print_keywords(contact: Contact, longest_key: int):
     kv_pairs.sort()
 
     # Visit the list of keys
+    before, after = styles["detail"]
+    lines = []
     for kv in kv_pairs:
 
         # Ignore those in our ignore list
@@ -140,28 +872,33 @@ def _print_keywords(contact: Contact, longest_key: int):
         # Format the value
         formatted_value = kv.value
         if kv.key.lower() == "dob":
-            formatted_value = formatted_value + _calculate_age(kv.value)
+            formatted_value = formatted_value + _calculate_age(kv.value, ages)
 
-        # Find the value, determine the required spacing, then print
+        # Find the value, determine the required spacing, then render
         spacing = longest_key - len(kv.key)
         dots = "." * (spacing + 3)
-        print(colored(f"   {formatted_key} {dots} {formatted_value}", "white"))
+        lines.append(f"{before}   {formatted_key} {dots} {formatted_value}{after}\n")
+
+    # Done
+    return "".join(lines)
 
 
-def _print_notes(contact: Contact):
+def _render_notes(contact: "Contact", styles: Dict[str, Tuple[str, str]]) -> str:
     """
-    Print a contact's notes.
-    
+    Render a contact's notes.
+
     Args:
-        contact: The contact to print details for.
-    """
+        contact: The contact to render details for.
+        styles:  The styles to render with.
 
-    # Print notes
-    for note in contact.notes:
-        print(colored(f"   - {note}", "yellow"))
+    Returns:
+        str: The rendered notes, one per line.
+    """
+    before, after = styles["note"]
+    return "".join(f"{before}   - {note}{after}\n" for note in contact.notes)
 
 
-def _find_longest_key(contacts: List[Contact]) -> int:
+def _find_longest_key(contacts: Iterable["Contact"]) -> int:
     """
     Find the longest key in the details we're printing for a list of contacts.
     
@@ -179,33 +916,21 @@ def _find_longest_key(contacts: List[Contact]) -> int:
     return longest
 
 
-def _calculate_age(dob: str) -> str:
+def _calculate_age(dob: str, ages: "AgeCalculator") -> str:
     """
     Calculate someone's age given their date-of-birth.
     
     Args:
-        dob: The date of birth, formatted as yyyy-mm-dd.
+        dob:  The date of birth, formatted as yyyy-mm-dd.
+        ages: The calculator to work out the age with.
     
     Returns:
         str: A text description of the person's age.
     """
 
-    # Catch problems
-    try:
-
-        # Make sure the date-of-birth is formatted ok.
-        birth_date = datetime.datetime.strptime(dob, "%Y-%m-%d")
-
-        # Find today's date
-        today = datetime.datetime.today()
-
-        # Calculate difference
-        age = relativedelta(today, birth_date).years
-        return f" (aged {age})"
-
-    # Parse problem -- ignore it
-    except ValueError:
-        return ""
+    # Calculate the age, ignoring dates we can't parse
+    age = ages.age(dob)
+    return "" if age is None else f" (aged {age})"
 
 
 if __name__ == "__main__":
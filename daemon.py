@@ -0,0 +1,253 @@
+from cache import RACY_WINDOW_NS, file_hash
+from typing import Callable, Dict, List, Optional, Tuple
+
+import json
+import os
+import socket
+import sys
+import time
+
+# Suffix added to the contact file's name to give the name of the daemon's socket
+SOCKET_SUFFIX = ".sock"
+
+# Size of the chunks we read responses in
+READ_SIZE = 65536
+
+
+def socket_file(contact_file: str) -> str:
+    """
+    Get the name of the socket the daemon for a contact file listens on.
+
+    Args:
+        contact_file: The contact file.
+
+    Returns:
+        str: The name of the socket.
+    """
+    return os.path.abspath(contact_file) + SOCKET_SUFFIX
+
+
+def request(contact_file: str, query: dict) -> Optional[str]:
+    """
+    Ask the daemon to run a query.
+
+    Args:
+        contact_file: The contact file the query is for.
+        query:        The query, as accepted by the daemon's query function.
+
+    Returns:
+        str: The query's output, or None if the daemon isn't running or
+        couldn't run the query.
+    """
+
+    # Connect to the daemon, send the query, and read the response
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_file(contact_file))
+            client.sendall(json.dumps(query).encode() + b"\n")
+            client.shutdown(socket.SHUT_WR)
+            chunks = []
+            while chunk := client.recv(READ_SIZE):
+                chunks.append(chunk)
+        response = json.loads(b"".join(chunks))
+
+    # No daemon, or it went away
+    except (OSError, ValueError):
+        return None
+
+    # Return its output
+    return response.get("output")
+
+
+def serve(
+    contact_file: str,
+    load: Callable[..., dict],
+    run_query: Callable,
+    files: Callable[[], List[str]] = None,
+):
+    """
+    Run the daemon.
+
+    The daemon loads the contacts once and keeps them in memory, answering
+    queries sent to its socket until it's interrupted or terminated. Before
+    each query, it checks whether any of the files the contacts are kept in has
+    changed, and reloads the contacts if one has, passing the load function the
+    payload it already has so that only what changed needs to be parsed again.
+
+    A query is a dictionary of keyword arguments for the query function, which
+    is called with the resident contacts and their index and prints its output.
+    The output is captured and sent back as the response, after any problems
+    found with the format of the contact files, just as they're printed when
+    the query is run directly.
+
+    Args:
+        contact_file: The contact file.
+        load:         Function that loads the payload holding the contacts,
+                      their index and the problems found parsing them, given
+                      the previous payload, if any.
+        run_query:    Function that runs a query and prints its output.
+        files:        Function that lists the files the contacts are kept in;
+                      by default, just the contact file.
+    """
+
+    # Load the server side, which a client sending a query doesn't need
+    import signal
+    import socketserver
+
+    # Make sure another daemon isn't already running
+    path = socket_file(contact_file)
+    if os.path.exists(path):
+        if request(contact_file, {}) is not None:
+            raise SystemExit(f"The contacts daemon is already running ({path})")
+        os.remove(path)
+
+    # Create the server; only this user can connect to it
+    resident = _Resident(files or (lambda: [contact_file]), load)
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(path, _handler_for(resident, run_query))
+    finally:
+        os.umask(old_umask)
+
+    # Serve until we're stopped, then tidy up
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        print(f"Serving contacts on {path}")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+class _Resident:
+    """
+    This class represents the contacts the daemon keeps in memory.
+
+    The contacts are reloaded whenever the inode, size or modification time of
+    one of their files changes. A file modified within RACY_WINDOW_NS of being
+    loaded could be changed again without any of those changing, so its
+    content is hashed as well, and checked before each query until it's old
+    enough for its status to be trusted, just as the contact file cache does.
+    """
+
+    def __init__(self, files: Callable[[], List[str]], load: Callable[..., dict]):
+        """
+        Load the contacts.
+
+        Args:
+            files: Function that lists the files the contacts are kept in.
+            load:  Function that loads the payload holding the contacts,
+                   their index and the problems found parsing them, given the
+                   previous payload, if any.
+        """
+        self.files = files
+        self.load = load
+        self.signature: Optional[List[Tuple[str, int, int, int]]] = None
+        self.payload: Optional[dict] = None
+        self.hashes: Dict[str, Tuple[int, Optional[str]]] = {}
+        self.current()
+
+    def current(self) -> tuple:
+        """
+        Get the current contacts, reloading them if any of their files changed.
+
+        Returns:
+            tuple: The contacts, their index and the problems found parsing
+            them.
+        """
+
+        # Reload if the files, or any of their contents, have changed. The
+        # recently modified files are hashed before they're loaded, so a change
+        # while they're being loaded is caught next time.
+        signature = []
+        for file in self.files():
+            stat = os.stat(file)
+            signature.append((file, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        if signature != self.signature or self._racy_file_changed():
+            recent = time.time_ns() - RACY_WINDOW_NS
+            hashes = {
+                file: (mtime_ns, file_hash(file))
+                for file, *_, mtime_ns in signature
+                if mtime_ns >= recent
+            }
+            self.payload = self.load(previous=self.payload)
+            self.signature, self.hashes = signature, hashes
+
+        # Done
+        payload = self.payload
+        return payload["contacts"], payload["index"], payload["warnings"]
+
+    def _racy_file_changed(self) -> bool:
+        """
+        Check whether the content of any file modified too recently for its
+        status to be trusted has changed.
+
+        A file that's unchanged, and was modified long enough ago that any
+        further change would change its status, isn't checked again.
+
+        Returns:
+            bool: True if a file's content has changed; otherwise, False.
+        """
+        recent = time.time_ns() - RACY_WINDOW_NS
+        for file, (mtime_ns, digest) in list(self.hashes.items()):
+            if file_hash(file) != digest:
+                return True
+            if mtime_ns < recent:
+                del self.hashes[file]
+        return False
+
+
+def _handler_for(resident: _Resident, run_query: Callable) -> type:
+    """
+    Build the request handler class for the daemon.
+
+    Args:
+        resident:  The resident contacts.
+        run_query: Function that runs a query and prints its output.
+
+    Returns:
+        type: The request handler class.
+    """
+
+    # Load the server side
+    from contextlib import redirect_stdout
+
+    import io
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        """
+        This class handles a single query sent to the daemon.
+        """
+
+        def handle(self):
+            """
+            Read a query, run it, and send back its output.
+            """
+
+            # Read the query; an empty query is just checking we're here
+            try:
+                query = json.loads(self.rfile.readline())
+                if not query:
+                    response = {"output": ""}
+
+                # Run it, capturing its output
+                else:
+                    contacts, index, warnings = resident.current()
+                    output = io.StringIO()
+                    with redirect_stdout(output):
+                        for _, message in warnings:
+                            print(message)
+                        run_query(contacts, index, **query)
+                    response = {"output": output.getvalue()}
+
+            # Report problems to the client, which will then run the query itself
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+
+            # Send the response
+            self.wfile.write(json.dumps(response).encode())
+
+    return Handler
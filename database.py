@@ -0,0 +1,499 @@
+from blocks import BlockMap
+from cache import RACY_WINDOW_NS, content_hash
+from contact import SEARCH_TEXT_SEP, Contact, KeyValue
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    overload,
+)
+
+import os
+import pickle
+import sqlite3
+import sys
+import time
+
+# Database format version -- bump this whenever the schema changes, so that old
+# databases are rebuilt rather than misread
+DATABASE_VERSION = 1
+
+# Shortest pattern the full-text index can find; it's made of trigrams
+MIN_PATTERN_LENGTH = 3
+
+# Oldest SQLite with the trigram tokenizer the full-text index is built with
+MIN_SQLITE_VERSION = "3.34"
+
+# Number of contacts decoded with each query when visiting every contact
+FETCH_CHUNK_SIZE = 10000
+
+# Tables making up the database; the full-text index holds each contact's
+# search text under the contact's id, with its fields on separate lines, since
+# SQLite's text functions stop at the null characters that usually separate them
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contacts_position ON contacts (position);
+CREATE TABLE IF NOT EXISTS kv_pairs (
+    contact_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (contact_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS notes (
+    contact_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    note TEXT NOT NULL,
+    PRIMARY KEY (contact_id, seq)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5 (text, tokenize = 'trigram');
+"""
+
+# The tables, in the order they're dropped when the database is rebuilt
+_TABLES = ["search", "notes", "kv_pairs", "contacts", "meta"]
+
+
+class DatabaseUnavailable(Exception):
+    """
+    This exception is raised when the SQLite Python was built with can't hold
+    the contacts, because it's too old or doesn't have FTS5.
+    """
+
+
+class ContactDatabase(Sequence[Contact]):
+    """
+    This class represents the contacts mirrored into a SQLite database.
+
+    Contacts, their key/value pairs and their notes are kept in tables of their
+    own, and each contact's search text is kept in a full-text index tokenised
+    into trigrams. The contact file stays the source of truth: sync() brings
+    the database up to date with it, re-parsing only the blocks that changed,
+    just as the contact file cache does.
+
+    The object behaves as a read-only list of contacts, decoding each one from
+    the tables on demand, and as an index of itself: candidates() asks the
+    full-text index for the contacts containing every pattern, so it can be
+    passed to filter_contacts() as both the contacts and their index. The
+    candidates still have to be checked, since the index folds case in its
+    own way.
+    """
+
+    def __init__(self, database_file: str):
+        """
+        Open a database, creating it if need be.
+
+        The database is open until close() is called.
+
+        Args:
+            database_file: The database file, or ":memory:" for a database that
+                           isn't kept.
+
+        Raises:
+            DatabaseUnavailable: If this SQLite can't hold the database.
+        """
+
+        # Connect to it; it's only read and written by one process at a time
+        self.connection = sqlite3.connect(database_file)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+
+        # Create the tables, dropping the old ones if they're a different
+        # version
+        if self._meta("version") not in (None, DATABASE_VERSION):
+            with self.connection:
+                for table in _TABLES:
+                    self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+        try:
+            with self.connection:
+                self.connection.executescript(_SCHEMA)
+                self._set_meta(version=DATABASE_VERSION)
+
+        # The full-text index can't be created without the trigram tokenizer
+        except sqlite3.OperationalError as e:
+            self.close()
+            raise DatabaseUnavailable(
+                f"it needs SQLite {MIN_SQLITE_VERSION} or later, with FTS5, but "
+                f"this is SQLite {sqlite3.sqlite_version} ({e})"
+            )
+        self._count = self._count_contacts()
+
+    def __len__(self) -> int:
+        """
+        Get the number of contacts in the database.
+
+        Returns:
+            int: The number of contacts.
+        """
+        return self._count
+
+    @overload
+    def __getitem__(self, position: int) -> Contact:
+        ...
+
+    @overload
+    def __getitem__(self, position: slice) -> List[Contact]:
+        ...
+
+    def __getitem__(self, position):
+        """
+        Decode a contact, or each contact in a slice.
+
+        Args:
+            position: The position of the contact in the contact file, or a slice of
+                      positions.
+
+        Returns:
+            Contact: The decoded contact, or a list of them for a slice.
+        """
+
+        # Decode a slice a contact at a time
+        if isinstance(position, slice):
+            return self.fetch(range(*position.indices(len(self))))
+
+        # Allow negative positions, and catch bad ones
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("contact position out of range")
+
+        # Decode it
+        return self.fetch([position])[0]
+
+    def __iter__(self) -> Iterator[Contact]:
+        """
+        Decode each contact in turn.
+
+        Returns:
+            Iterator[Contact]: The contacts, in file order.
+        """
+        for start in range(0, len(self), FETCH_CHUNK_SIZE):
+            end = min(start + FETCH_CHUNK_SIZE, len(self))
+            yield from self.fetch(range(start, end))
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self.connection.close()
+
+    def fetch(self, positions: Iterable[int]) -> List[Contact]:
+        """
+        Decode several contacts at once.
+
+        The contacts are found with one query for each table, rather than
+        several queries for each contact.
+
+        Args:
+            positions: The positions of the contacts in the contact file.
+
+        Returns:
+            [Contact]: The decoded contacts, in the order their positions were
+            given.
+        """
+
+        # Record the contacts we want
+        positions = list(positions)
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS wanted (position INTEGER PRIMARY KEY)"
+        )
+        cursor.execute("DELETE FROM wanted")
+        cursor.executemany(
+            "INSERT OR IGNORE INTO wanted VALUES (?)", ((p,) for p in positions)
+        )
+
+        # Find their names, then their key/value pairs and notes, in order
+        found: Dict[int, Contact] = {}
+        by_id: Dict[int, Contact] = {}
+        for contact_id, position, name in cursor.execute(
+            "SELECT id, contacts.position, name FROM wanted "
+            "JOIN contacts ON contacts.position = wanted.position"
+        ):
+            contact = Contact(name=name, kv_pairs=[], notes=[])
+            found[position] = by_id[contact_id] = contact
+        for contact_id, key, value in cursor.execute(
+            "SELECT contact_id, key, value FROM wanted "
+            "JOIN contacts ON contacts.position = wanted.position "
+            "JOIN kv_pairs ON contact_id = id ORDER BY contact_id, seq"
+        ):
+            by_id[contact_id].kv_pairs.append(
+                KeyValue(key=sys.intern(key), value=value)
+            )
+        for contact_id, note in cursor.execute(
+            "SELECT contact_id, note FROM wanted "
+            "JOIN contacts ON contacts.position = wanted.position "
+            "JOIN notes ON contact_id = id ORDER BY contact_id, seq"
+        ):
+            by_id[contact_id].notes.append(note)
+
+        # Done
+        return [found[p] for p in positions]
+
+    def candidates(self, pattern: Iterable[str]) -> Optional[Set[int]]:
+        """
+        Find the positions of the contacts that might match all patterns.
+
+        Each pattern at least MIN_PATTERN_LENGTH long is searched for as a
+        phrase in the full-text index, which finds it anywhere in a contact's
+        search text. Shorter patterns can't be searched for, so they're
+        ignored. If none of the patterns can be searched for, None is returned
+        to show that every contact is a candidate.
+
+        Args:
+            pattern: The patterns to match, already in lower case.
+
+        Returns:
+            {int}: The positions of the candidate contacts, or None.
+        """
+
+        # Quote each pattern as a phrase, and find the contacts with them all
+        phrases = [
+            '"' + p.replace('"', '""') + '"'
+            for p in pattern
+            if len(p) >= MIN_PATTERN_LENGTH
+        ]
+        if not phrases:
+            return None
+        rows = self.connection.execute(
+            "SELECT position FROM search JOIN contacts ON id = search.rowid "
+            "WHERE search MATCH ?",
+            (" AND ".join(phrases),),
+        )
+        return {position for position, in rows}
+
+    def has_key(self, key: str) -> bool:
+        """
+        Check whether any contact has a key.
+
+        Args:
+            key: The key, in lower case.
+
+        Returns:
+            bool: True if a contact has the key; otherwise, False.
+        """
+        rows = self.connection.execute(
+            "SELECT 1 FROM kv_pairs WHERE lower(key) = ? LIMIT 1", (key,)
+        )
+        return rows.fetchone() is not None
+
+    def sync(
+        self,
+        contact_file: str,
+        parse: Callable[[bytes], List[Contact]],
+        rebuild: bool = False,
+    ):
+        """
+        Bring the database up to date with a contact file.
+
+        While the contact file's path, size and modification time are those it
+        had when the database was last synced, nothing is read at all.
+        Otherwise the file is read, and if its content has changed, only the
+        blocks that changed are parsed, and their contacts replace the old
+        ones in every table.
+
+        Args:
+            contact_file: The contact file.
+            parse:        Function that parses raw contact file content.
+            rebuild:      True to rebuild the database from scratch.
+        """
+
+        # Nothing to do if the file's status says it hasn't changed
+        path = os.path.abspath(contact_file)
+        stat = os.stat(path)
+        if not rebuild and self._is_current(path, stat):
+            return
+
+        # Read the file; a changed timestamp doesn't mean changed content
+        with open(path, "rb") as file:
+            data = file.read()
+        digest = content_hash(data)
+        with self.connection:
+            if rebuild or self._meta("path") != path:
+                self._rebuild(data, parse)
+            elif self._meta("hash") != digest:
+                self._update(data, parse)
+
+            # Record the state we synced with
+            self._set_meta(
+                path=path,
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                hash=digest,
+                written_ns=time.time_ns(),
+            )
+        self._count = self._count_contacts()
+
+    def _is_current(self, path: str, stat: os.stat_result) -> bool:
+        """
+        Check whether the database was last synced with a contact file in its
+        current state.
+
+        Args:
+            path: The absolute path of the contact file.
+            stat: The contact file's current status.
+
+        Returns:
+            bool: True if the database is current; otherwise, False.
+        """
+
+        # Check the path and status first
+        mtime_ns = self._meta("mtime_ns")
+        if (
+            self._meta("path") != path
+            or self._meta("size") != stat.st_size
+            or mtime_ns != stat.st_mtime_ns
+        ):
+            return False
+
+        # If the file was written just before it was synced, its status can't
+        # be trusted, so its content has to be checked as well
+        return mtime_ns < self._meta("written_ns") - RACY_WINDOW_NS
+
+    def _rebuild(self, data: bytes, parse: Callable[[bytes], List[Contact]]):
+        """
+        Replace every contact in the database.
+
+        Args:
+            data:  The raw content of the contact file.
+            parse: Function that parses raw contact file content.
+        """
+        cursor = self.connection.cursor()
+        for table in _TABLES[:-1]:
+            cursor.execute(f"DELETE FROM {table}")
+        self._insert(0, parse(data))
+        self._set_meta(blocks=pickle.dumps(BlockMap(data)))
+
+    def _update(self, data: bytes, parse: Callable[[bytes], List[Contact]]):
+        """
+        Replace the contacts whose blocks changed in the contact file.
+
+        Args:
+            data:  The new raw content of the contact file.
+            parse: Function that parses raw contact file content.
+        """
+
+        # Find the blocks that changed; if we can't, rebuild from scratch
+        blocks = self._meta("blocks")
+        blocks = pickle.loads(blocks) if blocks is not None else None
+        if not blocks or (change := blocks.update(data)) is None:
+            self._rebuild(data, parse)
+            return
+
+        # Parse the changed blocks, and make sure each block gave one contact
+        start, stop, first, last = change
+        added = parse(data[first:last])
+        if self._count_contacts() - (stop - start) + len(added) != len(blocks):
+            self._rebuild(data, parse)
+            return
+
+        # Delete the old contacts, move the ones after them, then add the new
+        cursor = self.connection.cursor()
+        old = "SELECT id FROM contacts WHERE position >= ? AND position < ?"
+        for table, column in (
+            ("search", "rowid"),
+            ("notes", "contact_id"),
+            ("kv_pairs", "contact_id"),
+            ("contacts", "id"),
+        ):
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {column} IN ({old})", (start, stop)
+            )
+        cursor.execute(
+            "UPDATE contacts SET position = position + ? WHERE position >= ?",
+            (len(added) - (stop - start), stop),
+        )
+        self._insert(start, added)
+        self._set_meta(blocks=pickle.dumps(blocks))
+
+    def _insert(self, position: int, contacts: List[Contact]):
+        """
+        Add contacts to every table.
+
+        Args:
+            position: The position of the first contact in the contact file.
+            contacts: The contacts.
+        """
+
+        # Give the contacts new ids
+        cursor = self.connection.cursor()
+        first_id = cursor.execute(
+            "SELECT COALESCE(MAX(id), 0) + 1 FROM contacts"
+        ).fetchone()[0]
+        ids = range(first_id, first_id + len(contacts))
+
+        # Add them
+        cursor.executemany(
+            "INSERT INTO contacts VALUES (?, ?, ?)",
+            ((i, position + n, c.name) for n, (i, c) in enumerate(zip(ids, contacts))),
+        )
+        cursor.executemany(
+            "INSERT INTO kv_pairs VALUES (?, ?, ?, ?)",
+            (
+                (i, seq, kv.key, kv.value)
+                for i, c in zip(ids, contacts)
+                for seq, kv in enumerate(c.kv_pairs)
+            ),
+        )
+        cursor.executemany(
+            "INSERT INTO notes VALUES (?, ?, ?)",
+            (
+                (i, seq, note)
+                for i, c in zip(ids, contacts)
+                for seq, note in enumerate(c.notes)
+            ),
+        )
+        cursor.executemany(
+            "INSERT INTO search (rowid, text) VALUES (?, ?)",
+            (
+                (i, c.search_text().replace(SEARCH_TEXT_SEP, "\n"))
+                for i, c in zip(ids, contacts)
+            ),
+        )
+
+    def _count_contacts(self) -> int:
+        """
+        Count the contacts in the database.
+
+        Returns:
+            int: The number of contacts.
+        """
+        return self.connection.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+    def _meta(self, key: str):
+        """
+        Get something recorded about the database.
+
+        Args:
+            key: What was recorded.
+
+        Returns:
+            Any: The value recorded, or None if nothing was.
+        """
+        try:
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def _set_meta(self, **values):
+        """
+        Record things about the database.
+
+        Args:
+            values: The values to record, by key.
+        """
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)", values.items()
+        )
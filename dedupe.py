@@ -0,0 +1,270 @@
+from contact import Contact
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from phonetic import soundex
+from typing import Dict, List, Sequence, Set, Tuple
+
+import re
+import unicodedata
+
+# Pattern matching a word: a run of letters and digits
+_WORD = re.compile(r"[^\W_]+")
+
+# Pattern matching anything that isn't a digit
+_NON_DIGIT = re.compile(r"\D+")
+
+# Fewest digits a phone number needs to be compared; shorter ones, such as
+# extensions, are shared by too many people
+MIN_PHONE_DIGITS = 7
+
+# Number of trailing digits phone numbers are compared on, so the same number
+# written with and without its country code, as in "+44 118 999 881" and
+# "0118 999 881", is the same
+PHONE_DIGITS = 9
+
+# Largest block whose contacts are compared with each other. A key shared by
+# more contacts than this, such as a switchboard number, says little about any
+# two of them, and comparing every pair would make the search quadratic.
+MAX_BLOCK_SIZE = 100
+
+# Amount a shared email address or phone number adds to the similarity of two
+# contacts' names
+IDENTIFIER_WEIGHT = 0.4
+
+# Lowest score for two contacts to be reported as duplicates
+DUPLICATE_SCORE = 0.85
+
+
+@dataclass
+class DuplicateGroup:
+    """
+    This class represents a group of contacts that look like the same person.
+    """
+
+    # The contacts, in order of name
+    contacts: List[Contact]
+
+    # Why they look like duplicates, such as "same email", in alphabetical order
+    reasons: List[str]
+
+
+class Duplicates:
+    """
+    This class represents the groups of contacts that look like duplicates.
+
+    Comparing every pair of contacts would take quadratic time, so contacts are
+    blocked first: each contact is put in a hash map under a few keys that
+    duplicates are likely to share -- its email addresses, the digits of its
+    phone numbers, its name's words in any order, and the Soundex codes of its
+    name's words -- and only contacts in the same block are compared. Each
+    pair is scored once, by the similarity of their names, plus
+    IDENTIFIER_WEIGHT if they share an email address or phone number, and the
+    pairs that score DUPLICATE_SCORE or more are merged into groups with a
+    union-find, so duplicates of duplicates end up together.
+    """
+
+    def __init__(self, contacts: Sequence[Contact]):
+        """
+        Find the duplicates in a list of contacts.
+
+        Args:
+            contacts: The contacts to search.
+        """
+
+        # Put each contact in a block under each of its keys
+        names: List[str] = []
+        identifiers: List[Set[str]] = []
+        blocks: Dict[str, List[int]] = {}
+        codes: Dict[str, str] = {}
+        for position, contact in enumerate(contacts):
+            words = name_words(contact)
+            names.append(" ".join(words))
+            identifiers.append(contact_identifiers(contact))
+            for key in blocking_keys(words, identifiers[-1], codes):
+                if (block := blocks.get(key)) is None:
+                    blocks[key] = [position]
+                else:
+                    block.append(position)
+
+        # Score each pair of contacts that share a block, once
+        self.skipped = 0
+        self._parents = list(range(len(names)))
+        self._reasons: Dict[int, Set[str]] = {}
+        paired: Set[int] = set()
+        scored: Set[Tuple[int, int]] = set()
+        for block in blocks.values():
+            if len(block) > MAX_BLOCK_SIZE:
+                self.skipped += 1
+                continue
+            for i, first in enumerate(block):
+                for second in block[i + 1 :]:
+                    if (first, second) in scored:
+                        continue
+                    scored.add((first, second))
+                    shared = identifiers[first] & identifiers[second]
+                    if reasons := _match(names[first], names[second], shared):
+                        self._union(first, second, reasons)
+                        paired.update((first, second))
+
+        # Gather the groups, each in order of name, then put them in order of
+        # their first names. A group merged from pairs with the same name and
+        # pairs with similar names is only said to have the same name.
+        members: Dict[int, List[Contact]] = {}
+        for position in paired:
+            members.setdefault(self._find(position), []).append(contacts[position])
+        for reasons in self._reasons.values():
+            if "same name" in reasons:
+                reasons.discard("similar names")
+        self.groups = [
+            DuplicateGroup(
+                sorted(group, key=lambda x: x.name), sorted(self._reasons[root])
+            )
+            for root, group in members.items()
+        ]
+        self.groups.sort(key=lambda x: x.contacts[0].name)
+
+    def _find(self, position: int) -> int:
+        """
+        Find the contact that represents a contact's group.
+
+        Args:
+            position: The contact's position.
+
+        Returns:
+            int: The position of the contact representing its group.
+        """
+
+        # Find the root, then point everything on the way straight at it
+        parents = self._parents
+        root = position
+        while parents[root] != root:
+            root = parents[root]
+        while parents[position] != root:
+            parents[position], position = root, parents[position]
+        return root
+
+    def _union(self, first: int, second: int, reasons: Set[str]):
+        """
+        Put two contacts in the same group.
+
+        Args:
+            first:   The position of one contact.
+            second:  The position of the other.
+            reasons: Why they look like duplicates.
+        """
+        first_root, second_root = self._find(first), self._find(second)
+        if first_root != second_root:
+            self._parents[first_root] = second_root
+            reasons = reasons | self._reasons.pop(first_root, set())
+        self._reasons.setdefault(second_root, set()).update(reasons)
+
+
+def name_words(contact: Contact) -> List[str]:
+    """
+    Find the words in a contact's name, in lower case and without accents.
+
+    Args:
+        contact: The contact.
+
+    Returns:
+        [str]: The words, in order.
+    """
+    name = contact.name.lower()
+    if not name.isascii():
+        name = unicodedata.normalize("NFKD", name)
+        name = "".join(c for c in name if not unicodedata.combining(c))
+    return _WORD.findall(name)
+
+
+def contact_identifiers(contact: Contact) -> Set[str]:
+    """
+    Find the email addresses and phone numbers of a contact, normalised so the
+    same one is always written the same way.
+
+    Email addresses are put in lower case, without any "+tag" after the user
+    name. Phone numbers are cut down to their last PHONE_DIGITS digits.
+
+    Args:
+        contact: The contact.
+
+    Returns:
+        {str}: The identifiers, each prefixed with its kind.
+    """
+    identifiers = set()
+    for kv in contact.kv_pairs:
+        key = kv.key.lower()
+        if "email" in key and "@" in kv.value:
+            user, _, domain = kv.value.strip().lower().rpartition("@")
+            identifiers.add(f"email:{user.split('+')[0]}@{domain}")
+        elif "phone" in key or "mobile" in key:
+            digits = _NON_DIGIT.sub("", kv.value)
+            if len(digits) >= MIN_PHONE_DIGITS:
+                identifiers.add(f"phone:{digits[-PHONE_DIGITS:]}")
+    return identifiers
+
+
+def blocking_keys(
+    words: List[str], identifiers: Set[str], codes: Dict[str, str]
+) -> Set[str]:
+    """
+    Find the keys a contact is blocked under.
+
+    Args:
+        words:       The words in the contact's name.
+        identifiers: The contact's email addresses and phone numbers.
+        codes:       The Soundex code of each word seen so far, which is added
+                     to.
+
+    Returns:
+        {str}: The keys.
+    """
+
+    # Block on the identifiers, then the name, if there is one
+    keys = set(identifiers)
+    if not words:
+        return keys
+    keys.add("name:" + " ".join(sorted(words)))
+
+    # Block on the sound of the name, coding each word only once; numbers are
+    # their own code
+    sounds = []
+    for word in words:
+        if (code := word if word.isdigit() else codes.get(word)) is None:
+            code = codes[word] = soundex(word) or word
+        sounds.append(code)
+    keys.add("sound:" + " ".join(sorted(sounds)))
+    return keys
+
+
+def _match(first: str, second: str, shared: Set[str]) -> Set[str]:
+    """
+    Score two contacts, and say why they look like duplicates if they do.
+
+    Args:
+        first:  The words of one contact's name, joined by spaces.
+        second: The words of the other contact's name, joined by spaces.
+        shared: The email addresses and phone numbers they share.
+
+    Returns:
+        {str}: The reasons they look like duplicates, or an empty set if they
+        don't.
+    """
+
+    # Score their names: the same words in any order are the same name, and a
+    # name made of some of another's words is as good as the same
+    first_words, second_words = set(first.split()), set(second.split())
+    if first_words <= second_words or second_words <= first_words:
+        similarity = 1.0
+    else:
+        matcher = SequenceMatcher(
+            None, " ".join(sorted(first_words)), " ".join(sorted(second_words))
+        )
+        similarity = matcher.ratio()
+
+    # Add the identifiers they share
+    score = similarity + (IDENTIFIER_WEIGHT if shared else 0)
+    if score < DUPLICATE_SCORE:
+        return set()
+    reasons = {f"same {identifier.split(':')[0]}" for identifier in shared}
+    reasons.add("same name" if first_words == second_words else "similar names")
+    return reasons
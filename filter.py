@@ -1,30 +1,406 @@
 from contact import Contact
-from typing import List
+from index import ContactIndex
+from itertools import islice
+from parallel import default_jobs, parallel_filter
+from query import FieldPattern, parse_pattern, reduce_patterns
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Union,
+    cast,
+)
 
+# The fuzzy and phonetic indexes are only needed for those searches
+if TYPE_CHECKING:
+    from fuzzy import FuzzyIndex, ShardedFuzzyIndex
+    from phonetic import PhoneticIndex, ShardedPhoneticIndex
 
-def filter_contacts(contacts: List[Contact], pattern: (str)) -> List[Contact]:
+# Number of contacts sampled to estimate how often each pattern is found
+SAMPLE_SIZE = 256
+
+
+def filter_contacts(
+    contacts: Iterable[Contact],
+    pattern: Sequence[str],
+    index: ContactIndex = None,
+    limit: int = None,
+    jobs: int = None,
+    phonetic: Union["PhoneticIndex", "ShardedPhoneticIndex"] = None,
+) -> List[Contact]:
     """
     Filter a collection of contacts to return only those that match all
     provided pattern strings.
-    
+
+    The contacts are consumed lazily, so when a limit is given and the contacts
+    are being streamed from the contact file, nothing beyond the last match we
+    need is read.
+
     Args:
         contacts: The contacts to filter
         pattern:  The patterns to match
-    
+        index:    The index of the contacts, if there is one
+        limit:    The maximum number of matches to return, if any
+        jobs:     The number of processes to filter with, if not the default
+        phonetic: The phonetic index of the contacts, to also match names that
+                  sound like the patterns
+
     Returns:
         [Contact]: The list of filtered contacts
     """
+    return list(
+        islice(iter_matches(contacts, pattern, index, jobs, phonetic), limit)
+    )
+
+
+def iter_matches(
+    contacts: Iterable[Contact],
+    pattern: Sequence[str],
+    index: ContactIndex = None,
+    jobs: int = None,
+    phonetic: Union["PhoneticIndex", "ShardedPhoneticIndex"] = None,
+) -> Iterator[Contact]:
+    """
+    Find the contacts that match all provided pattern strings.
+
+    A pattern like "org:renham" only matches the values of one key; see
+    parse_pattern() for the syntax. If no contact has the key, as with
+    "https://example.com", it's a plain pattern instead, unless the contacts
+    are being streamed, in which case their keys can't be checked beforehand.
+
+    If an index is provided, it's used to narrow the contacts down to those
+    that could possibly match, and only those are checked. An index that can't
+    narrow patterns scoped to a key is given their values as plain patterns
+    instead, since a value can only match if it's found somewhere. An index can only
+    be used when the contacts are the list it was built from. Contacts that
+    are their own index, such as a ContactStore or MappedContacts, are used as
+    their own index automatically.
+
+    If the index can't narrow the contacts down, a large list of contacts is
+    filtered in parallel, by default using every core once the list is at least
+    PARALLEL_THRESHOLD long; the results are the same either way.
+
+    If a phonetic index is provided, a plain pattern also matches a contact
+    whose name sounds like it, so "jon smyth" finds John Smith. The contacts
+    must then be a sequence, since the index refers to them by position.
+
+    Args:
+        contacts: The contacts to filter
+        pattern:  The patterns to match
+        index:    The index of the contacts, if there is one
+        jobs:     The number of processes to filter with, if not the default
+        phonetic: The phonetic index of the contacts, to also match names that
+                  sound like the patterns
+
+    Returns:
+        Iterator[Contact]: The matching contacts, in their original order
+    """
+
+    # Split the patterns into plain ones and those scoped to a key, all in
+    # lower case
+    plain, fields = parse_pattern(pattern, _key_finder(contacts, index))
+
+    # Match names that sound like the patterns too, if we've been asked to; the
+    # phonetic index refers to the contacts by position, so they're a sequence
+    if phonetic is not None:
+        indexed = cast(Sequence[Contact], contacts)
+        yield from _phonetic_matches(indexed, plain, fields, phonetic, index)
+        return
 
-    # Filtered contact list
-    filtered_list = []
+    # Only check the patterns that aren't found within another, or repeated
+    plain = reduce_patterns(plain)
+
+    # Contacts that can find their own candidates are their own index
+    if index is None and hasattr(contacts, "candidates"):
+        index = cast(ContactIndex, contacts)
+
+    # Narrow the contacts down to the candidates the index finds; if they're
+    # exact, there's nothing more to check. An index refers to the contacts it
+    # was built from by position, so they're a sequence.
+    if index is not None:
+        if getattr(index, "scoped", False):
+            candidates = index.candidates(plain, fields)
+        else:
+            candidates = index.candidates(plain + [f.value for f in fields])
+        if candidates is not None:
+            indexed = cast(Sequence[Contact], contacts)
+            if getattr(index, "exact", False) and not fields:
+                yield from (indexed[i] for i in sorted(candidates))
+                return
+            contacts = _fetch(indexed, sorted(candidates))
+            jobs = 1
+
+    # Check the rarest patterns first, then filter a large list in parallel
+    if isinstance(contacts, list):
+        plain = _order_patterns(contacts, plain)
+        if jobs is None:
+            jobs = default_jobs(contacts)
+        if jobs > 1:
+            matches = parallel_filter(contacts, plain, jobs, fields)
+            yield from (contacts[i] for i in matches)
+            return
 
     # Visit each contact and keep those that match every pattern
     for contact in contacts:
-        for p in pattern:
-            if not contact.matches(p.lower()):
-                break
+        if contact.matches_all(plain) and all(
+            contact.matches_field(f.key, f.value, f.exact) for f in fields
+        ):
+            yield contact
+
+
+def fuzzy_filter(
+    contacts: Sequence[Contact],
+    pattern: Sequence[str],
+    fuzzy: Union["FuzzyIndex", "ShardedFuzzyIndex"],
+    distance: int,
+    index: ContactIndex = None,
+) -> List[Contact]:
+    """
+    Find the contacts that match all provided pattern strings, allowing for
+    typos, ranked by how close they are.
+
+    A plain pattern matches a contact if it's found anywhere in the contact, as
+    usual, or if it's within the given edit distance of a word in the contact's
+    name or values. The fuzzy index finds the close words, so not every word
+    in every contact is compared with the pattern. A contact's distance is the
+    total of each pattern's distance from its closest word, or zero where the
+    pattern was found as it is. Patterns scoped to a key must still match as
+    they are, unless no contact has the key, in which case they're plain
+    patterns.
+
+    Args:
+        contacts: The contacts to filter
+        pattern:  The patterns to match
+        fuzzy:    The fuzzy index of the contacts
+        distance: The maximum edit distance for each pattern
+        index:    The index of the contacts, if there is one
+
+    Returns:
+        [Contact]: The matching contacts, closest first, then by name
+    """
+
+    # Split the patterns into plain ones and those scoped to a key, all in
+    # lower case
+    plain, fields = parse_pattern(pattern, _key_finder(contacts, index))
+
+    # Find the distance of each contact from each pattern, keeping those that
+    # are close to every pattern
+    distances: Dict[int, int] = None
+    for p in plain:
+        found = fuzzy.search(p, distance)
+        found.update((position, 0) for position in _positions(contacts, p, index))
+        if distances is None:
+            distances = found
         else:
-            filtered_list.append(contact)
+            distances = {i: d + found[i] for i, d in distances.items() if i in found}
+
+    # Without any plain patterns, every contact is as close as any other
+    if distances is None:
+        distances = dict.fromkeys(range(len(contacts)), 0)
+
+    # Check the patterns scoped to a key, then rank the contacts
+    ranked = []
+    for i, d in distances.items():
+        contact = contacts[i]
+        if all(contact.matches_field(f.key, f.value, f.exact) for f in fields):
+            ranked.append((d, contact))
+    ranked.sort(key=lambda match: (match[0], match[1].name))
+    return [contact for _, contact in ranked]
+
+
+def regex_filter(
+    contacts: Sequence[Contact], pattern: List[Pattern], limit: int = None
+) -> List[Contact]:
+    """
+    Filter a collection of contacts to return only those that match all
+    provided regular expressions.
+
+    Each contact's name, values and notes are matched as separate lines. If
+    the contacts can run regular expressions themselves, as a ContactStore
+    can, each expression is run over the text of every contact in one scan;
+    otherwise each contact is checked in turn.
+
+    Args:
+        contacts: The contacts to filter
+        pattern:  The compiled regular expressions to match
+        limit:    The maximum number of matches to return, if any
+
+    Returns:
+        [Contact]: The list of filtered contacts, in their original order
+    """
+
+    # Scan all the contacts' text at once if we can
+    if hasattr(contacts, "regex_candidates"):
+        found = contacts.regex_candidates(pattern)
+        if found is not None:
+            return [contacts[i] for i in islice(sorted(found), limit)]
+
+    # Otherwise, check each contact's lines
+    matches = (
+        contact
+        for contact in contacts
+        if all(p.search(_lines(contact)) for p in pattern)
+    )
+    return list(islice(matches, limit))
+
+
+def _fetch(contacts: Sequence[Contact], positions: List[int]) -> List[Contact]:
+    """
+    Get several contacts, all at once if the contacts can fetch them that way.
+
+    Args:
+        contacts:  The contacts
+        positions: The positions of the contacts wanted
+
+    Returns:
+        [Contact]: The contacts wanted, in the order of their positions
+    """
+    if hasattr(contacts, "fetch"):
+        return contacts.fetch(positions)
+    return [contacts[i] for i in positions]
+
+
+def _key_finder(
+    contacts: Iterable[Contact], index: ContactIndex = None
+) -> Optional[Callable[[str], bool]]:
+    """
+    Find how to check whether any of the contacts has a key.
+
+    The index is used if it can tell, and then the contacts themselves, if
+    they're a contact store, database or the like. Otherwise a sequence of
+    contacts is checked a contact at a time, stopping at the first with the
+    key. Contacts that are being streamed can only be read once, so there's no
+    way to check them.
+
+    Args:
+        contacts: The contacts.
+        index:    The index of the contacts, if there is one.
+
+    Returns:
+        Callable[[str], bool]: Function that checks whether any contact has a
+        key, given in lower case, or None if there's no way to check.
+    """
+    for source in (index, contacts):
+        if (has_key := getattr(source, "has_key", None)) is not None:
+            return has_key
+    if not isinstance(contacts, Sequence):
+        return None
+    return lambda key: any(
+        kv.key.lower() == key for contact in contacts for kv in contact.kv_pairs
+    )
+
+
+def _lines(contact: Contact) -> str:
+    """
+    Get the text regular expressions are matched against.
+
+    Args:
+        contact: The contact.
+
+    Returns:
+        str: The contact's name, values and notes, a line each.
+    """
+    lines = [contact.name]
+    lines.extend(kv.value for kv in contact.kv_pairs)
+    lines.extend(contact.notes)
+    return "\n".join(lines)
+
+
+def _order_patterns(contacts: List[Contact], pattern: List[str]) -> List[str]:
+    """
+    Put patterns in order of how rarely they're found, rarest first.
+
+    A contact is rejected at the first pattern it doesn't contain, so with the
+    rarest pattern first, most contacts are only checked against one. How
+    rarely each pattern is found is estimated from an evenly spaced sample of
+    SAMPLE_SIZE contacts; lists too short to be worth sampling are left alone.
+
+    Args:
+        contacts: The contacts to be filtered
+        pattern:  The plain patterns, already in lower case
+
+    Returns:
+        [str]: The patterns, rarest first
+    """
+    if len(pattern) < 2 or len(contacts) < 4 * SAMPLE_SIZE:
+        return pattern
+    sample = contacts[:: len(contacts) // SAMPLE_SIZE]
+    found = {p: sum(1 for contact in sample if contact.matches(p)) for p in pattern}
+    return sorted(pattern, key=found.get)
+
+
+def _phonetic_matches(
+    contacts: Sequence[Contact],
+    pattern: List[str],
+    fields: List[FieldPattern],
+    phonetic: Union["PhoneticIndex", "ShardedPhoneticIndex"],
+    index: ContactIndex = None,
+) -> Iterator[Contact]:
+    """
+    Find the contacts that match, or whose names sound like, all provided
+    pattern strings.
+
+    Each plain pattern is looked up in the phonetic index, and the contacts
+    found are added to those that contain the pattern as it is. Only the
+    contacts found for every pattern are checked against the patterns scoped
+    to a key.
+
+    Args:
+        contacts: The contacts to filter
+        pattern:  The plain patterns to match, already in lower case
+        fields:   The patterns scoped to a key
+        phonetic: The phonetic index of the contacts
+        index:    The index of the contacts, if there is one
+
+    Returns:
+        Iterator[Contact]: The matching contacts, in their original order
+    """
+
+    # Find the contacts that match, or sound like, every pattern
+    found: Set[int] = None
+    for p in pattern:
+        matches = phonetic.search(p)
+        matches.update(_positions(contacts, p, index))
+        found = matches if found is None else found & matches
+
+    # Without any plain patterns, every contact is a candidate
+    candidates = range(len(contacts)) if found is None else sorted(found)
+
+    # Check the patterns scoped to a key
+    for i in candidates:
+        contact = contacts[i]
+        if all(contact.matches_field(f.key, f.value, f.exact) for f in fields):
+            yield contact
+
+
+def _positions(
+    contacts: Sequence[Contact], pattern: str, index: ContactIndex = None
+) -> List[int]:
+    """
+    Find the positions of the contacts that contain a pattern as it is.
+
+    Args:
+        contacts: The contacts to search
+        pattern:  The pattern, already in lower case
+        index:    The index of the contacts, if there is one
+
+    Returns:
+        [int]: The positions of the contacts containing the pattern
+    """
+
+    # Narrow the contacts down to the candidates the index finds, if any
+    if index is None and hasattr(contacts, "candidates"):
+        index = cast(ContactIndex, contacts)
+    candidates: Iterable[int] = None if index is None else index.candidates([pattern])
+    if candidates is None:
+        candidates = range(len(contacts))
 
-    # Done
-    return filtered_list
+    # Check each candidate
+    return [i for i in sorted(candidates) if contacts[i].matches(pattern)]
@@ -0,0 +1,248 @@
+from array import array
+from bisect import bisect_left
+from contact import Contact
+from typing import Dict, Iterable, Iterator, List
+
+import re
+
+# Pattern matching a word: a run of letters and digits
+_WORD = re.compile(r"[^\W_]+")
+
+# Typecode of the arrays holding positions -- signed 64-bit
+_POSITION = "q"
+
+
+class FuzzyIndex:
+    """
+    This class represents an index for finding words that are close to a
+    pattern, allowing for typos.
+
+    Every word in the contacts' names and values, in lower case, is kept in one
+    sorted dictionary, along with the positions of the contacts containing it.
+    A search walks the dictionary as if it were a trie, keeping a row of the
+    edit distance table for each letter of the word it's on. Neighbouring words
+    share prefixes, so only the rows after the shared prefix are worked out,
+    and as soon as every entry in a row is over the maximum distance, no word
+    with that prefix can match, and they're all skipped at once. This is a
+    Levenshtein automaton run over the dictionary, so a search only touches the
+    few prefixes that stay within reach of the pattern, not every word.
+
+    Distances are counted in single-letter insertions, deletions and
+    substitutions, and swaps of two adjacent letters.
+    """
+
+    def __init__(self, contacts: Iterable[Contact]):
+        """
+        Build the index for a collection of contacts.
+
+        Args:
+            contacts: The contacts to index.
+        """
+
+        # Find the positions of the contacts containing each word
+        positions: Dict[str, List[int]] = {}
+        self.size = 0
+        for position, contact in enumerate(contacts):
+            for word in contact_words(contact):
+                if (found := positions.get(word)) is None:
+                    positions[word] = [position]
+                else:
+                    found.append(position)
+            self.size += 1
+
+        # Sort the words, then store the positions of each word's contacts one
+        # after another
+        self.words = sorted(positions)
+        self._positions = array(_POSITION)
+        self._starts = array(_POSITION, [0])
+        for word in self.words:
+            self._positions.extend(positions[word])
+            self._starts.append(len(self._positions))
+
+    def __len__(self) -> int:
+        """
+        Get the number of contacts indexed.
+
+        Returns:
+            int: The number of contacts.
+        """
+        return self.size
+
+    def search(self, pattern: str, distance: int) -> Dict[int, int]:
+        """
+        Find the contacts with a word close to a pattern.
+
+        Args:
+            pattern:  The pattern, in lower case.
+            distance: The maximum edit distance.
+
+        Returns:
+            {int: int}: The position of each contact found, and the smallest
+            distance from the pattern to one of its words.
+        """
+        found: Dict[int, int] = {}
+        for i, word_distance in self._close_words(pattern, distance):
+            for j in range(self._starts[i], self._starts[i + 1]):
+                position = self._positions[j]
+                if word_distance < found.get(position, distance + 1):
+                    found[position] = word_distance
+        return found
+
+    def _close_words(self, pattern: str, distance: int) -> Iterator[tuple]:
+        """
+        Find the words in the dictionary close to a pattern.
+
+        Args:
+            pattern:  The pattern, in lower case.
+            distance: The maximum edit distance.
+
+        Returns:
+            Iterator[(int, int)]: The position of each word in the dictionary,
+            and its distance from the pattern.
+        """
+
+        # Initialise; rows[k] is the row of the table for the first k letters
+        # of the word we're on
+        words = self.words
+        rows = [list(range(len(pattern) + 1))]
+        word = ""
+
+        # Visit each word that hasn't been skipped
+        i = 0
+        while i < len(words):
+
+            # Keep the rows for the prefix this word shares with the last one
+            previous, word = word, words[i]
+            shared = 0
+            limit = min(len(previous), len(word), len(rows) - 1)
+            while shared < limit and previous[shared] == word[shared]:
+                shared += 1
+            del rows[shared + 1 :]
+
+            # Work out the rows for the rest of the word, skipping every word
+            # with a prefix that's already out of reach
+            for k in range(shared, len(word)):
+                row = _next_row(rows, pattern, word, k)
+                rows.append(row)
+                if min(row) > distance:
+                    i = _skip_prefix(words, word[: k + 1], i)
+                    break
+
+            # Report the word if it's close enough
+            else:
+                if (word_distance := rows[-1][-1]) <= distance:
+                    yield i, word_distance
+                i += 1
+
+
+class ShardedFuzzyIndex:
+    """
+    This class represents the fuzzy indexes of several shards of a contact
+    directory, searched as one.
+    """
+
+    def __init__(self, indexes: List[FuzzyIndex]):
+        """
+        Combine the indexes of several shards.
+
+        Args:
+            indexes: The index of each shard, in shard order.
+        """
+        self.indexes = indexes
+
+    def __len__(self) -> int:
+        """
+        Get the number of contacts indexed.
+
+        Returns:
+            int: The number of contacts.
+        """
+        return sum(len(index) for index in self.indexes)
+
+    def search(self, pattern: str, distance: int) -> Dict[int, int]:
+        """
+        Find the contacts with a word close to a pattern.
+
+        Args:
+            pattern:  The pattern, in lower case.
+            distance: The maximum edit distance.
+
+        Returns:
+            {int: int}: The position of each contact found, and the smallest
+            distance from the pattern to one of its words.
+        """
+        found = {}
+        start = 0
+        for index in self.indexes:
+            for position, word_distance in index.search(pattern, distance).items():
+                found[start + position] = word_distance
+            start += len(index)
+        return found
+
+
+def contact_words(contact: Contact) -> set:
+    """
+    Find the words in a contact's name and values.
+
+    Args:
+        contact: The contact.
+
+    Returns:
+        {str}: The words, in lower case.
+    """
+    words = set(_WORD.findall(contact.name.lower()))
+    for kv in contact.kv_pairs:
+        words.update(_WORD.findall(kv.value.lower()))
+    return words
+
+
+def _next_row(rows: List[List[int]], pattern: str, word: str, k: int) -> List[int]:
+    """
+    Work out the row of the edit distance table for one more letter of a word.
+
+    Args:
+        rows:    The rows for the first k letters of the word.
+        pattern: The pattern.
+        word:    The word.
+        k:       The position of the letter in the word.
+
+    Returns:
+        [int]: The row for the first k + 1 letters of the word.
+    """
+
+    # Initialise
+    letter = word[k]
+    above = rows[k]
+    row = [above[0] + 1]
+
+    # Fill in the row, allowing for swapped letters
+    for j in range(1, len(pattern) + 1):
+        substitution = above[j - 1] + (pattern[j - 1] != letter)
+        cost = min(row[j - 1] + 1, above[j] + 1, substitution)
+        if (
+            j > 1
+            and k > 0
+            and pattern[j - 1] == word[k - 1]
+            and pattern[j - 2] == letter
+        ):
+            cost = min(cost, rows[k - 1][j - 2] + 1)
+        row.append(cost)
+
+    # Done
+    return row
+
+
+def _skip_prefix(words: List[str], prefix: str, i: int) -> int:
+    """
+    Find the first word after a word that doesn't start with a given prefix.
+
+    Args:
+        words:  The sorted dictionary.
+        prefix: The prefix.
+        i:      The position of a word that starts with the prefix.
+
+    Returns:
+        int: The position of the first later word without the prefix.
+    """
+    following = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return bisect_left(words, following, i + 1)
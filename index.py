@@ -0,0 +1,503 @@
+from array import array
+from bisect import bisect_left
+from contact import Contact
+from query import FieldPattern
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+# Length of the n-grams we index
+NGRAM_LENGTH = 3
+
+# Typecode of the arrays holding contact ids -- signed 32-bit, which is plenty,
+# and keeps the cache half the size it would be with 64-bit ids
+_ID = "i"
+
+# A frozen list of ids is searched by bisection for each candidate, rather than
+# scanned in full, when it's more than this many times longer than the list of
+# candidates
+BISECT_RATIO = 16
+
+# Ids of the contacts containing a term: a set, or a sorted array
+Ids = Union[Set[int], array]
+
+
+class ContactIndex:
+    """
+    This class represents an inverted index over a list of contacts.
+
+    Every trigram found in a contact's name, values or notes maps to the set of
+    ids of the contacts containing it. A pattern can only be found in a contact
+    that contains every one of the pattern's own trigrams, so intersecting their
+    sets gives a small set of candidates that then only need to be checked with
+    Contact.matches().
+
+    Each key also has indexes of its own, for patterns scoped to that key: a
+    hash map from each of its values to the ids of the contacts with that value,
+    for exact matches, and a map from each trigram in its values to the ids of
+    the contacts containing it, for substrings. Keys and values are indexed in
+    lower case.
+
+    Each contact's id is its position in the list until the list is spliced,
+    after which the ids of the contacts that moved are mapped to their new
+    positions. This means splicing only has to touch the trigrams of the
+    contacts removed and added, not those of every contact after them.
+    """
+
+    # The index can narrow patterns scoped to a key as well as plain ones
+    scoped = True
+
+    def __init__(self, contacts: List[Contact]):
+        """
+        Build the index for a list of contacts.
+
+        Args:
+            contacts: The contacts to index.
+        """
+
+        # Map of trigram to the ids of the contacts containing it
+        self.trigrams = Postings()
+
+        # For each key, map of value to the ids of the contacts with it, and map
+        # of trigram to the ids of the contacts with a value containing it
+        self.values: Dict[str, Postings] = {}
+        self.value_trigrams: Dict[str, Postings] = {}
+
+        # Number of contacts indexed, and the id the next one will get
+        self.size = 0
+        self._next_id = 0
+
+        # Id of the contact at each position, and the position of each id; both
+        # are None while every contact's id is its position
+        self._ids: Optional[List[int]] = None
+        self._positions: Optional[Dict[int, int]] = None
+
+        # Index the contacts
+        for contact in contacts:
+            self.add(contact)
+
+    def add(self, contact: Contact):
+        """
+        Add a contact to the end of the index.
+
+        Args:
+            contact: The contact to add.
+        """
+
+        # Give the contact an id, and record its position
+        contact_id = self._next_id
+        self._next_id += 1
+        if self._ids is not None:
+            self._ids.append(contact_id)
+            self._positions[contact_id] = self.size
+        self.size += 1
+
+        # Index it
+        self._index(contact_id, contact)
+
+    def splice(
+        self, start: int, stop: int, removed: List[Contact], added: List[Contact]
+    ):
+        """
+        Replace a range of contacts in the index, as when the same range of the
+        contact list is replaced.
+
+        Args:
+            start:   The position of the first contact replaced.
+            stop:    The position after the last contact replaced.
+            removed: The contacts that were at those positions.
+            added:   The contacts that replace them.
+        """
+
+        # Start tracking ids separately from positions
+        if self._ids is None:
+            self._ids = list(range(self.size))
+
+        # Remove the old contacts
+        for contact_id, contact in zip(self._ids[start:stop], removed):
+            self._unindex(contact_id, contact)
+
+        # Add the new ones
+        added_ids = list(range(self._next_id, self._next_id + len(added)))
+        self._next_id += len(added)
+        for contact_id, contact in zip(added_ids, added):
+            self._index(contact_id, contact)
+
+        # Update the positions
+        self._ids[start:stop] = added_ids
+        self._positions = {contact_id: i for i, contact_id in enumerate(self._ids)}
+        self.size = len(self._ids)
+
+    def candidates(
+        self, pattern: Iterable[str], fields: Iterable[FieldPattern] = ()
+    ) -> Optional[Set[int]]:
+        """
+        Find the positions of the contacts that might match all patterns.
+
+        Each field pattern is narrowed by its key's own indexes, so only the
+        contacts with that key are considered. Plain patterns shorter than a
+        trigram can't be narrowed by the index, and are ignored. If none of the
+        patterns can be narrowed, None is returned to show that every contact
+        is a candidate.
+
+        Args:
+            pattern: The plain patterns to match, already in lower case.
+            fields:  The field patterns to match.
+
+        Returns:
+            {int}: The positions of the candidate contacts, or None.
+        """
+
+        # Narrow the candidates by each field pattern
+        candidates = None
+        for field in fields:
+            ids = self._field_candidates(field)
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+
+        # Visit each plain pattern, narrowing the candidates as we go, rarest
+        # trigram first, so the candidates shrink as quickly as possible
+        for p in pattern:
+            for gram in sorted(_ngrams(p), key=self.trigrams.size):
+                gram_ids = self.trigrams.get(gram)
+                if not gram_ids:
+                    return set()
+                if candidates is None:
+                    candidates = set(gram_ids)
+                else:
+                    candidates = _intersect(candidates, gram_ids)
+                if not candidates:
+                    return candidates
+
+        # Convert the ids to positions
+        if candidates is not None and self._positions is not None:
+            positions = self._positions
+            candidates = {positions[contact_id] for contact_id in candidates}
+
+        # Done
+        return candidates
+
+    def has_key(self, key: str) -> bool:
+        """
+        Check whether any contact has a key.
+
+        Args:
+            key: The key, in lower case.
+
+        Returns:
+            bool: True if a contact has the key; otherwise, False.
+        """
+        return key in self.values
+
+    def _field_candidates(self, field: FieldPattern) -> Set[int]:
+        """
+        Find the ids of the contacts that might match a field pattern.
+
+        An exact pattern is looked up in the key's map of values, so the
+        contacts found are exactly those that match. A substring is narrowed by
+        the trigrams of the key's values; if it's shorter than a trigram, every
+        contact with the key is a candidate.
+
+        Args:
+            field: The field pattern.
+
+        Returns:
+            {int}: The ids of the candidate contacts.
+        """
+
+        # No contact has the key
+        if (values := self.values.get(field.key)) is None:
+            return set()
+
+        # Look up an exact value
+        if field.exact:
+            return set(values.get(field.value) or ())
+
+        # Fall back on every contact with the key if we can't narrow it down
+        grams = self.value_trigrams[field.key]
+        if not (pattern_grams := _ngrams(field.value)):
+            return values.all_ids()
+
+        # Intersect the trigrams, rarest first
+        candidates = None
+        for gram in sorted(pattern_grams, key=grams.size):
+            if not (ids := grams.get(gram)):
+                return set()
+            candidates = set(ids) if candidates is None else _intersect(candidates, ids)
+            if not candidates:
+                break
+        return candidates
+
+    def _index(self, contact_id: int, contact: Contact):
+        """
+        Record each of a contact's trigrams, and each of its values.
+
+        Args:
+            contact_id: The contact's id.
+            contact:    The contact.
+        """
+        fields, field_grams = _contact_fields(contact)
+        self.trigrams.add(_contact_ngrams(contact, field_grams), contact_id)
+        for key, values in fields.items():
+            if key not in self.values:
+                self.values[key], self.value_trigrams[key] = Postings(), Postings()
+            self.values[key].add(values, contact_id)
+            self.value_trigrams[key].add(field_grams[key], contact_id)
+
+    def _unindex(self, contact_id: int, contact: Contact):
+        """
+        Forget each of a contact's trigrams, and each of its values.
+
+        Args:
+            contact_id: The contact's id.
+            contact:    The contact.
+        """
+        fields, field_grams = _contact_fields(contact)
+        self.trigrams.discard(_contact_ngrams(contact, field_grams), contact_id)
+        for key, values in fields.items():
+            self.values[key].discard(values, contact_id)
+            self.value_trigrams[key].discard(field_grams[key], contact_id)
+
+            # Forget the key if no contact has it any more
+            if not self.values[key]:
+                del self.values[key], self.value_trigrams[key]
+
+
+class Postings:
+    """
+    This class represents a map from each of a set of terms to the ids of the
+    contacts containing it.
+
+    While the map is being built, each term's ids are kept in a set. When it's
+    pickled, each term's ids are sorted, and stored one after another in a
+    single array, as FuzzyIndex stores its positions, so it loads as a few
+    large buffers rather than an object per id. A term's ids are taken out of
+    the array when it's looked up, and go back into a set if they change.
+    """
+
+    # Ids of each term that's changed since the map was loaded
+    _sets: Dict[str, Set[int]]
+
+    # Slot of each term whose ids are in the array
+    _slots: Dict[str, int]
+
+    def __init__(self):
+        """
+        Create an empty map.
+        """
+
+        # Map each term to its ids, and keep the ids in each slot of the array
+        # one after another
+        self._sets = {}
+        self._slots = {}
+        self._ids = array(_ID)
+        self._starts = array(_ID, [0])
+
+    def __len__(self) -> int:
+        """
+        Get the number of terms.
+
+        Returns:
+            int: The number of terms.
+        """
+        return len(self._sets) + len(self._slots)
+
+    def get(self, term: str) -> Optional[Ids]:
+        """
+        Get the ids of the contacts containing a term.
+
+        Args:
+            term: The term.
+
+        Returns:
+            Ids: The ids, or None if no contact contains the term.
+        """
+        if (ids := self._sets.get(term)) is not None:
+            return ids
+        if (slot := self._slots.get(term)) is not None:
+            return self._ids[self._starts[slot] : self._starts[slot + 1]]
+        return None
+
+    def size(self, term: str) -> int:
+        """
+        Get the number of contacts containing a term.
+
+        Args:
+            term: The term.
+
+        Returns:
+            int: The number of contacts.
+        """
+        if (ids := self._sets.get(term)) is not None:
+            return len(ids)
+        if (slot := self._slots.get(term)) is not None:
+            return self._starts[slot + 1] - self._starts[slot]
+        return 0
+
+    def all_ids(self) -> Set[int]:
+        """
+        Get the ids of the contacts containing any term.
+
+        Returns:
+            {int}: The ids.
+        """
+        if len(self._slots) == len(self._starts) - 1:
+            ids = set(self._ids)
+        else:
+            ids = set().union(*(self.get(term) for term in self._slots))
+        return ids.union(*self._sets.values())
+
+    def add(self, terms: Iterable[str], contact_id: int):
+        """
+        Record that a contact contains some terms.
+
+        Args:
+            terms:      The terms.
+            contact_id: The contact's id.
+        """
+        for term in terms:
+            if (ids := self._sets.get(term)) is None:
+                ids = self._thaw(term)
+            ids.add(contact_id)
+
+    def discard(self, terms: Iterable[str], contact_id: int):
+        """
+        Forget that a contact contains some terms.
+
+        Args:
+            terms:      The terms.
+            contact_id: The contact's id.
+        """
+        for term in terms:
+            if (ids := self._sets.get(term)) is None:
+                ids = self._thaw(term)
+            ids.discard(contact_id)
+            if not ids:
+                del self._sets[term]
+
+    def __getstate__(self) -> tuple:
+        """
+        Get the state to pickle, with every term's ids in the array.
+
+        Returns:
+            tuple: The terms, the ids of each one after another, and the
+            position in the ids where each term's ids start.
+        """
+        terms = list(self._sets) + list(self._slots)
+        ids = array(_ID)
+        starts = array(_ID, [0])
+        for term in terms:
+            ids.extend(sorted(self.get(term)))
+            starts.append(len(ids))
+        return terms, ids, starts
+
+    def __setstate__(self, state: tuple):
+        """
+        Restore a map that's been unpickled.
+
+        Args:
+            state: The map's pickled state.
+        """
+        terms, self._ids, self._starts = state
+        self._sets = {}
+        self._slots = dict(zip(terms, range(len(terms))))
+
+    def _thaw(self, term: str) -> Set[int]:
+        """
+        Move a term's ids from the array into a set, so they can be changed.
+
+        Their space in the array is reclaimed the next time it's pickled.
+
+        Args:
+            term: The term.
+
+        Returns:
+            {int}: The set the term's ids are now kept in.
+        """
+        ids = self._sets[term] = set(self.get(term) or ())
+        self._slots.pop(term, None)
+        return ids
+
+
+def _intersect(candidates: Set[int], ids: Ids) -> Set[int]:
+    """
+    Find the candidates that are among some ids.
+
+    A sorted array of ids that's much longer than the candidates is searched
+    for each candidate in turn, rather than being scanned from end to end.
+
+    Args:
+        candidates: The ids of the candidates.
+        ids:        The ids, in a set or a sorted array.
+
+    Returns:
+        {int}: The candidates among the ids.
+    """
+    if isinstance(ids, set):
+        return candidates & ids
+    if len(ids) > len(candidates) * BISECT_RATIO:
+        end = len(ids)
+        return {
+            i for i in candidates if (j := bisect_left(ids, i)) < end and ids[j] == i
+        }
+    return candidates.intersection(ids)
+
+
+def _contact_fields(
+    contact: Contact,
+) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]]]:
+    """
+    Find the values of each of a contact's keys, and the n-grams in them.
+
+    Keys and values are both in lower case.
+
+    Args:
+        contact: The contact.
+
+    Returns:
+        ({str: {str}}, {str: {str}}): The values of each key, and the n-grams
+        in the values of each key.
+    """
+    fields: Dict[str, Set[str]] = {}
+    field_grams: Dict[str, Set[str]] = {}
+    for kv in contact.kv_pairs:
+        key, value = kv.key.lower(), kv.value.lower()
+        if (values := fields.get(key)) is None:
+            fields[key] = {value}
+            field_grams[key] = _ngrams(value)
+        elif value not in values:
+            values.add(value)
+            field_grams[key] |= _ngrams(value)
+    return fields, field_grams
+
+
+def _contact_ngrams(contact: Contact, field_grams: Dict[str, Set[str]]) -> Set[str]:
+    """
+    Find all the n-grams in the searchable fields of a contact.
+
+    N-grams never span fields, since a pattern can only match within one field.
+
+    Args:
+        contact:     The contact.
+        field_grams: The n-grams in the values of each of the contact's keys.
+
+    Returns:
+        {str}: The contact's n-grams.
+    """
+    grams = _ngrams(contact.name.lower())
+    grams.update(*field_grams.values())
+    for note in contact.notes:
+        grams |= _ngrams(note.lower())
+    return grams
+
+
+def _ngrams(text: str) -> Set[str]:
+    """
+    Find all the n-grams in a string.
+
+    Args:
+        text: The string.
+
+    Returns:
+        {str}: The string's n-grams; empty if it's shorter than an n-gram.
+    """
+    return {text[i : i + NGRAM_LENGTH] for i in range(len(text) - NGRAM_LENGTH + 1)}
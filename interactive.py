@@ -0,0 +1,411 @@
+from contact import Contact
+from contextlib import contextmanager
+from query import FieldPattern, parse_pattern, reduce_patterns
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import os
+import select
+import shlex
+import shutil
+import sys
+import time
+
+# Number of contacts checked between looks at the keyboard, so a search of
+# every contact never holds up the next keystroke for long
+SCAN_SLICE = 2000
+
+# Longest time to wait for a screenful of matches before drawing what's been
+# found so far, in seconds -- one frame at 60 frames per second
+FRAME_TIME = 1 / 60
+
+# Terminal control sequences: switching to and from the alternate screen,
+# moving to the top left, and clearing to the end of the line and screen
+_ALTERNATE_SCREEN = "\x1b[?1049h"
+_NORMAL_SCREEN = "\x1b[?1049l"
+_HOME = "\x1b[H"
+_CLEAR_LINE = "\x1b[K"
+_CLEAR_BELOW = "\x1b[J"
+
+# Keys we act on
+_BACKSPACE = "\x7f\b"
+_ACCEPT = "\r\n"
+_QUIT = "\x03\x04\x1b"
+_CLEAR_QUERY = "\x15"
+_DELETE_WORD = "\x17"
+
+
+class Matches:
+    """
+    This class represents the contacts that match a query, found lazily.
+
+    The matches are found by checking the contacts from a source, in order, a
+    few at a time; those found so far are kept, so they can be shown before
+    the rest have been found. Since the source can be another query's matches,
+    a query that narrows another is only checked against that query's matches,
+    and only as far as they've been found.
+    """
+
+    def __init__(
+        self,
+        pattern: List[str],
+        source: Iterable[Contact],
+        has_key: Callable[[str], bool] = None,
+    ):
+        """
+        Start finding the contacts that match a query.
+
+        Args:
+            pattern: The patterns to match.
+            source:  The contacts to check, in order.
+            has_key: Function that checks whether any contact has a key, so
+                     patterns scoped to a key no contact has are plain ones.
+        """
+        self.pattern = pattern
+        plain, self.fields = parse_pattern(pattern, has_key)
+        self.plain = reduce_patterns(plain)
+        self.found: List[Contact] = []
+        self.complete = False
+        self._source = iter(source)
+
+    def __iter__(self) -> Iterator[Contact]:
+        """
+        Visit each match in turn, finding more as they're needed.
+
+        Returns:
+            Iterator[Contact]: The matches, in order.
+        """
+        i = 0
+        while i < len(self.found) or not self.complete:
+            if i < len(self.found):
+                yield self.found[i]
+                i += 1
+            else:
+                self.fill(1)
+
+    def fill(self, limit: int = None) -> int:
+        """
+        Check more of the contacts.
+
+        Args:
+            limit: The largest number of contacts to check, or None to check
+                   the rest.
+
+        Returns:
+            int: The number of contacts checked, which is 0 once every contact
+            has been checked.
+        """
+
+        # Check each contact against every pattern
+        plain, fields, found = self.plain, self.fields, self.found
+        checked = 0
+        for contact in self._source:
+            checked += 1
+            if contact.matches_all(plain):
+                for f in fields:
+                    if not contact.matches_field(f.key, f.value, f.exact):
+                        break
+                else:
+                    found.append(contact)
+            if checked == limit:
+                return checked
+
+        # Done
+        self.complete = True
+        return checked
+
+
+class IncrementalSearch:
+    """
+    This class represents a search that's refined one keystroke at a time.
+
+    Every pattern has to match, so adding to a query can only remove matches.
+    The search keeps a stack of queries, each of which narrows the one below
+    it, down to the empty query at the bottom, which matches every contact.
+    A new query is checked only against the matches of the closest query on
+    the stack that it narrows, so typing more of a pattern filters the
+    previous matches rather than every contact. Deleting goes back down the
+    stack, reusing the matches already found, and only when the query has
+    been shortened past everything on the stack are all the contacts searched
+    again.
+    """
+
+    def __init__(self, contacts: Iterable[Contact]):
+        """
+        Start a search.
+
+        Args:
+            contacts: The contacts to search.
+        """
+
+        # Put the contacts in order of name once, so every query's matches are
+        # found in the order they're shown
+        everyone = Matches([], sorted(contacts, key=lambda x: x.name))
+        everyone.fill()
+        self._stack = [everyone]
+
+        # Find every key once, so patterns that only look like they're scoped
+        # to a key can be told apart as they're typed
+        keys = {kv.key.lower() for contact in everyone.found for kv in contact.kv_pairs}
+        self._has_key = keys.__contains__
+
+    def search(self, pattern: List[str]) -> Matches:
+        """
+        Search for the contacts that match a query.
+
+        Args:
+            pattern: The patterns to match.
+
+        Returns:
+            Matches: The matches, which may not all have been found yet.
+        """
+
+        # Go back to the same query, if it's on the stack
+        stack = self._stack
+        for i, matches in enumerate(stack):
+            if matches.pattern == pattern:
+                del stack[i + 1 :]
+                return matches
+
+        # Otherwise search the matches of the closest query this one narrows,
+        # dropping the rest
+        while len(stack) > 1 and not narrows(
+            stack[-1].pattern, pattern, self._has_key
+        ):
+            stack.pop()
+
+        stack.append(Matches(pattern, stack[-1], self._has_key))
+        return stack[-1]
+
+
+def narrows(
+    old: List[str], new: List[str], has_key: Callable[[str], bool] = None
+) -> bool:
+    """
+    Check whether every contact that matches one query matches another.
+
+    That's the case if each of the other query's patterns is found within one
+    of this query's patterns, and each of its patterns scoped to a key is
+    within one of this query's patterns scoped to the same key.
+
+    Args:
+        old:     The other query's patterns.
+        new:     This query's patterns.
+        has_key: Function that checks whether any contact has a key, as given
+                 to the queries.
+
+    Returns:
+        bool: True if this query only matches contacts the other one does.
+    """
+    old_plain, old_fields = parse_pattern(old, has_key)
+    new_plain, new_fields = parse_pattern(new, has_key)
+    values = [f.value for f in new_fields]
+    return all(
+        any(p in q for q in new_plain) or any(p in v for v in values)
+        for p in old_plain
+    ) and all(any(_within(f, g) for g in new_fields) for f in old_fields)
+
+
+def run(contacts: Sequence[Contact], query: str = "", colour: bool = None):
+    """
+    Search the contacts as the user types.
+
+    The query is edited a keystroke at a time, and the contacts that match it
+    are shown after each one, as many as fit on the screen, rendered just as
+    print_contacts() renders them. The first screenful is shown as soon as it's
+    been found, and the rest of the matches are found between keystrokes.
+    Enter prints every match and finishes; Escape or Ctrl-C just finishes.
+
+    Args:
+        contacts: The contacts to search.
+        query:    The query to start with.
+        colour:   True to colour the output; None to colour it if it's a TTY.
+    """
+    from contacts import print_contacts, should_colour
+
+    # Decide whether to colour the output
+    if colour is None:
+        colour = should_colour()
+
+    # Search until the user's done
+    search = IncrementalSearch(contacts)
+    accepted = None
+    with _terminal() as fd:
+        while True:
+
+            # Find the matches until a key is pressed, showing them once a
+            # screenful has been found or a frame's gone by, then whenever
+            # what's on the screen changes, and once they've all been found
+            started = time.perf_counter()
+            matches = search.search(_split(query))
+            wanted = shutil.get_terminal_size().lines
+            shown = None
+            while not select.select([fd], [], [], 0)[0]:
+                if (
+                    not matches.complete
+                    and len(matches.found) < wanted
+                    and time.perf_counter() - started < FRAME_TIME
+                ):
+                    matches.fill(SCAN_SLICE)
+                    continue
+                state = (min(len(matches.found), wanted), matches.complete)
+                if shown != state:
+                    _draw(query, matches, colour, time.perf_counter() - started)
+                    shown = state
+                if matches.complete:
+                    break
+                matches.fill(SCAN_SLICE)
+
+            # Read the keys pressed, and act on them
+            query, done = _edit(query, os.read(fd, 64).decode(errors="ignore"))
+            if done is not None:
+                accepted = done and matches
+                break
+
+    # Print every match if the user accepted them
+    if accepted:
+        accepted.fill()
+        if accepted.found:
+            print_contacts(accepted.found, colour=colour, ranked=True)
+        else:
+            print("No matching contacts found")
+
+
+def _within(old: FieldPattern, new: FieldPattern) -> bool:
+    """
+    Check whether every value that matches one field pattern matches another.
+
+    Args:
+        old: The other field pattern.
+        new: This field pattern.
+
+    Returns:
+        bool: True if this field pattern only matches values the other does.
+    """
+    if old.key != new.key:
+        return False
+    if old.exact:
+        return new.exact and new.value == old.value
+    return old.value in new.value
+
+
+def _split(query: str) -> List[str]:
+    """
+    Split a query into patterns, the same way the shell would.
+
+    While the user's still typing a quoted pattern, its opening quote is
+    ignored.
+
+    Args:
+        query: The query.
+
+    Returns:
+        [str]: The patterns.
+    """
+    try:
+        return shlex.split(query)
+    except ValueError:
+        return query.replace('"', " ").replace("'", " ").split()
+
+
+def _edit(query: str, keys: str) -> Tuple[str, Optional[bool]]:
+    """
+    Edit a query with the keys the user pressed.
+
+    Args:
+        query: The query.
+        keys:  The keys pressed.
+
+    Returns:
+        (str, bool): The edited query, and True if the user accepted the
+        matches, False if they quit, or None if they're still typing.
+    """
+
+    # Ignore keys like the arrow keys, which send an escape sequence
+    if len(keys) > 1 and keys[0] == "\x1b":
+        return query, None
+
+    # Apply each key in turn
+    for key in keys:
+        if key in _ACCEPT:
+            return query, True
+        if key in _QUIT:
+            return query, False
+        if key in _BACKSPACE:
+            query = query[:-1]
+        elif key == _CLEAR_QUERY:
+            query = ""
+        elif key == _DELETE_WORD:
+            query = query.rstrip()
+            query = query[: query.rfind(" ") + 1]
+        elif key.isprintable():
+            query += key
+    return query, None
+
+
+def _draw(query: str, matches: Matches, colour: bool, elapsed: float):
+    """
+    Draw the query and the matches that fit on the screen.
+
+    Args:
+        query:   The query.
+        matches: The matches found so far.
+        colour:  True to colour the output.
+        elapsed: The time taken to find the matches shown, in seconds.
+    """
+    from contacts import render_contacts
+
+    # Render the matches, as many as could fit on the screen. Until they've
+    # all been found, the number found so far goes in the status line in place
+    # of the match count.
+    lines = shutil.get_terminal_size().lines
+    if matches.complete:
+        header = f"> {query}    ({elapsed * 1000:.1f}ms)"
+    else:
+        header = f"> {query}    ({elapsed * 1000:.1f}ms, {len(matches.found)} so far)"
+    if not matches.pattern:
+        body = ["", f"Type to search {len(matches.found)} contacts"]
+    elif matches.found:
+        chunks = render_contacts(matches.found, colour, top=lines, ranked=True)
+        if not matches.complete:
+            next(chunks)
+        body = "".join(chunks).splitlines()
+    elif matches.complete:
+        body = ["", "No matching contacts found"]
+    else:
+        body = ["", "Searching..."]
+
+    # Draw them over what was there, in one write so the screen doesn't flicker
+    screen = [header] + body[: lines - 1]
+    sys.stdout.write(
+        _HOME + f"{_CLEAR_LINE}\n".join(screen) + _CLEAR_LINE + _CLEAR_BELOW
+    )
+    sys.stdout.flush()
+
+
+@contextmanager
+def _terminal() -> Iterator[int]:
+    """
+    Take over the terminal, reading keys as they're pressed and drawing on the
+    alternate screen, then put it back.
+
+    Returns:
+        Iterator[int]: The file descriptor keys are read from.
+    """
+    import termios
+    import tty
+
+    # Read keys as they're pressed, without echoing them
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    tty.setcbreak(fd)
+    sys.stdout.write(_ALTERNATE_SCREEN)
+    try:
+        yield fd
+
+    # Put the terminal back
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stdout.write(_NORMAL_SCREEN)
+        sys.stdout.flush()
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
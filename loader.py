@@ -1,64 +1,899 @@
+from blocks import BlockMap
 from contact import Contact, KeyValue
-from typing import List
+from functools import partial
+from index import ContactIndex
+from itertools import chain
+from shards import ShardedContacts
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 from os.path import expanduser
 
+import cache
+import io
+import os
+import sys
+import time
+
+# The other engines are only imported when they're used
+if TYPE_CHECKING:
+    from database import ContactDatabase
+    from fuzzy import FuzzyIndex, ShardedFuzzyIndex
+    from mapped import MappedContacts
+    from phonetic import PhoneticIndex, ShardedPhoneticIndex
+    from store import ContactStore
+
 # Contact file
 CONTACT_FILE = "~/contacts.txt"
 
+# Contact directory, used instead of the contact file if it exists; each file
+# in it with the shard suffix holds some of the contacts
+CONTACT_DIRECTORY = "~/contacts"
+SHARD_SUFFIX = ".txt"
+
+# Suffix of the cache file holding the columnar contact store
+STORE_CACHE_SUFFIX = ".store.cache"
+
+# Suffix of the SQLite database the contacts are mirrored into
+DATABASE_SUFFIX = ".db"
+
+# Suffix of the cache file holding the index for fuzzy searches
+FUZZY_CACHE_SUFFIX = ".fuzzy.cache"
+
+# Suffix of the cache file holding the index for phonetic searches
+PHONETIC_CACHE_SUFFIX = ".phonetic.cache"
+
+# Snapshot of the files the contacts are kept in: each file's name, inode,
+# size and modification time, and its content hash if it was recently modified
+Snapshot = List[Tuple[str, int, int, int, Optional[str]]]
+
+# Problem found parsing a contact file: the position of the contact it's in, or
+# -1 if it's before the first contact, and the message reporting it
+FormatProblem = Tuple[int, str]
+
 
-def load_contacts() -> List[Contact]:
+def load_contacts(use_cache: bool = True, rebuild_cache: bool = False) -> List[Contact]:
     """
     Load a list of contacts from a file.
-    
+
+    Unless told otherwise, the parsed contacts are kept in a cache file next to
+    the contact file, and are loaded from there while the contact file hasn't
+    changed.
+
+    Args:
+        use_cache:     True to use the cache; False to parse the file directly.
+        rebuild_cache: True to rebuild the cache even if it's current.
+
     Returns:
         [Contact]: The list of loaded contacts.
     """
+    return load_indexed_contacts(use_cache, rebuild_cache)[0]
 
-    # Find the contact file
-    contact_file = expanduser(CONTACT_FILE)
 
-    # Initialise
-    contact_list = []
-    current_contact = None
+def load_indexed_contacts(
+    use_cache: bool = True, rebuild_cache: bool = False
+) -> Tuple[List[Contact], Optional[ContactIndex]]:
+    """
+    Load a list of contacts from a file, along with their index.
+
+    The index is stored in the cache along with the contacts. When the cache
+    isn't used, building an index would cost more than the single search it
+    would serve, so no index is returned.
+
+    The shards of a contact directory are parsed in parallel, and their
+    contacts are merged into one list.
+
+    Any problems with the format of the contact files are printed, whether the
+    contacts were parsed or loaded from the cache.
+
+    Args:
+        use_cache:     True to use the cache; False to parse the file directly.
+        rebuild_cache: True to rebuild the cache even if it's current.
+
+    Returns:
+        ([Contact], ContactIndex): The list of loaded contacts and their index.
+    """
+
+    # Load via the cache if we can
+    if use_cache:
+        payload = load_contact_payload(rebuild_cache=rebuild_cache)
+        for _, message in payload["warnings"]:
+            print(message)
+        return payload["contacts"], payload["index"]
+
+    # Parse the file, or each shard
+    from parallel import parallel_map
+
+    shards = parallel_map(_read_contacts, contact_files())
+    return list(chain.from_iterable(shards)), None
+
+
+def load_contact_payload(rebuild_cache: bool = False, previous: dict = None) -> dict:
+    """
+    Load the cache payload for a file, which holds the list of contacts, their
+    index, the map of the file's blocks, and the problems found with the
+    file's format. The problems are kept rather than printed, so they can be
+    reported every time the contacts are loaded, not just when they're parsed.
+
+    When the file has changed, only the contacts whose blocks changed are
+    parsed again, and they're spliced into the list and index in place of the
+    old ones. A long-running process can pass the payload it already has, to
+    update it without reading the cache.
+
+    Each shard of a contact directory has its own cache and payload. Those
+    whose caches are current are loaded from them, and the rest are brought up
+    to date in parallel. The payload for the directory holds each shard's
+    payload, the list of all their contacts, an index over every shard, and
+    the problems found in every shard, each with its position in its shard.
+
+    Args:
+        rebuild_cache: True to rebuild the cache even if it's current.
+        previous:      The payload already loaded, if any.
+
+    Returns:
+        dict: The payload.
+    """
+
+    # Find the contacts; a previous payload is no use if they've moved between
+    # a file and a directory
+    path = contact_path()
+    sharded = os.path.isdir(path)
+    if previous is not None and ("shards" in previous) != sharded:
+        previous = None
+
+    # Load a contact file via its cache
+    if not sharded:
+        return _load_payload(path, rebuild_cache, previous)
+
+    # Reuse the payload we already have for any shard that hasn't changed
+    files = contact_files(path)
+    signatures = [_signature(file) for file in files]
+    known = previous["shards"] if previous else {}
+    payloads = []
+    for file, signature in zip(files, signatures):
+        old_signature, old_payload = known.get(file, (None, None))
+        if old_payload is not None and old_signature != signature:
+            old_payload = _load_payload(file, previous=old_payload)
+        payloads.append(old_payload)
+
+    # Load the rest of the shards
+    payloads = _load_shards(
+        files,
+        partial(_load_payload, rebuild_cache=rebuild_cache),
+        suffix=None if rebuild_cache else cache.CACHE_SUFFIX,
+        payloads=payloads,
+    )
+
+    # Merge them
+    shards = [payload["contacts"] for payload in payloads]
+    indexes = [payload["index"] for payload in payloads]
+    warnings = [payload["warnings"] for payload in payloads]
+    return {
+        "contacts": list(chain.from_iterable(shards)),
+        "index": ShardedContacts(shards, indexes),
+        "shards": dict(zip(files, zip(signatures, payloads))),
+        "warnings": list(chain.from_iterable(warnings)),
+    }
+
+
+def load_contact_store(
+    use_cache: bool = True, rebuild_cache: bool = False
+) -> Union["ContactStore", ShardedContacts]:
+    """
+    Load the contacts from a file into a columnar contact store.
+
+    The store is cached separately from the list of contacts. It pickles as a
+    few large buffers and arrays rather than an object per contact, so loading
+    it from the cache is particularly quick.
+
+    Each shard of a contact directory has its own store, and its own cache.
+    Those whose caches are current are loaded from them, the rest are built in
+    parallel, and the stores are combined with ShardedContacts.
+
+    Args:
+        use_cache:     True to use the cache; False to parse the file directly.
+        rebuild_cache: True to rebuild the cache even if it's current.
+
+    Returns:
+        ContactStore: The contact store, or the combined stores of the shards,
+        which also act as their own index.
+    """
+
+    # Load a contact file's store
+    path = contact_path()
+    if not os.path.isdir(path):
+        return _load_store(path, use_cache, rebuild_cache)
+
+    # Load each shard's store, then combine them
+    use_current = use_cache and not rebuild_cache
+    stores = _load_shards(
+        contact_files(path),
+        partial(_load_store, use_cache=use_cache, rebuild_cache=rebuild_cache),
+        suffix=STORE_CACHE_SUFFIX if use_current else None,
+    )
+    return ShardedContacts(stores)
+
+
+def load_mapped_contacts() -> Union["MappedContacts", ShardedContacts]:
+    """
+    Memory-map the contact file and scan it, without decoding any contacts.
+
+    The shards of a contact directory are each mapped and scanned in turn,
+    since a mapping can't be handed from one process to another, and are
+    combined with ShardedContacts.
+
+    Returns:
+        MappedContacts: The mapped contacts, or the combined mapped shards,
+        which also act as their own index.
+    """
+    from mapped import MappedContacts
+
+    path = contact_path()
+    if not os.path.isdir(path):
+        return MappedContacts(path)
+    return ShardedContacts([MappedContacts(file) for file in contact_files(path)])
+
+
+def load_database(
+    use_cache: bool = True, rebuild_cache: bool = False
+) -> Union["ContactDatabase", ShardedContacts]:
+    """
+    Load the contacts from a file into a SQLite database.
+
+    The database is kept next to the contact file, and is synced with it
+    before it's used, so only the contacts that changed since it was last used
+    are parsed. Each shard of a contact directory has its own database, and
+    the databases are combined with ShardedContacts.
+
+    Args:
+        use_cache:     True to keep the database; False to build one in memory.
+        rebuild_cache: True to rebuild the database even if it's current.
+
+    Returns:
+        ContactDatabase: The database, or the combined databases of the shards.
+
+    Raises:
+        DatabaseUnavailable: If this SQLite can't hold the database.
+    """
+    from database import ContactDatabase
+
+    # Open and sync each file's database
+    databases = []
+    for file in contact_files():
+        database = ContactDatabase(
+            cache.cache_file_for(file, DATABASE_SUFFIX) if use_cache else ":memory:"
+        )
+        database.sync(file, _parse, rebuild=rebuild_cache)
+        databases.append(database)
+
+    # Combine them for a contact directory
+    if not os.path.isdir(contact_path()):
+        return databases[0]
+    return ShardedContacts(databases)
+
+
+def load_fuzzy_index(
+    contacts: Iterable[Contact],
+    use_cache: bool = True,
+    rebuild_cache: bool = False,
+    since: Snapshot = None,
+) -> Union["FuzzyIndex", "ShardedFuzzyIndex"]:
+    """
+    Load the index for fuzzy searches of the contacts.
+
+    The index is cached separately from the contacts, so it's only built by
+    the first fuzzy search after the contact file changes. Each shard of a
+    contact directory has its own index, and its own cache.
+
+    The index refers to the contacts by position, so it has to have been built
+    from the same content as they were. Given a snapshot taken before the
+    contacts were loaded, the index is built from the contacts themselves if
+    any of their files has changed since.
+
+    Args:
+        contacts:      The contacts, which the index is built from directly
+                       when the cache isn't used.
+        use_cache:     True to use the cache; False to build the index directly.
+        rebuild_cache: True to rebuild the cache even if it's current.
+        since:         The snapshot of the contact files taken before the
+                       contacts were loaded, if there is one.
+
+    Returns:
+        FuzzyIndex: The index, or the combined indexes of the shards.
+    """
+    from fuzzy import FuzzyIndex, ShardedFuzzyIndex
+
+    # Build the index from the contacts we have if we're not using the cache
+    if not use_cache:
+        return FuzzyIndex(contacts)
+
+    # Load a contact file's index via its cache, or each shard's index, then
+    # combine them
+    path = contact_path()
+    index: Union[FuzzyIndex, ShardedFuzzyIndex]
+    if not os.path.isdir(path):
+        index = _load_fuzzy_index(path, rebuild_cache)
+    else:
+        indexes = _load_shards(
+            contact_files(path),
+            partial(_load_fuzzy_index, rebuild_cache=rebuild_cache),
+            suffix=None if rebuild_cache else FUZZY_CACHE_SUFFIX,
+        )
+        index = ShardedFuzzyIndex(indexes)
+
+    # Make sure it matches the contacts
+    if since is not None and changed_since(since, path):
+        return FuzzyIndex(contacts)
+    return index
+
+
+def load_phonetic_index(
+    contacts: Iterable[Contact],
+    use_cache: bool = True,
+    rebuild_cache: bool = False,
+    since: Snapshot = None,
+) -> Union["PhoneticIndex", "ShardedPhoneticIndex"]:
+    """
+    Load the index for phonetic searches of the contacts.
+
+    Like the index for fuzzy searches, the index is cached separately from the
+    contacts, each shard of a contact directory has its own, and it's built
+    from the contacts themselves if their files have changed since they were
+    loaded.
+
+    Args:
+        contacts:      The contacts, which the index is built from directly
+                       when the cache isn't used.
+        use_cache:     True to use the cache; False to build the index directly.
+        rebuild_cache: True to rebuild the cache even if it's current.
+        since:         The snapshot of the contact files taken before the
+                       contacts were loaded, if there is one.
+
+    Returns:
+        PhoneticIndex: The index, or the combined indexes of the shards.
+    """
+    from phonetic import PhoneticIndex, ShardedPhoneticIndex
+
+    # Build the index from the contacts we have if we're not using the cache
+    if not use_cache:
+        return PhoneticIndex(contacts)
+
+    # Load a contact file's index via its cache, or each shard's index, then
+    # combine them
+    path = contact_path()
+    index: Union[PhoneticIndex, ShardedPhoneticIndex]
+    if not os.path.isdir(path):
+        index = _load_phonetic_index(path, rebuild_cache)
+    else:
+        indexes = _load_shards(
+            contact_files(path),
+            partial(_load_phonetic_index, rebuild_cache=rebuild_cache),
+            suffix=None if rebuild_cache else PHONETIC_CACHE_SUFFIX,
+        )
+        index = ShardedPhoneticIndex(indexes)
+
+    # Make sure it matches the contacts
+    if since is not None and changed_since(since, path):
+        return PhoneticIndex(contacts)
+    return index
+
+
+def iter_contacts() -> Iterator[Contact]:
+    """
+    Stream the contacts from a file.
+
+    Each contact is yielded as soon as its block ends, and the file is read a
+    line at a time, so only one contact is held in memory at once and the file
+    isn't read any further than the caller consumes.
+
+    The shards of a contact directory are streamed one after another.
+
+    Returns:
+        Iterator[Contact]: The contacts, in file order.
+    """
+    for contact_file in contact_files():
+        with open(contact_file) as file:
+            yield from _iter_lines(file)
+
+
+def contact_path() -> str:
+    """
+    Find where the contacts are kept.
+
+    Returns:
+        str: The contact directory, if there is one; otherwise, the contact file.
+    """
+    directory = expanduser(CONTACT_DIRECTORY)
+    return directory if os.path.isdir(directory) else expanduser(CONTACT_FILE)
+
+
+def contact_files(path: str = None) -> List[str]:
+    """
+    List the files the contacts are kept in.
+
+    Args:
+        path: The contact file or directory; by default, the one in use.
+
+    Returns:
+        [str]: The contact file, or the shards of the contact directory in
+        order of name.
+    """
+
+    # A contact file is its only file
+    if path is None:
+        path = contact_path()
+    if not os.path.isdir(path):
+        return [path]
+
+    # Find the shards in the directory, ignoring hidden files
+    return sorted(
+        os.path.join(path, name)
+        for name in os.listdir(path)
+        if name.endswith(SHARD_SUFFIX) and not name.startswith(".")
+    )
+
+
+def fingerprint(path: str = None) -> List[Tuple[str, int, int, int]]:
+    """
+    Find the fingerprint of the files the contacts are kept in, which changes
+    whenever any of them does.
+
+    Args:
+        path: The contact file or directory; by default, the one in use.
+
+    Returns:
+        [(str, int, int, int)]: The name, inode, size and modification time of
+        each file.
+    """
+    return [(file, *_signature(file)) for file in contact_files(path)]
+
+
+def snapshot(path: str = None) -> Snapshot:
+    """
+    Take a snapshot of the files the contacts are kept in, to tell later on
+    whether any of them has changed since.
+
+    A file modified within RACY_WINDOW_NS of the snapshot could be changed
+    again without its fingerprint changing, so its content is hashed as well.
+
+    Args:
+        path: The contact file or directory; by default, the one in use.
+
+    Returns:
+        [(str, int, int, int, str)]: The name, inode, size and modification
+        time of each file, and its content hash if it was modified too recently
+        for the rest to be trusted.
+    """
+    recent = time.time_ns() - cache.RACY_WINDOW_NS
+    return [
+        (file, ino, size, mtime, None if mtime < recent else cache.file_hash(file))
+        for file, ino, size, mtime in fingerprint(path)
+    ]
+
+
+def changed_since(before: Snapshot, path: str = None) -> bool:
+    """
+    Check whether any of the files the contacts are kept in has changed since a
+    snapshot was taken.
+
+    Args:
+        before: The snapshot.
+        path:   The contact file or directory; by default, the one in use.
+
+    Returns:
+        bool: True if a file has been changed, added or removed; otherwise,
+        False.
+    """
+    if fingerprint(path) != [file[:4] for file in before]:
+        return True
+    return any(
+        digest is not None and cache.file_hash(file) != digest
+        for file, *_, digest in before
+    )
+
+
+def _load_shards(
+    files: List[str],
+    load: Callable[[str], Any],
+    suffix: str = None,
+    payloads: List[Any] = None,
+) -> List[Any]:
+    """
+    Load the payload for each shard of a contact directory.
+
+    The shards whose caches are current are loaded from them in this process,
+    which is quicker than having a worker load them and send them back. The
+    rest are loaded in parallel, each by a worker process.
+
+    Args:
+        files:    The shards.
+        load:     Function that loads the payload for a shard, given its file;
+                  it must be picklable.
+        suffix:   The suffix of the caches to load current payloads from, or
+                  None not to use them.
+        payloads: The payloads already loaded, with None for each shard that
+                  still needs loading, if any have been.
+
+    Returns:
+        [Any]: The payload for each shard.
+    """
+
+    # Load the shards that are current from their caches
+    payloads = list(payloads) if payloads else [None] * len(files)
+    if suffix:
+        for i, file in enumerate(files):
+            if payloads[i] is None:
+                payloads[i] = cache.load_current(file, suffix)
+
+    # Load the rest in parallel
+    from parallel import parallel_map
+
+    stale = [i for i, payload in enumerate(payloads) if payload is None]
+    for i, payload in zip(stale, parallel_map(load, [files[i] for i in stale])):
+        payloads[i] = payload
+
+    # Done
+    return payloads
+
+
+def _load_payload(
+    contact_file: str, rebuild_cache: bool = False, previous: dict = None
+) -> dict:
+    """
+    Load the cache payload for a single contact file.
+
+    Args:
+        contact_file:  The contact file.
+        rebuild_cache: True to rebuild the cache even if it's current.
+        previous:      The payload already loaded, if any.
+
+    Returns:
+        dict: The payload.
+    """
+    return cache.load_cached(
+        contact_file,
+        _build_payload,
+        rebuild=rebuild_cache,
+        update=_update_payload,
+        previous=previous,
+    )
+
+
+def _load_store(
+    contact_file: str, use_cache: bool = True, rebuild_cache: bool = False
+) -> "ContactStore":
+    """
+    Load the contacts from a single contact file into a contact store.
+
+    Args:
+        contact_file:  The contact file.
+        use_cache:     True to use the cache; False to parse the file directly.
+        rebuild_cache: True to rebuild the cache even if it's current.
+
+    Returns:
+        ContactStore: The contact store.
+    """
+
+    # Load via the cache if we can
+    if use_cache:
+        return cache.load_cached(
+            contact_file,
+            _build_store,
+            rebuild=rebuild_cache,
+            suffix=STORE_CACHE_SUFFIX,
+        )
+
+    # Parse the file
+    from store import ContactStore
 
-    # Open and read the file
     with open(contact_file) as file:
+        return ContactStore(_iter_lines(file))
+
+
+def _load_fuzzy_index(contact_file: str, rebuild_cache: bool = False) -> "FuzzyIndex":
+    """
+    Load the index for fuzzy searches of a single contact file via its cache.
+
+    Args:
+        contact_file:  The contact file.
+        rebuild_cache: True to rebuild the cache even if it's current.
+
+    Returns:
+        FuzzyIndex: The index.
+    """
+    return cache.load_cached(
+        contact_file,
+        _build_fuzzy_index,
+        rebuild=rebuild_cache,
+        suffix=FUZZY_CACHE_SUFFIX,
+    )
+
+
+def _load_phonetic_index(
+    contact_file: str, rebuild_cache: bool = False
+) -> "PhoneticIndex":
+    """
+    Load the index for phonetic searches of a single contact file via its
+    cache.
+
+    Args:
+        contact_file:  The contact file.
+        rebuild_cache: True to rebuild the cache even if it's current.
+
+    Returns:
+        PhoneticIndex: The index.
+    """
+    return cache.load_cached(
+        contact_file,
+        _build_phonetic_index,
+        rebuild=rebuild_cache,
+        suffix=PHONETIC_CACHE_SUFFIX,
+    )
+
+
+def _read_contacts(contact_file: str) -> List[Contact]:
+    """
+    Parse a single contact file.
+
+    Args:
+        contact_file: The contact file.
+
+    Returns:
+        [Contact]: The parsed contacts.
+    """
+    with open(contact_file) as file:
+        return list(_iter_lines(file))
+
+
+def _signature(contact_file: str) -> Tuple[int, int, int]:
+    """
+    Find a contact file's signature, which changes whenever the file does.
+
+    Args:
+        contact_file: The contact file.
+
+    Returns:
+        (int, int, int): The file's inode, size and modification time.
+    """
+    stat = os.stat(contact_file)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _build_payload(data: bytes) -> dict:
+    """
+    Build the cache payload from the raw content of a contact file.
+
+    If the blocks found in the raw content don't match the contacts parsed
+    (which can only happen when a line starts with a character that's
+    whitespace once decoded, but not in the raw content), the payload has no
+    block map, and is always rebuilt from scratch.
 
-        # Visit each line
-        for line in file.readlines():
+    Args:
+        data: The raw content of the contact file.
 
-            # Ignore blank lines
-            if not (content := line.rstrip()):
-                continue
+    Returns:
+        dict: The parsed contacts, their index, the map of their blocks and
+        the problems found with the file's format.
+    """
+    warnings: List[FormatProblem] = []
+    contacts = _parse(data, warnings)
+    blocks = BlockMap(data)
+    return {
+        "contacts": contacts,
+        "index": ContactIndex(contacts),
+        "blocks": blocks if len(blocks) == len(contacts) else None,
+        "warnings": warnings,
+    }
+
+
+def _update_payload(data: bytes, payload: dict) -> dict:
+    """
+    Update a cache payload for the new raw content of a contact file.
+
+    Only the blocks that changed are parsed. The contacts parsed from them
+    replace the old ones in a new list, so anything still holding the old list
+    sees it unchanged, and in the index, which is updated in place. The
+    problems found in them replace those found in the old ones in the same way.
+
+    Args:
+        data:    The new raw content of the contact file.
+        payload: The payload for the file's old content.
+
+    Returns:
+        dict: The payload for the new content.
+    """
+
+    # Find the blocks that changed; if we can't, rebuild from scratch
+    contacts, index, blocks = payload["contacts"], payload["index"], payload["blocks"]
+    if not blocks or (change := blocks.update(data)) is None:
+        return _build_payload(data)
+
+    # Parse the changed blocks; if that fails, the map no longer describes the
+    # contacts, so it mustn't be used again
+    start, stop, first, last = change
+    found: List[FormatProblem] = []
+    try:
+        added = _parse(data[first:last], found)
+    except Exception:
+        payload["blocks"] = None
+        raise
+
+    # Make sure each block gave one contact
+    if len(contacts) - (stop - start) + len(added) != len(blocks):
+        return _build_payload(data)
+
+    # Splice them in, moving the problems found after them along
+    index.splice(start, stop, contacts[start:stop], added)
+    contacts = contacts[:start] + added + contacts[stop:]
+    shift = len(added) - (stop - start)
+    warnings = [warning for warning in payload["warnings"] if warning[0] < start]
+    warnings += [(start + position, message) for position, message in found]
+    warnings += [
+        (position + shift, message)
+        for position, message in payload["warnings"]
+        if position >= stop
+    ]
+    return {
+        "contacts": contacts,
+        "index": index,
+        "blocks": blocks,
+        "warnings": warnings,
+    }
+
+
+def _build_store(data: bytes) -> "ContactStore":
+    """
+    Build a contact store from the raw content of a contact file.
+
+    Args:
+        data: The raw content of the contact file.
+
+    Returns:
+        ContactStore: The contact store.
+    """
+    from store import ContactStore
+
+    return ContactStore(_iter_lines(io.TextIOWrapper(io.BytesIO(data))))
+
+
+def _build_fuzzy_index(data: bytes) -> "FuzzyIndex":
+    """
+    Build the index for fuzzy searches from the raw content of a contact file.
+
+    Any problems with the file's format are reported when the contacts are
+    loaded, so they aren't reported again.
+
+    Args:
+        data: The raw content of the contact file.
+
+    Returns:
+        FuzzyIndex: The index.
+    """
+    from fuzzy import FuzzyIndex
+
+    return FuzzyIndex(_iter_lines(io.TextIOWrapper(io.BytesIO(data)), []))
+
+
+def _build_phonetic_index(data: bytes) -> "PhoneticIndex":
+    """
+    Build the index for phonetic searches from the raw content of a contact
+    file.
 
-            # If it doesn't start with whitespace, it's a new contact
-            if not str.isspace(content[0]):
-                current_contact = Contact(name=content, kv_pairs=[], notes=[])
-                contact_list.append(current_contact)
-                continue
+    Any problems with the file's format are reported when the contacts are
+    loaded, so they aren't reported again.
 
-            # Make sure we're in a contact
-            if not current_contact:
-                print(f"No current contact -- review file format")
-                continue
+    Args:
+        data: The raw content of the contact file.
 
-            # Trim string
-            trimmed = content.lstrip()
+    Returns:
+        PhoneticIndex: The index.
+    """
+    from phonetic import PhoneticIndex
 
-            # A note?
-            if trimmed.startswith("- "):
-                note = trimmed[2:].strip()
-                if note:
-                    current_contact.notes.append(note)
+    return PhoneticIndex(_iter_lines(io.TextIOWrapper(io.BytesIO(data)), []))
 
-            # No, must be keyword:value
+
+def _parse(data: bytes, warnings: List[FormatProblem] = None) -> List[Contact]:
+    """
+    Parse raw contact file content.
+
+    The content is decoded exactly as it would be if the file had been opened
+    in text mode.
+
+    Args:
+        data:     The raw content.
+        warnings: The list to add any problems with the content's format to,
+                  rather than printing them, if any.
+
+    Returns:
+        [Contact]: The parsed contacts.
+    """
+    return list(_iter_lines(io.TextIOWrapper(io.BytesIO(data)), warnings))
+
+
+def _iter_lines(
+    lines: Iterable[str], warnings: List[FormatProblem] = None
+) -> Iterator[Contact]:
+    """
+    Parse the lines of a contact file.
+
+    Args:
+        lines:    The lines to parse.
+        warnings: The list to add any problems with the file's format to,
+                  rather than printing them, if any.
+
+    Returns:
+        Iterator[Contact]: The parsed contacts, yielded as each one ends.
+    """
+
+    # Initialise
+    current_contact = None
+    position = -1
+
+    # Visit each line
+    for line in lines:
+
+        # Ignore blank lines
+        if not (content := line.rstrip()):
+            continue
+
+        # If it doesn't start with whitespace, it's a new contact, and the
+        # previous contact is complete
+        if not str.isspace(content[0]):
+            if current_contact:
+                yield current_contact
+            current_contact = Contact(name=content, kv_pairs=[], notes=[])
+            position += 1
+            continue
+
+        # Make sure we're in a contact
+        if not current_contact:
+            _warn("No current contact -- review file format", position, warnings)
+            continue
+
+        # Trim string
+        trimmed = content.lstrip()
+
+        # A note?
+        if trimmed.startswith("- "):
+            note = trimmed[2:].strip()
+            if note:
+                current_contact.notes.append(note)
+
+        # No, must be keyword:value
+        else:
+            if len(words := trimmed.split(":", 1)) != 2:
+                message = f"Bad contact details ({trimmed}) -- ignored"
+                _warn(message, position, warnings)
             else:
-                if len(words := trimmed.split(":", 1)) != 2:
-                    print(f"Bad contact details ({trimmed}) -- ignored")
-                else:
-                    key = words[0].strip()
-                    value = words[1].strip()
-                    current_contact.kv_pairs.append(KeyValue(key=key, value=value))
-
-    # Return the list of contacts
-    return contact_list
+                key = sys.intern(words[0].strip())
+                value = words[1].strip()
+                current_contact.kv_pairs.append(KeyValue(key=key, value=value))
+
+    # The last contact ends with the file
+    if current_contact:
+        yield current_contact
+
+
+def _warn(message: str, position: int, warnings: Optional[List[FormatProblem]]):
+    """
+    Report a problem with a contact file's format.
+
+    Args:
+        message:  The problem.
+        position: The position of the contact it's in, or -1 if it's before
+                  the first contact.
+        warnings: The list to add it to, or None to print it.
+    """
+    if warnings is None:
+        print(message)
+    else:
+        warnings.append((position, message))
@@ -0,0 +1,313 @@
+from array import array
+from bisect import bisect_right
+from contact import Contact, KeyValue
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Union, overload
+
+import locale
+import mmap
+import re
+import sys
+
+# Pattern matching a single line of the contact file, including its line end
+# and any blank lines after it. For a non-blank line, exactly one of the groups
+# is set: a name line, a note, a key/value pair, or a bad line. Each group
+# excludes the whitespace around it, so its span is the field itself. Lines end
+# with any of "\n", "\r\n" or "\r", as they do in text mode. Since every line
+# matches, scanning the file moves straight from one line to the next.
+_LINE = re.compile(
+    rb"""
+    (?:
+        (?P<name>[^\s](?:[^\r\n]*[^\s])?)
+      | [ \t\f\v]+ (?:
+            -[ ][ \t\f\v]* (?P<note>[^\s](?:[^\r\n]*[^\s])?)
+          | (?P<key>(?:[^:\r\n]*[^\s:])?) [ \t\f\v]* : [ \t\f\v]*
+            (?P<value>(?:[^\s](?:[^\r\n]*[^\s])?)?)
+          | (?P<bad>[^\s](?:[^\r\n]*[^\s])?)
+        )
+    )?
+    (?:[ \t\f\v]*(?:\r\n|\r|\n|\Z))+
+    """,
+    re.VERBOSE,
+)
+
+# Typecode of the arrays holding offsets -- signed 64-bit
+_OFFSET = "q"
+
+
+class MappedContacts(Sequence[Contact]):
+    """
+    This class represents a contact file that's been memory-mapped and scanned.
+
+    Scanning the file records where each contact and each of its fields starts
+    and ends, as offsets into the mapped bytes, without creating any strings.
+    Contacts are only decoded when they're needed, either because they might
+    match a pattern or because they're being printed.
+
+    The object behaves as a read-only list of contacts, and also as an index of
+    itself: candidates() finds the contacts a pattern might match by searching
+    the mapped bytes directly, so it can be passed to filter_contacts() as both
+    the contacts and their index.
+
+    The file must use an ASCII-compatible encoding (such as UTF-8). Only ASCII
+    whitespace is treated as whitespace, and only ASCII letters are folded to
+    lower case when searching.
+    """
+
+    def __init__(self, contact_file: str):
+        """
+        Map and scan a contact file.
+
+        Args:
+            contact_file: The contact file.
+        """
+
+        # Map the file; an empty file can't be mapped, but has no contacts
+        self._data: Union[mmap.mmap, bytes]
+        with open(contact_file, "rb") as file:
+            try:
+                self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self._data = b""
+
+        # Encoding to decode fields with -- the one text mode would use
+        self._encoding = locale.getpreferredencoding(False)
+
+        # Start of each contact's block; the next block's start is its end
+        self._starts = array(_OFFSET)
+
+        # Start and end of each contact's name
+        self._names = array(_OFFSET)
+
+        # Position of each contact's first key/value pair and first note in
+        # the arrays below; the next contact's position is its end
+        self._first_kv = array(_OFFSET)
+        self._first_note = array(_OFFSET)
+
+        # Start and end of every key and value, and of every note
+        self._kvs = array(_OFFSET)
+        self._notes = array(_OFFSET)
+
+        # Scan the file
+        self._scan()
+
+    def _scan(self):
+        """
+        Scan the mapped file, recording the offsets of each contact's fields.
+        """
+
+        # Initialise
+        starts, names, kvs, notes = self._starts, self._names, self._kvs, self._notes
+        first_kv, first_note = self._first_kv, self._first_note
+
+        # Visit each line; the last group matched tells us what it is, and the
+        # spans of the groups are those of the fields
+        for line in _LINE.finditer(self._data):
+            if not (kind := line.lastgroup):
+                continue
+            _, name, note, key, value, bad = line.regs
+
+            # A name line starts a new contact
+            if kind == "name":
+                starts.append(line.start())
+                names.extend(name)
+                first_kv.append(len(kvs) >> 2)
+                first_note.append(len(notes) >> 1)
+                continue
+
+            # Make sure we're in a contact
+            if not starts:
+                print(f"No current contact -- review file format")
+
+            # Record a note or key/value pair
+            elif kind == "note":
+                notes.extend(note)
+            elif kind == "value":
+                kvs.extend(key)
+                kvs.extend(value)
+            else:
+                trimmed = self._decode(*bad)
+                print(f"Bad contact details ({trimmed}) -- ignored")
+
+        # Close off the last contact
+        self._starts.append(len(self._data))
+        self._first_kv.append(len(self._kvs) // 4)
+        self._first_note.append(len(self._notes) // 2)
+
+    def __len__(self) -> int:
+        """
+        Get the number of contacts in the file.
+
+        Returns:
+            int: The number of contacts.
+        """
+        return len(self._names) // 2
+
+    @overload
+    def __getitem__(self, position: int) -> Contact:
+        ...
+
+    @overload
+    def __getitem__(self, position: slice) -> List[Contact]:
+        ...
+
+    def __getitem__(self, position):
+        """
+        Decode a contact, or each contact in a slice.
+
+        Args:
+            position: The position of the contact in the file, or a slice of
+                      positions.
+
+        Returns:
+            Contact: The decoded contact, or a list of them for a slice.
+        """
+
+        # Decode a slice a contact at a time
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+
+        # Allow negative positions, and catch bad ones
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("contact position out of range")
+
+        # Decode the name
+        name = self._decode(self._names[2 * position], self._names[2 * position + 1])
+
+        # Decode the key/value pairs
+        kvs = self._kvs
+        kv_pairs = [
+            KeyValue(
+                key=sys.intern(self._decode(kvs[4 * i], kvs[4 * i + 1])),
+                value=self._decode(kvs[4 * i + 2], kvs[4 * i + 3]),
+            )
+            for i in range(self._first_kv[position], self._first_kv[position + 1])
+        ]
+
+        # Decode the notes
+        notes = [
+            self._decode(self._notes[2 * i], self._notes[2 * i + 1])
+            for i in range(self._first_note[position], self._first_note[position + 1])
+        ]
+
+        # Done
+        return Contact(name=name, kv_pairs=kv_pairs, notes=notes)
+
+    def __iter__(self) -> Iterator[Contact]:
+        """
+        Decode each contact in turn.
+
+        Returns:
+            Iterator[Contact]: The contacts, in file order.
+        """
+        return (self[i] for i in range(len(self)))
+
+    def candidates(self, pattern: Iterable[str]) -> Optional[Set[int]]:
+        """
+        Find the positions of the contacts that might match all patterns.
+
+        Each pattern is searched for directly in the mapped bytes, ignoring
+        case, and each hit is mapped back to the contact whose block contains
+        it. A hit may be in a key rather than a name, value or note, so each
+        candidate must still be checked with Contact.matches().
+
+        Patterns containing non-ASCII characters can't be case-folded reliably
+        in bytes, so they're ignored. If none of the patterns can be searched,
+        None is returned to show that every contact is a candidate.
+
+        Args:
+            pattern: The patterns to match, already in lower case.
+
+        Returns:
+            {int}: The positions of the candidate contacts, or None.
+        """
+
+        # Visit each pattern, narrowing the candidates as we go
+        candidates = None
+        for p in pattern:
+            if not p or not p.isascii():
+                continue
+            found = self._search(p.encode("ascii"))
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                break
+
+        # Done
+        return candidates
+
+    def has_key(self, key: str) -> bool:
+        """
+        Check whether any contact has a key.
+
+        An ASCII key is searched for directly in the mapped bytes, at the start
+        of a key/value line, ignoring case. Any other key can't be case-folded
+        reliably in bytes, so every key is decoded and compared with it.
+
+        Args:
+            key: The key, in lower case.
+
+        Returns:
+            bool: True if a contact has the key; otherwise, False.
+        """
+
+        # Search for an ASCII key's line
+        if key.isascii():
+            line = rb"(?:^|(?<=\r))[ \t\f\v]+%s[ \t\f\v]*:" % re.escape(key.encode())
+            flags = re.IGNORECASE | re.MULTILINE
+            return re.search(line, self._data, flags) is not None
+
+        # Decode each key in turn
+        kvs = self._kvs
+        return any(
+            self._decode(kvs[i], kvs[i + 1]).lower() == key
+            for i in range(0, len(kvs), 4)
+        )
+
+    def _search(self, pattern: bytes) -> Set[int]:
+        """
+        Find the positions of the contacts whose blocks contain a pattern.
+
+        Once a contact has a hit, the search skips to the start of the next
+        contact, since further hits in the same block wouldn't tell us anything.
+
+        Args:
+            pattern: The pattern to search for, in lower case.
+
+        Returns:
+            {int}: The positions of the contacts containing the pattern.
+        """
+
+        # Initialise
+        search = re.compile(re.escape(pattern), re.IGNORECASE).search
+        starts = self._starts
+        last = len(self)
+        found = set()
+
+        # Search from each hit's following contact
+        pos = 0
+        while hit := search(self._data, pos):
+            position = bisect_right(starts, hit.start()) - 1
+            if position < 0:
+                pos = starts[0]
+                continue
+            if position >= last:
+                break
+            found.add(position)
+            pos = starts[position + 1]
+
+        # Done
+        return found
+
+    def _decode(self, start: int, end: int) -> str:
+        """
+        Decode a field.
+
+        Args:
+            start: The offset of the start of the field.
+            end:   The offset of the end of the field.
+
+        Returns:
+            str: The decoded field.
+        """
+        return str(self._data[start:end], self._encoding)
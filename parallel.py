@@ -0,0 +1,191 @@
+from contact import Contact
+from query import FieldPattern
+from itertools import chain, repeat
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence
+
+import os
+
+# The process pool machinery is slow to import, so it's only imported once a
+# pool is actually needed
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+# Number of contacts above which filtering is done in parallel by default
+PARALLEL_THRESHOLD = 200_000
+
+# Number of chunks we give each worker, so a slow chunk doesn't hold up the rest
+CHUNKS_PER_JOB = 4
+
+# The contacts the workers filter. In the main process, this is the list the
+# current pool was started for; in a worker, it's that same list, inherited
+# when the worker was forked or passed once when it was spawned.
+_contacts: Optional[List[Contact]] = None
+
+# The current pool, and the number of workers it has
+_pool: Optional["ProcessPoolExecutor"] = None
+_pool_jobs = 0
+
+
+def default_jobs(contacts: List[Contact]) -> int:
+    """
+    Decide how many processes to filter a list of contacts with by default.
+
+    Args:
+        contacts: The contacts to filter.
+
+    Returns:
+        int: The number of processes; 1 means filtering in this process.
+    """
+    if len(contacts) < PARALLEL_THRESHOLD:
+        return 1
+    return os.cpu_count() or 1
+
+
+def parallel_filter(
+    contacts: List[Contact],
+    pattern: List[str],
+    jobs: int,
+    fields: Sequence[FieldPattern] = (),
+) -> List[int]:
+    """
+    Filter a list of contacts in parallel.
+
+    The list is split into chunks that are filtered by a pool of worker
+    processes, and the results are merged in order, so the result is exactly
+    what filtering in this process would find.
+
+    The pool is kept for as long as the same list is being filtered, so a
+    long-running process can filter it again without starting new workers.
+    Where processes can be forked, the workers share the list with this process
+    and it's never pickled; otherwise, it's pickled once for each worker when
+    the pool starts. Either way, only chunk boundaries and patterns are sent
+    with each query.
+
+    Args:
+        contacts: The contacts to filter.
+        pattern:  The plain patterns to match, already in lower case.
+        jobs:     The number of worker processes to use.
+        fields:   The field patterns to match.
+
+    Returns:
+        [int]: The positions of the contacts that match every pattern.
+    """
+
+    # Split the list into chunks
+    count = len(contacts)
+    chunk_count = min(count, jobs * CHUNKS_PER_JOB) or 1
+    bounds = [count * i // chunk_count for i in range(chunk_count + 1)]
+
+    # Filter the chunks, then merge the results in order
+    pool = _pool_for(contacts, jobs)
+    results = pool.map(
+        _filter_chunk, bounds[:-1], bounds[1:], repeat(pattern), repeat(fields)
+    )
+    return list(chain.from_iterable(results))
+
+
+def parallel_map(function: Callable, items: list, jobs: int = None) -> list:
+    """
+    Apply a function to each of a list of items in parallel.
+
+    The items are shared out between a pool of worker processes that lasts
+    only as long as the call. The function must be defined at the top level of
+    a module, so the workers can find it, and its results are pickled to send
+    them back. With fewer than two items, or only one core, the function is
+    simply applied in this process.
+
+    Args:
+        function: The function to apply.
+        items:    The items to apply it to.
+        jobs:     The number of worker processes; by default, one per core.
+
+    Returns:
+        list: The function's result for each item, in order.
+    """
+
+    # Only start workers if there's more than one to use
+    jobs = min(jobs or os.cpu_count() or 1, len(items))
+    if jobs < 2:
+        return [function(item) for item in items]
+
+    # Apply the function in the workers, forking them where we can
+    from concurrent.futures import ProcessPoolExecutor
+
+    import multiprocessing
+
+    context = None
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(jobs, mp_context=context) as pool:
+        return list(pool.map(function, items))
+
+
+def _pool_for(contacts: List[Contact], jobs: int) -> "ProcessPoolExecutor":
+    """
+    Get a pool of workers for filtering a list of contacts.
+
+    Args:
+        contacts: The contacts the workers will filter.
+        jobs:     The number of worker processes.
+
+    Returns:
+        ProcessPoolExecutor: The pool of workers.
+    """
+
+    global _contacts, _pool, _pool_jobs
+
+    # Keep the current pool if it suits
+    if _pool and _contacts is contacts and _pool_jobs == jobs:
+        return _pool
+
+    # Shut down the current pool
+    if _pool:
+        _pool.shutdown()
+
+    # Start a new pool, sharing the contacts with the workers
+    from concurrent.futures import ProcessPoolExecutor
+
+    import multiprocessing
+
+    _contacts, _pool_jobs = contacts, jobs
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        _pool = ProcessPoolExecutor(jobs, mp_context=context)
+    else:
+        _pool = ProcessPoolExecutor(jobs, initializer=_share, initargs=(contacts,))
+    return _pool
+
+
+def _share(contacts: List[Contact]):
+    """
+    Receive the contacts in a spawned worker.
+
+    Args:
+        contacts: The contacts the worker will filter.
+    """
+
+    global _contacts
+    _contacts = contacts
+
+
+def _filter_chunk(
+    start: int, end: int, pattern: List[str], fields: Sequence[FieldPattern]
+) -> List[int]:
+    """
+    Filter a chunk of the contacts in a worker.
+
+    Args:
+        start:   The position of the first contact in the chunk.
+        end:     The position after the last contact in the chunk.
+        pattern: The plain patterns to match, already in lower case.
+        fields:  The field patterns to match.
+
+    Returns:
+        [int]: The positions of the contacts that match every pattern.
+    """
+    return [
+        position
+        for position, contact in enumerate(_contacts[start:end], start)
+        if contact.matches_all(pattern)
+        and all(contact.matches_field(f.key, f.value, f.exact) for f in fields)
+    ]
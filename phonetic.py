@@ -0,0 +1,204 @@
+from array import array
+from contact import Contact
+from typing import Dict, Iterable, List, Optional, Set
+
+import re
+import unicodedata
+
+# Pattern matching a word: a run of letters and digits
+_WORD = re.compile(r"[^\W_]+")
+
+# Typecode of the arrays holding positions -- signed 64-bit
+_POSITION = "q"
+
+# Soundex digit for each consonant; vowels, and "h", "w" and "y", have none
+_DIGITS = {
+    letter: digit
+    for digit, letters in (
+        ("1", "bfpv"),
+        ("2", "cgjkqsxz"),
+        ("3", "dt"),
+        ("4", "l"),
+        ("5", "mn"),
+        ("6", "r"),
+    )
+    for letter in letters
+}
+
+# Letters that don't separate two consonants with the same digit
+_SILENT = "hw"
+
+# Length of a Soundex code
+CODE_LENGTH = 4
+
+
+class PhoneticIndex:
+    """
+    This class represents an index for finding names that sound like a pattern.
+
+    Each word in every contact's name is given a Soundex code once, when the
+    index is built, and the positions of the contacts with a word are kept
+    under its code. A search only has to work out the codes of the pattern's
+    words and look each one up, rather than coding every name each time.
+    """
+
+    def __init__(self, contacts: Iterable[Contact]):
+        """
+        Build the index for a collection of contacts.
+
+        Args:
+            contacts: The contacts to index.
+        """
+
+        # Find the positions of the contacts with a name word with each code
+        positions: Dict[str, List[int]] = {}
+        self.size = 0
+        for position, contact in enumerate(contacts):
+            for code in name_codes(contact):
+                if (found := positions.get(code)) is None:
+                    positions[code] = [position]
+                else:
+                    found.append(position)
+            self.size += 1
+
+        # Store the positions compactly
+        self.codes = {
+            code: array(_POSITION, found) for code, found in positions.items()
+        }
+
+    def __len__(self) -> int:
+        """
+        Get the number of contacts indexed.
+
+        Returns:
+            int: The number of contacts.
+        """
+        return self.size
+
+    def search(self, pattern: str) -> Set[int]:
+        """
+        Find the contacts whose names sound like a pattern.
+
+        Every word in the pattern must sound like a word in the contact's
+        name. A pattern with a word that can't be coded, such as a number,
+        doesn't sound like anything.
+
+        Args:
+            pattern: The pattern, in lower case.
+
+        Returns:
+            {int}: The positions of the contacts found.
+        """
+
+        # Find the codes of the pattern's words
+        codes = [soundex(word) for word in _WORD.findall(pattern)]
+        if not codes or None in codes:
+            return set()
+
+        # Find the contacts with a word with each code
+        found = None
+        for code in codes:
+            positions = self.codes.get(code, ())
+            found = set(positions) if found is None else found.intersection(positions)
+        return found
+
+
+class ShardedPhoneticIndex:
+    """
+    This class represents the phonetic indexes of several shards of a contact
+    directory, searched as one.
+    """
+
+    def __init__(self, indexes: List[PhoneticIndex]):
+        """
+        Combine the indexes of several shards.
+
+        Args:
+            indexes: The index of each shard, in shard order.
+        """
+        self.indexes = indexes
+
+    def __len__(self) -> int:
+        """
+        Get the number of contacts indexed.
+
+        Returns:
+            int: The number of contacts.
+        """
+        return sum(len(index) for index in self.indexes)
+
+    def search(self, pattern: str) -> Set[int]:
+        """
+        Find the contacts whose names sound like a pattern.
+
+        Args:
+            pattern: The pattern, in lower case.
+
+        Returns:
+            {int}: The positions of the contacts found.
+        """
+        found: Set[int] = set()
+        start = 0
+        for index in self.indexes:
+            found.update(start + position for position in index.search(pattern))
+            start += len(index)
+        return found
+
+
+def name_codes(contact: Contact) -> Set[str]:
+    """
+    Find the Soundex codes of the words in a contact's name.
+
+    Args:
+        contact: The contact.
+
+    Returns:
+        {str}: The codes.
+    """
+    codes = {soundex(word) for word in _WORD.findall(contact.name)}
+    codes.discard(None)
+    return codes
+
+
+def soundex(word: str) -> Optional[str]:
+    """
+    Find the Soundex code of a word.
+
+    The code is the word's first letter, followed by a digit for each of the
+    consonants after it, so that words that sound alike, such as "Smith" and
+    "Smyth", or "Jon" and "John", have the same code. Consonants with the same
+    digit count once when they're next to each other, or separated only by "h"
+    or "w". The code is cut or padded with zeroes to CODE_LENGTH characters.
+    Accents are ignored.
+
+    Args:
+        word: The word.
+
+    Returns:
+        str: The code, or None if the word has no letters to code.
+    """
+
+    # Find the letters, without their accents
+    word = unicodedata.normalize("NFKD", word.lower())
+    letters = [letter for letter in word if "a" <= letter <= "z"]
+    if not letters:
+        return None
+
+    # Keep the first letter, then add a digit for each consonant that isn't
+    # next to one with the same digit
+    code = [letters[0].upper()]
+    last = _DIGITS.get(letters[0])
+    for letter in letters[1:]:
+        digit = _DIGITS.get(letter)
+        if digit is None:
+            if letter not in _SILENT:
+                last = None
+            continue
+        if digit != last:
+            code.append(digit)
+            if len(code) == CODE_LENGTH:
+                break
+        last = digit
+
+    # Pad the code out
+    return "".join(code).ljust(CODE_LENGTH, "0")
@@ -0,0 +1,196 @@
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, List, Optional
+
+import sys
+import time
+
+# Number of allocation sites reported when tracing memory
+TOP_ALLOCATIONS = 10
+
+
+class Profile:
+    """
+    This class represents the profile of a single query.
+
+    The query is broken into phases (loading, filtering, sorting, rendering
+    and writing), and the wall-clock and CPU time spent in each is recorded.
+    Phases can be nested, in which case the time spent in the inner phase is
+    only counted against it, and not against the outer phase too. A cProfile
+    dump and the top memory allocators can be collected as well.
+    """
+
+    def __init__(
+        self, timings: bool, dump_file: str = None, trace_memory: bool = False
+    ):
+        """
+        Create a profile.
+
+        Args:
+            timings:      True to report the time spent in each phase.
+            dump_file:    The file to write cProfile statistics to, if any.
+            trace_memory: True to report the top memory allocators.
+        """
+        self.timings = timings
+        self.dump_file = dump_file
+        self.trace_memory = trace_memory
+        self.phases: Dict[str, List[float]] = {}
+        self._nested: Dict[str, List[float]] = {}
+        self._stack: List[str] = []
+        self._profiler = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time a phase of the query.
+
+        Args:
+            name: The name of the phase.
+        """
+
+        # Time the phase
+        self._stack.append(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+            # Count the time against this phase, and not the one it's within
+            self._stack.pop()
+            _add(self.phases, name, wall, cpu)
+            if self._stack:
+                _add(self._nested, self._stack[-1], wall, cpu)
+
+    def start(self):
+        """
+        Start profiling.
+        """
+
+        # Start tracing memory before anything else, so profiling the CPU
+        # doesn't show up as an allocator
+        if self.trace_memory:
+            import tracemalloc
+
+            tracemalloc.start()
+
+        # Start profiling the CPU
+        if self.dump_file:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        """
+        Stop profiling, and report the results on stderr.
+        """
+
+        # Stop profiling the CPU, and save the statistics
+        if self._profiler:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.dump_file)
+            print(f"\ncProfile statistics written to {self.dump_file}", file=sys.stderr)
+
+        # Report the time spent in each phase
+        if self.timings:
+            print(f"\n{'phase':<8} {'wall':>10} {'cpu':>10}", file=sys.stderr)
+            total_wall = total_cpu = 0.0
+            for name, (wall, cpu) in self.phases.items():
+                nested_wall, nested_cpu = self._nested.get(name, (0.0, 0.0))
+                wall, cpu = wall - nested_wall, cpu - nested_cpu
+                print(f"{name:<8} {_ms(wall)} {_ms(cpu)}", file=sys.stderr)
+                total_wall, total_cpu = total_wall + wall, total_cpu + cpu
+            print(f"{'total':<8} {_ms(total_wall)} {_ms(total_cpu)}", file=sys.stderr)
+
+        # Report the top allocators
+        if self.trace_memory:
+            import tracemalloc
+
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"\nPeak memory: {peak / 1024 / 1024:.1f}MB", file=sys.stderr)
+            print("Top allocations still held:", file=sys.stderr)
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                print(
+                    f"  {stat.size / 1024:>10.1f}KB {stat.count:>9} blocks  "
+                    f"{frame.filename}:{frame.lineno}",
+                    file=sys.stderr,
+                )
+
+
+# The profile of the current query, if it's being profiled
+_profile: Optional[Profile] = None
+
+# What a phase is timed with when the query isn't being profiled
+_NO_PROFILE = nullcontext()
+
+
+def start(timings: bool, dump_file: str = None, trace_memory: bool = False):
+    """
+    Start profiling the current query.
+
+    Args:
+        timings:      True to report the time spent in each phase.
+        dump_file:    The file to write cProfile statistics to, if any.
+        trace_memory: True to report the top memory allocators.
+    """
+
+    global _profile
+    _profile = Profile(timings, dump_file, trace_memory)
+    _profile.start()
+
+
+def stop():
+    """
+    Stop profiling the current query, and report the results on stderr.
+    """
+
+    global _profile
+    if _profile:
+        _profile.stop()
+        _profile = None
+
+
+def phase(name: str) -> ContextManager:
+    """
+    Time a phase of the current query.
+
+    When the query isn't being profiled, this does nothing at all.
+
+    Args:
+        name: The name of the phase.
+
+    Returns:
+        ContextManager: The context to run the phase in.
+    """
+    return _profile.phase(name) if _profile else _NO_PROFILE
+
+
+def _add(times: Dict[str, List[float]], name: str, wall: float, cpu: float):
+    """
+    Add to the time recorded for a phase.
+
+    Args:
+        times: The times recorded for each phase.
+        name:  The name of the phase.
+        wall:  The wall-clock time to add, in seconds.
+        cpu:   The CPU time to add, in seconds.
+    """
+    totals = times.setdefault(name, [0.0, 0.0])
+    totals[0] += wall
+    totals[1] += cpu
+
+
+def _ms(seconds: float) -> str:
+    """
+    Format a time for the report.
+
+    Args:
+        seconds: The time, in seconds.
+
+    Returns:
+        str: The time in milliseconds, right-aligned.
+    """
+    return f"{seconds * 1000:>8.1f}ms"
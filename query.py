@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Pattern, Tuple
+
+import re
+
+# Pattern matching a pattern scoped to a key: the key, then a colon, then "="
+# if the value must match exactly, then the value
+_SCOPED = re.compile(r"([A-Za-z][\w-]*):(=?)(.*)", re.DOTALL)
+
+# Characters that can be put around a value, so that it can contain spaces
+QUOTES = "\"'"
+
+# Flags regular expressions are compiled with: they ignore case, like every
+# other pattern, and "^" and "$" match at the start and end of each field
+REGEX_FLAGS = re.IGNORECASE | re.MULTILINE
+
+
+@dataclass(frozen=True)
+class FieldPattern:
+    """
+    This class represents a pattern that only matches the values of one key.
+
+    The key and value are both in lower case, since keys and values are matched
+    ignoring case. The value matches if it's found anywhere in a value of the
+    key, or, if it's exact, only if it's the whole of one.
+    """
+
+    # The key whose values are matched
+    key: str
+
+    # The value to match
+    value: str
+
+    # True if the value must match a whole value
+    exact: bool = False
+
+
+def parse_pattern(
+    pattern: Iterable[str], has_key: Callable[[str], bool] = None
+) -> Tuple[List[str], List[FieldPattern]]:
+    """
+    Split the patterns to search for into plain patterns and field patterns.
+
+    A pattern like "org:renham" only matches the values of the key before the
+    colon, while "org:=renham industries" only matches a value that's exactly
+    the one given. The value can be put in quotes, as in 'role:"IT Support"'.
+    Keys start with a letter and can contain letters, digits, underscores and
+    hyphens. Anything else, such as "12:30", is a plain pattern, and matches
+    the name, values and notes as usual.
+
+    Given a way to tell which keys the contacts have, a pattern that looks like
+    it's scoped to a key that no contact has, such as "https://example.com" or
+    "mailto:roy", is a plain pattern too.
+
+    Args:
+        pattern: The patterns to search for.
+        has_key: Function that checks whether any contact has a key, given in
+                 lower case, if we know.
+
+    Returns:
+        ([str], [FieldPattern]): The plain patterns and the field patterns, all
+        in lower case.
+    """
+
+    # Visit each pattern
+    plain = []
+    fields = []
+    for p in pattern:
+
+        # A plain pattern?
+        match = _SCOPED.fullmatch(p)
+        if not match or has_key and not has_key(match[1].lower()):
+            plain.append(p.lower())
+            continue
+
+        # No, a field pattern; take the quotes off its value
+        key, exact, value = match.groups()
+        if len(value) >= 2 and value[0] in QUOTES and value[-1] == value[0]:
+            value = value[1:-1]
+        fields.append(FieldPattern(key.lower(), value.lower(), exact=bool(exact)))
+
+    # Done
+    return plain, fields
+
+
+def reduce_patterns(pattern: Iterable[str]) -> List[str]:
+    """
+    Reduce plain patterns to the fewest that must be checked.
+
+    Every pattern must be found, so a pattern found within another one, such
+    as "rey" within "reynholm", adds nothing: any contact containing the longer
+    pattern contains the shorter one too. Such patterns are dropped, as are
+    repeats and empty patterns, which match everything. The patterns left keep
+    their order.
+
+    Args:
+        pattern: The plain patterns, in lower case.
+
+    Returns:
+        [str]: The patterns that must be checked.
+    """
+    pattern = list(dict.fromkeys(p for p in pattern if p))
+    return [
+        p
+        for p in pattern
+        if not any(p in longer and p != longer for longer in pattern)
+    ]
+
+
+def compile_regexes(pattern: Iterable[str]) -> List[Pattern]:
+    """
+    Compile the patterns to search for as regular expressions.
+
+    Each pattern is compiled once, with REGEX_FLAGS, and is matched against a
+    contact's name, values and notes, each of which is a line of its own.
+
+    Args:
+        pattern: The patterns to search for.
+
+    Returns:
+        [Pattern]: The compiled regular expressions.
+
+    Raises:
+        re.error: If a pattern isn't a valid regular expression.
+    """
+    return [re.compile(p, REGEX_FLAGS) for p in pattern]
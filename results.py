@@ -0,0 +1,157 @@
+from cache import RACY_WINDOW_NS
+from collections import OrderedDict
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+
+import os
+import pickle
+import time
+
+# Suffix added to the contact file's (or directory's) name to give the name of
+# the result cache
+RESULTS_SUFFIX = ".results.cache"
+
+# Result cache format version -- bump this whenever the shape of the cache
+# changes
+RESULTS_VERSION = 2
+
+# Largest number of results kept; the least recently used are evicted first
+MAX_RESULTS = 64
+
+# Largest output kept, in characters; bigger outputs aren't worth the space
+MAX_OUTPUT_SIZE = 256 * 1024
+
+
+class ResultCache:
+    """
+    This class represents the rendered output of recent queries, kept on disk.
+
+    Each query's output is kept under a key made from its patterns and
+    options, along with the fingerprint of the contact files it was run
+    against: the name, inode, size and modification time of each one. If the
+    fingerprint has changed since the cache was written, or it was written on
+    a different day, which may have changed the ages shown, every result is
+    discarded. At most MAX_RESULTS results are kept, the least recently used
+    being evicted first.
+    """
+
+    def __init__(self, contact_file: str, fingerprint: List[Tuple]):
+        """
+        Read the result cache for a contact file.
+
+        Args:
+            contact_file: The contact file, or contact directory.
+            fingerprint:  The current fingerprint of the contact files.
+        """
+
+        # Read the cache, ignoring it if it's unusable or out of date
+        self.cache_file = os.path.abspath(contact_file) + RESULTS_SUFFIX
+        self.fingerprint = fingerprint
+        self.date = date.today().toordinal()
+        self.results: OrderedDict = OrderedDict()
+        try:
+            with open(self.cache_file, "rb") as file:
+                entry = pickle.loads(file.read())
+            if (
+                entry["version"] == RESULTS_VERSION
+                and entry["fingerprint"] == fingerprint
+                and entry["date"] == self.date
+            ):
+                self.results = entry["results"]
+        except Exception:
+            pass
+
+    def get(self, key: Tuple) -> Optional[str]:
+        """
+        Get the output of a query, marking it as recently used.
+
+        The cache isn't written for a hit; the new order is written along with
+        the next result put in it.
+
+        Args:
+            key: The query's key.
+
+        Returns:
+            str: The query's output, or None if it isn't in the cache.
+        """
+        if (output := self.results.get(key)) is not None:
+            self.results.move_to_end(key)
+        return output
+
+    def put(self, key: Tuple, output: str):
+        """
+        Add the output of a query, evicting the least recently used results if
+        the cache is full.
+
+        Output that's too big isn't kept, and nothing is kept if a contact file
+        was modified so recently that a further change might not alter its
+        fingerprint.
+
+        Args:
+            key:    The query's key.
+            output: The query's output.
+        """
+
+        # Make sure it's worth keeping, and safe to
+        if len(output) > MAX_OUTPUT_SIZE:
+            return
+        recent = time.time_ns() - RACY_WINDOW_NS
+        if any(mtime_ns > recent for *_, mtime_ns in self.fingerprint):
+            return
+
+        # Add it, then evict the least recently used results
+        self.results[key] = output
+        self.results.move_to_end(key)
+        while len(self.results) > MAX_RESULTS:
+            self.results.popitem(last=False)
+        self._write()
+
+    def _write(self):
+        """
+        Write the cache.
+
+        The cache is written to a temporary file which then replaces the old
+        one, so a concurrent reader never sees a partially written cache.
+        Failure to write it is not an error.
+        """
+
+        # Build the entry
+        entry = {
+            "version": RESULTS_VERSION,
+            "fingerprint": self.fingerprint,
+            "date": self.date,
+            "results": self.results,
+        }
+
+        # Write it
+        temp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(temp_file, "wb") as file:
+                file.write(pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+            os.replace(temp_file, self.cache_file)
+        except OSError:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+
+
+def query_key(pattern: Iterable[str], regex: bool = False, **options) -> Tuple:
+    """
+    Make the key a query's output is kept under.
+
+    The patterns are normalised so that queries that must give the same output
+    share a key: all patterns are matched ignoring case, and every one must
+    match, so their case and order don't matter. Regular expressions keep
+    their case, since it can change their meaning.
+
+    Args:
+        pattern: The patterns searched for.
+        regex:   True if the patterns are regular expressions.
+        options: The other options that affect the output.
+
+    Returns:
+        tuple: The key.
+    """
+    patterns = sorted(pattern if regex else (p.lower() for p in pattern))
+    return (tuple(patterns), regex, tuple(sorted(options.items())))
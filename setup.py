@@ -1,9 +1,15 @@
 from setuptools import setup, find_packages
 
+import re
+
+# Read the version from the script, without importing it
+with open("contacts.py") as file:
+    version = re.search(r'^__version__ = "(.*)"$', file.read(), re.M).group(1)
+
 setup(
     name="contacts",
-    version="1.0",
-    packages=find_packages(),
+    version=version,
+    packages=find_packages(exclude=["benchmarks"]),
     scripts=["contacts.py"],
     # metadata to display on PyPI
     author="Andrew Lighten",
@@ -29,5 +35,5 @@ setup(
         "Operating System :: MacOS :: MacOS X",
         "Operating System :: POSIX :: Linux",
     ],
-    install_requires=["Click>=7.0", "termcolor>=1.1.0"],
+    install_requires=["Click>=8.0", "termcolor>=2.1.0"],
 )
@@ -0,0 +1,243 @@
+from bisect import bisect_right
+from contact import Contact
+from itertools import chain
+from query import FieldPattern
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    cast,
+    overload,
+)
+
+# Only a contact store can run regular expressions itself
+if TYPE_CHECKING:
+    from store import ContactStore
+
+
+class ShardedContacts(Sequence[Contact]):
+    """
+    This class represents the contacts loaded from several shards of a contact
+    directory, as one list.
+
+    Each shard is a sequence of contacts (a list, ContactStore or
+    MappedContacts) with its own index, and stays exactly as it was loaded. The
+    object behaves as a read-only list of the contacts in every shard, in shard
+    order, and as their index: candidates() asks each shard's index for its
+    candidates and offsets them by the shard's position in the whole, so it can
+    be passed to filter_contacts() as either the contacts or their index.
+    """
+
+    def __init__(self, shards: Sequence[Sequence[Contact]], indexes: List = None):
+        """
+        Combine several shards.
+
+        Args:
+            shards:  The contacts in each shard.
+            indexes: The index of each shard, or None where a shard has no
+                     index; by default, each shard is its own index.
+        """
+
+        # Record the shards and their indexes
+        self.shards = shards
+        self.indexes: Sequence = indexes if indexes is not None else shards
+
+        # Record the position of each shard's first contact in the whole
+        self._starts = [0]
+        for shard in shards:
+            self._starts.append(self._starts[-1] + len(shard))
+
+        # The candidates are exact only if every shard's are, and patterns
+        # scoped to a key can only be narrowed if every shard's index can
+        self.exact = all(getattr(index, "exact", False) for index in self.indexes)
+        self.scoped = all(getattr(index, "scoped", False) for index in self.indexes)
+
+    def __len__(self) -> int:
+        """
+        Get the number of contacts in all the shards.
+
+        Returns:
+            int: The number of contacts.
+        """
+        return self._starts[-1]
+
+    @overload
+    def __getitem__(self, position: int) -> Contact:
+        ...
+
+    @overload
+    def __getitem__(self, position: slice) -> List[Contact]:
+        ...
+
+    def __getitem__(self, position):
+        """
+        Get a contact, or each contact in a slice.
+
+        Args:
+            position: The position of the contact in the whole, or a slice of
+                      positions.
+
+        Returns:
+            Contact: The contact, or a list of them for a slice.
+        """
+
+        # Get a slice's contacts all at once
+        if isinstance(position, slice):
+            return self.fetch(range(*position.indices(len(self))))
+
+        # Allow negative positions, and catch bad ones
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("contact position out of range")
+
+        # Find the shard it's in
+        shard = bisect_right(self._starts, position) - 1
+        return self.shards[shard][position - self._starts[shard]]
+
+    def __iter__(self) -> Iterator[Contact]:
+        """
+        Visit each contact in turn.
+
+        Returns:
+            Iterator[Contact]: The contacts, in shard order.
+        """
+        return chain.from_iterable(self.shards)
+
+    def close(self):
+        """
+        Close each shard that has to be closed, such as a database.
+        """
+        for shard in self.shards:
+            if (close := getattr(shard, "close", None)) is not None:
+                close()
+
+    def fetch(self, positions: Iterable[int]) -> List[Contact]:
+        """
+        Get several contacts, letting each shard that can fetch its contacts
+        all at once do so.
+
+        Args:
+            positions: The positions of the contacts in the whole.
+
+        Returns:
+            [Contact]: The contacts, in the order their positions were given.
+        """
+
+        # Find which shard each contact is in
+        positions = list(positions)
+        wanted: List[List[int]] = [[] for _ in self.shards]
+        for position in positions:
+            number = bisect_right(self._starts, position) - 1
+            wanted[number].append(position - self._starts[number])
+
+        # Get them from each shard
+        found: Dict[int, Contact] = {}
+        for start, shard, shard_positions in zip(self._starts, self.shards, wanted):
+            if not shard_positions:
+                continue
+            if hasattr(shard, "fetch"):
+                contacts = shard.fetch(shard_positions)
+            else:
+                contacts = [shard[i] for i in shard_positions]
+            found.update(zip((start + i for i in shard_positions), contacts))
+
+        # Done
+        return [found[position] for position in positions]
+
+    def candidates(
+        self, pattern: Iterable[str], fields: Iterable[FieldPattern] = ()
+    ) -> Optional[Set[int]]:
+        """
+        Find the positions of the contacts that might match all patterns.
+
+        A shard with no index, or whose index can't narrow its contacts down,
+        contributes all of its contacts. If no shard's index can narrow its
+        contacts down, None is returned to show that every contact is a
+        candidate.
+
+        Args:
+            pattern: The plain patterns to match, already in lower case.
+            fields:  The field patterns to match, if every shard's index can
+                     narrow them.
+
+        Returns:
+            {int}: The positions of the candidate contacts, or None.
+        """
+
+        # Ask each shard's index for its candidates
+        pattern, fields = list(pattern), list(fields)
+        found = [
+            None
+            if index is None
+            else index.candidates(pattern, fields)
+            if fields
+            else index.candidates(pattern)
+            for index in self.indexes
+        ]
+        if all(shard is None for shard in found):
+            return None
+
+        # Offset them by the shard's position
+        candidates: Set[int] = set()
+        for start, stop, shard in zip(self._starts, self._starts[1:], found):
+            if shard is None:
+                candidates.update(range(start, stop))
+            else:
+                candidates.update(start + position for position in shard)
+
+        # Done
+        return candidates
+
+    def has_key(self, key: str) -> bool:
+        """
+        Check whether any contact in any shard has a key.
+
+        Each shard's index is asked, or, for a shard without one that can tell,
+        its contacts are checked.
+
+        Args:
+            key: The key, in lower case.
+
+        Returns:
+            bool: True if a contact has the key; otherwise, False.
+        """
+        for shard, index in zip(self.shards, self.indexes):
+            if hasattr(index, "has_key"):
+                if index.has_key(key):
+                    return True
+            elif any(
+                kv.key.lower() == key for contact in shard for kv in contact.kv_pairs
+            ):
+                return True
+        return False
+
+    def regex_candidates(self, pattern: Iterable[Pattern]) -> Optional[Set[int]]:
+        """
+        Find the positions of the contacts that match all regular expressions.
+
+        Args:
+            pattern: The compiled regular expressions to match.
+
+        Returns:
+            {int}: The positions of the matching contacts, or None if a shard
+            can't run regular expressions itself.
+        """
+
+        # Every shard has to be able to run them
+        if not all(hasattr(shard, "regex_candidates") for shard in self.shards):
+            return None
+
+        # Ask each shard, then offset its matches by the shard's position
+        pattern = list(pattern)
+        found: Set[int] = set()
+        stores = cast(List["ContactStore"], self.shards)
+        for start, store in zip(self._starts, stores):
+            found.update(start + i for i in store.regex_candidates(pattern))
+        return found
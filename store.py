@@ -0,0 +1,347 @@
+from array import array
+from bisect import bisect_right
+from contact import SEARCH_TEXT_SEP, Contact, KeyValue
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Tuple,
+    overload,
+)
+
+import sys
+
+# Key ids used for the fields that aren't key/value pairs
+NAME_FIELD = -1
+NOTE_FIELD = -2
+
+
+class ContactStore(Sequence[Contact]):
+    """
+    This class represents a list of contacts stored column-wise.
+
+    Rather than a Python object for every contact, key/value pair and note,
+    the store holds a handful of flat columns:
+
+    - the text of every field (names, values and notes), concatenated into one
+      buffer and separated by SEARCH_TEXT_SEP;
+    - the offset at which each field ends in that buffer;
+    - the key id of each field, or NAME_FIELD or NOTE_FIELD;
+    - the position of each contact's first field; and
+    - the distinct keys, each stored once.
+
+    Every contact's search text is also concatenated into a second buffer, so a
+    pattern can be found in every contact with one scan of that buffer rather
+    than a Python loop over the contacts. Regular expressions are run over the
+    field text in the same way. The store behaves as a read-only list of
+    contacts, decoding each one on demand, and is its own index, so it can be
+    passed straight to filter_contacts() and print_contacts().
+    """
+
+    # The candidates the store finds are exact, so needn't be checked again
+    exact = True
+
+    # The field text with a line per field, and the offset of each contact's
+    # first line in it, which are built the first time they're needed
+    _lines: Optional[str] = None
+    _line_starts: Optional[array] = None
+
+    def __init__(self, contacts: Iterable[Contact]):
+        """
+        Build a store from a collection of contacts.
+
+        Args:
+            contacts: The contacts to store.
+        """
+
+        # Initialise the columns
+        self._keys: List[str] = []
+        self._first_field = array("q")
+        self._field_ends = array("q")
+        self._key_ids = array("i")
+        self._search_starts = array("q")
+
+        # Initialise the buffers, which are built from lists of their parts
+        text_parts: List[str] = []
+        search_parts: List[str] = []
+        key_ids: Dict[str, int] = {}
+        text_end = -len(SEARCH_TEXT_SEP)
+        search_end = -len(SEARCH_TEXT_SEP)
+
+        # Visit each contact
+        for contact in contacts:
+
+            # Record where it starts
+            self._first_field.append(len(self._field_ends))
+            self._search_starts.append(search_end + len(SEARCH_TEXT_SEP))
+
+            # Record its search text
+            search_text = contact.search_text()
+            search_parts.append(search_text)
+            search_end += len(SEARCH_TEXT_SEP) + len(search_text)
+
+            # Record its fields
+            fields = [(NAME_FIELD, contact.name)]
+            for kv in contact.kv_pairs:
+                if (key_id := key_ids.get(kv.key)) is None:
+                    key_id = key_ids[kv.key] = len(self._keys)
+                    self._keys.append(kv.key)
+                fields.append((key_id, kv.value))
+            fields.extend((NOTE_FIELD, note) for note in contact.notes)
+            for key_id, field in fields:
+                text_parts.append(field)
+                text_end += len(SEARCH_TEXT_SEP) + len(field)
+                self._key_ids.append(key_id)
+                self._field_ends.append(text_end)
+
+        # Close off the last contact
+        self._first_field.append(len(self._field_ends))
+        self._search_starts.append(search_end + len(SEARCH_TEXT_SEP))
+
+        # Build the buffers
+        self._text = SEARCH_TEXT_SEP.join(text_parts)
+        self._search = SEARCH_TEXT_SEP.join(search_parts)
+
+    def __len__(self) -> int:
+        """
+        Get the number of contacts in the store.
+
+        Returns:
+            int: The number of contacts.
+        """
+        return len(self._first_field) - 1
+
+    @overload
+    def __getitem__(self, position: int) -> Contact:
+        ...
+
+    @overload
+    def __getitem__(self, position: slice) -> List[Contact]:
+        ...
+
+    def __getitem__(self, position):
+        """
+        Decode a contact, or each contact in a slice.
+
+        Args:
+            position: The position of the contact in the store, or a slice of
+                      positions.
+
+        Returns:
+            Contact: The decoded contact, or a list of them for a slice.
+        """
+
+        # Decode a slice a contact at a time
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+
+        # Allow negative positions, and catch bad ones
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("contact position out of range")
+
+        # Initialise
+        text, ends, key_ids = self._text, self._field_ends, self._key_ids
+        first = self._first_field[position]
+        start = ends[first - 1] + len(SEARCH_TEXT_SEP) if first else 0
+        contact = Contact(name="", kv_pairs=[], notes=[])
+
+        # Visit each field
+        for field in range(first, self._first_field[position + 1]):
+            value = text[start : ends[field]]
+            start = ends[field] + len(SEARCH_TEXT_SEP)
+            key_id = key_ids[field]
+            if key_id == NAME_FIELD:
+                contact.name = value
+            elif key_id == NOTE_FIELD:
+                contact.notes.append(value)
+            else:
+                contact.kv_pairs.append(KeyValue(key=self._keys[key_id], value=value))
+
+        # Done
+        return contact
+
+    def __iter__(self) -> Iterator[Contact]:
+        """
+        Decode each contact in turn.
+
+        Returns:
+            Iterator[Contact]: The contacts, in their original order.
+        """
+        return (self[i] for i in range(len(self)))
+
+    def __setstate__(self, state: dict):
+        """
+        Restore a store that's been unpickled.
+
+        The keys are interned again, since unpickling doesn't preserve that.
+
+        Args:
+            state: The store's pickled state.
+        """
+        self.__dict__.update(state)
+        self._keys = [sys.intern(key) for key in self._keys]
+
+    def candidates(self, pattern: Iterable[str]) -> Optional[Set[int]]:
+        """
+        Find the positions of the contacts that match all patterns.
+
+        The longest pattern is found by scanning the search buffer, skipping to
+        the next contact after each hit. The other patterns are then checked
+        only within the search text of the contacts that were found. Since the
+        search buffer holds exactly the text that Contact.matches() checks, the
+        candidates are exact.
+
+        An empty pattern matches every contact, so it's ignored. If every
+        pattern is empty, None is returned to show that every contact matches.
+
+        Args:
+            pattern: The patterns to match, already in lower case.
+
+        Returns:
+            {int}: The positions of the matching contacts, or None.
+        """
+
+        # Longer patterns tend to be rarer, so start with the longest
+        pattern = sorted((p for p in pattern if p), key=len, reverse=True)
+        if not pattern:
+            return None
+
+        # Scan for the first pattern, then check the others in each contact
+        find = self._search.find
+        starts = self._search_starts
+        return {
+            i
+            for i in self._search_for(pattern[0])
+            if all(find(p, starts[i], starts[i + 1]) >= 0 for p in pattern[1:])
+        }
+
+    def has_key(self, key: str) -> bool:
+        """
+        Check whether any contact has a key.
+
+        Args:
+            key: The key, in lower case.
+
+        Returns:
+            bool: True if a contact has the key; otherwise, False.
+        """
+        return any(known.lower() == key for known in self._keys)
+
+    def regex_candidates(self, pattern: Iterable[Pattern]) -> Set[int]:
+        """
+        Find the positions of the contacts that match all regular expressions.
+
+        Each contact's name, values and notes are matched as lines of text, so
+        "^" and "$" match at the start and end of each field if the
+        expressions are compiled with re.MULTILINE. The first expression is
+        run over the text of every contact at once, skipping to the next
+        contact after each hit, and the others are then run only over the
+        text of the contacts that were found.
+
+        Args:
+            pattern: The compiled regular expressions to match.
+
+        Returns:
+            {int}: The positions of the matching contacts.
+        """
+
+        # Find the contacts matching the first expression, then check the
+        # others against each of them
+        pattern = list(pattern)
+        if not pattern or not len(self):
+            return set(range(len(self)))
+        lines, starts = self._line_buffer()
+        return {
+            i
+            for i in self._regex_search(pattern[0])
+            if all(p.search(lines, starts[i], starts[i + 1] - 1) for p in pattern[1:])
+        }
+
+    def _line_buffer(self) -> Tuple[str, array]:
+        """
+        Get the field text with a line per field, and where each contact's
+        lines start.
+
+        Returns:
+            (str, array): The text, and the offset of each contact's first line
+            in it, followed by the offset just past the end of the text.
+        """
+
+        # Build them the first time they're needed
+        if self._lines is None:
+            ends, first_field = self._field_ends, self._first_field
+            sep = len(SEARCH_TEXT_SEP)
+            self._lines = self._text.replace(SEARCH_TEXT_SEP, "\n")
+            self._line_starts = array(
+                "q", (ends[first - 1] + sep if first else 0 for first in first_field)
+            )
+
+        # Done
+        return self._lines, self._line_starts
+
+    def _regex_search(self, pattern: Pattern) -> Set[int]:
+        """
+        Find the positions of the contacts whose text matches a regular
+        expression.
+
+        A hit that runs on into the following contact is checked again within
+        its own contact's text, so it can't match across two contacts.
+
+        Args:
+            pattern: The compiled regular expression.
+
+        Returns:
+            {int}: The positions of the matching contacts.
+        """
+
+        # Initialise
+        lines, starts = self._line_buffer()
+        search = pattern.search
+        found = set()
+
+        # Find each hit, then skip to the following contact
+        pos = 0
+        while (hit := search(lines, pos)) is not None:
+            position = bisect_right(starts, hit.start()) - 1
+            end = starts[position + 1] - 1
+            if hit.end() <= end or search(lines, starts[position], end):
+                found.add(position)
+            pos = starts[position + 1]
+            if pos > len(lines):
+                break
+
+        # Done
+        return found
+
+    def _search_for(self, pattern: str) -> Set[int]:
+        """
+        Find the positions of the contacts whose search text contains a pattern.
+
+        Args:
+            pattern: The pattern to search for, in lower case.
+
+        Returns:
+            {int}: The positions of the contacts containing the pattern.
+        """
+
+        # Initialise
+        find = self._search.find
+        starts = self._search_starts
+        found = set()
+
+        # Find each hit, then skip to the following contact
+        pos = 0
+        while (hit := find(pattern, pos)) >= 0:
+            position = bisect_right(starts, hit) - 1
+            found.add(position)
+            pos = starts[position + 1]
+
+        # Done
+        return found
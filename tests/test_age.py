@@ -0,0 +1,35 @@
+from benchmarks.age import ODD_DATES, check, dates
+
+import datetime
+
+# Days of the month where ages change awkwardly: the ends of the months, and
+# the first of the next
+AWKWARD_DAYS = (1, 28, 29, 30, 31)
+
+# Birthdays on the 29th of February, in leap years before, around and after
+# 2100, which isn't a leap year
+LEAP_DAY_BIRTHS = ["1896-02-29", "1904-02-29", "2000-02-29", "2096-02-29"]
+
+
+def _days(first_year, last_year, keep):
+    first, last = datetime.date(first_year, 1, 1), datetime.date(last_year, 12, 31)
+    return [day for day in dates(first, last) if keep(day)]
+
+
+def _midnights(days):
+    return [datetime.datetime.combine(day, datetime.time()) for day in days]
+
+
+def test_ages_agree_with_relativedelta_across_a_leap_cycle():
+    births = [
+        day.isoformat()
+        for day in _days(1999, 2001, lambda day: day.day in AWKWARD_DAYS)
+    ]
+    todays = _midnights(_days(2095, 2105, lambda day: day.day in AWKWARD_DAYS))
+    assert check(births + ODD_DATES, todays) == []
+
+
+def test_leap_day_ages_agree_with_relativedelta():
+    todays = _midnights(_days(2095, 2105, lambda day: day.month in (2, 3)))
+    todays += [today.replace(hour=12) for today in todays]
+    assert check(LEAP_DAY_BIRTHS, todays) == []
@@ -0,0 +1,23 @@
+from contact import Contact, KeyValue
+from dedupe import Duplicates
+
+
+def _contact(name, email=None):
+    return Contact(name, [KeyValue("Email", email)] if email else [], [])
+
+
+def test_a_group_with_the_same_name_has_no_similar_names():
+    contacts = [
+        _contact("Roy Trenneman", "roy@example.com"),
+        _contact("Trenneman Roy"),
+        _contact("Roy Treneman", "roy@example.com"),
+    ]
+    (group,) = Duplicates(contacts).groups
+    assert len(group.contacts) == 3
+    assert group.reasons == ["same email", "same name"]
+
+
+def test_a_pair_with_similar_names_says_so():
+    contacts = [_contact("Roy Trenneman"), _contact("Roy Treneman")]
+    (group,) = Duplicates(contacts).groups
+    assert group.reasons == ["similar names"]
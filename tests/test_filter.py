@@ -0,0 +1,39 @@
+from contact import Contact, KeyValue
+from filter import filter_contacts
+from index import ContactIndex
+from store import ContactStore
+
+
+def _contacts():
+    return [
+        Contact("Roy Trenneman", [KeyValue("Org", "Reynholm Industries")], []),
+        Contact("Jen Barber", [KeyValue("Web", "https://example.com/jen")], []),
+        Contact("Maurice Moss", [], ["Emails from mailto:moss@example.com"]),
+    ]
+
+
+def _names(matches):
+    return [contact.name for contact in matches]
+
+
+def test_a_url_is_a_plain_pattern():
+    contacts = _contacts()
+    index = ContactIndex(contacts)
+    for found in [
+        filter_contacts(contacts, ["https://example"], jobs=1),
+        filter_contacts(contacts, ["https://example"], index=index),
+        filter_contacts(ContactStore(contacts), ["https://example"]),
+    ]:
+        assert _names(found) == ["Jen Barber"]
+
+
+def test_a_pattern_scoped_to_a_missing_key_is_a_plain_pattern():
+    contacts = _contacts()
+    found = filter_contacts(contacts, ["mailto:moss"], index=ContactIndex(contacts))
+    assert _names(found) == ["Maurice Moss"]
+
+
+def test_a_pattern_scoped_to_a_known_key_only_matches_its_values():
+    contacts = _contacts()
+    assert _names(filter_contacts(contacts, ["web:example"], jobs=1)) == ["Jen Barber"]
+    assert _names(filter_contacts(contacts, ["org:example"], jobs=1)) == []
@@ -0,0 +1,48 @@
+from contact import Contact
+from interactive import IncrementalSearch
+
+
+def _contacts():
+    return [Contact(name, [], []) for name in ["Anna", "Bob", "Carl", "Dana", "Abe"]]
+
+
+def _names(matches):
+    return [contact.name for contact in matches.found]
+
+
+def test_narrowing_a_complete_query():
+    search = IncrementalSearch(_contacts())
+    search.search(["a"]).fill()
+    matches = search.search(["an"])
+    matches.fill()
+    assert _names(matches) == ["Anna", "Dana"]
+
+
+def test_narrowing_an_incomplete_query():
+    search = IncrementalSearch(_contacts())
+    parent = search.search(["a"])
+    parent.fill(1)
+    matches = search.search(["an"])
+    matches.fill()
+    assert matches.complete
+    assert _names(matches) == ["Anna", "Dana"]
+    parent.fill()
+    assert _names(parent) == ["Abe", "Anna", "Carl", "Dana"]
+
+
+def test_narrowing_an_empty_incomplete_query():
+    search = IncrementalSearch(_contacts())
+    search.search(["z"]).fill(2)
+    matches = search.search(["zz"])
+    matches.fill()
+    assert matches.complete
+    assert _names(matches) == []
+
+
+def test_going_back_reuses_matches():
+    search = IncrementalSearch(_contacts())
+    parent = search.search(["a"])
+    search.search(["an"]).fill()
+    assert search.search(["a"]) is parent
+    parent.fill()
+    assert _names(parent) == ["Abe", "Anna", "Carl", "Dana"]
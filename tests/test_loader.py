@@ -0,0 +1,61 @@
+import loader
+import os
+import pytest
+
+CONTACTS = """\
+  stray: before any contact
+Roy Trenneman
+  Org: Reynholm Industries
+  no colon
+Jen Barber
+  Org: Reynholm Industries
+Maurice Moss
+  bad detail
+"""
+
+
+@pytest.fixture
+def contact_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(loader, "CONTACT_FILE", str(tmp_path / "contacts.txt"))
+    monkeypatch.setattr(loader, "CONTACT_DIRECTORY", str(tmp_path / "contacts"))
+    return loader.CONTACT_FILE
+
+
+def _write(contact_file, text):
+    with open(contact_file, "w") as file:
+        file.write(text)
+
+
+def test_warnings_are_replayed_from_the_cache(contact_file, capsys):
+    _write(contact_file, CONTACTS)
+    loader.load_indexed_contacts()
+    parsed = capsys.readouterr().out
+    loader.load_indexed_contacts()
+    assert capsys.readouterr().out == parsed
+    assert parsed == (
+        "No current contact -- review file format\n"
+        "Bad contact details (no colon) -- ignored\n"
+        "Bad contact details (bad detail) -- ignored\n"
+    )
+
+
+def test_warnings_follow_the_contacts_they_are_in(contact_file):
+    _write(contact_file, CONTACTS)
+    payload = loader.load_contact_payload()
+    _write(contact_file, CONTACTS.replace("Jen Barber\n", "Jen Barber\n  typo\n"))
+    payload = loader.load_contact_payload(previous=payload)
+    assert payload["blocks"] is not None
+    assert payload["warnings"] == [
+        (-1, "No current contact -- review file format"),
+        (0, "Bad contact details (no colon) -- ignored"),
+        (1, "Bad contact details (typo) -- ignored"),
+        (2, "Bad contact details (bad detail) -- ignored"),
+    ]
+    jen = "Jen Barber\n  Org: Reynholm Industries\n"
+    _write(contact_file, CONTACTS.replace(jen, ""))
+    payload = loader.load_contact_payload(previous=payload)
+    assert payload["warnings"] == [
+        (-1, "No current contact -- review file format"),
+        (0, "Bad contact details (no colon) -- ignored"),
+        (1, "Bad contact details (bad detail) -- ignored"),
+    ]
@@ -0,0 +1,15 @@
+from benchmarks.startup import DEFAULT_BUDGET_MS, LAZY_MODULES, import_times
+
+# Number of times the application is imported; the quickest counts, so a slow
+# run on a busy machine doesn't fail the budget
+RUNS = 3
+
+
+def test_startup_is_within_budget():
+    best_ms = min(import_times("contacts")["contacts"] for _ in range(RUNS)) / 1000
+    assert best_ms <= DEFAULT_BUDGET_MS
+
+
+def test_lazy_modules_are_not_imported_at_startup():
+    imported = import_times("contacts")
+    assert [name for name in LAZY_MODULES if name in imported] == []